@@ -93,33 +93,22 @@ def filter_prediction_times(
 ) -> FilteredPredictionTimeBundle:
     """Apply a series of filters to prediction times.
 
-    If prediction_times is a DataFrame, then the filters will be applied eagerly and we can calculate the stepdeltas.
-    If not, then we will apply the filters lazily and we won't be able to calculate the stepdeltas.
+    If get_counts is True, the output of each step is materialised once and used as the input of the next step, so the
+    counts for the StepDeltas come from frames which are already in memory. Otherwise, the filters are applied lazily,
+    and the whole plan is only executed once at the end.
     """
+    if get_counts:
+        return _filter_prediction_times_with_counts(
+            prediction_times=prediction_times,
+            filtering_steps=filtering_steps,
+            entity_id_col_name=entity_id_col_name,
+            timestamp_col_name=timestamp_col_name,
+        )
 
-    stepdeltas: list[StepDelta] = []
-    for i, filter_step in enumerate(filtering_steps):
+    for filter_step in filtering_steps:
         msg.info(f"Applying filter: {filter_step.__class__.__name__}")
-
-        if get_counts:
-            prefilter_prediction_times = prediction_times.collect()
-
         prediction_times = filter_step.apply(prediction_times)
 
-        if get_counts:
-            stepdeltas.append(
-                StepDelta(
-                    step_name=filter_step.__class__.__name__,
-                    n_prediction_times_before=prefilter_prediction_times.shape[0],  # type: ignore
-                    n_prediction_times_after=prediction_times.collect().shape[0],
-                    n_ids_before=prefilter_prediction_times[entity_id_col_name].n_unique(),  # type: ignore
-                    n_ids_after=prediction_times.collect()[entity_id_col_name].n_unique(),
-                    step_index=i,
-                )
-            )
-        # For much faster speeds, we can apply the filter step to the lazy frame.
-        # This means we won't get the counts before and after. If you want those, be sure to pass in a DataFrame.
-
     if "date_of_birth" in prediction_times.columns:
         prediction_times = prediction_times.drop("date_of_birth")
 
@@ -129,5 +118,46 @@ def filter_prediction_times(
             entity_id_col_name=entity_id_col_name,
             timestamp_col_name=timestamp_col_name,
         ),
+        filter_steps=[],
+    )
+
+
+def _filter_prediction_times_with_counts(
+    prediction_times: pl.LazyFrame,
+    filtering_steps: Iterable[PredictionTimeFilter],
+    entity_id_col_name: str,
+    timestamp_col_name: str,
+) -> FilteredPredictionTimeBundle:
+    current_step_frame = prediction_times.collect()
+    n_prediction_times = current_step_frame.height
+    n_ids = current_step_frame[entity_id_col_name].n_unique()
+
+    stepdeltas: list[StepDelta] = []
+    for i, filter_step in enumerate(filtering_steps):
+        msg.info(f"Applying filter: {filter_step.__class__.__name__}")
+        current_step_frame = filter_step.apply(current_step_frame.lazy()).collect()
+
+        stepdeltas.append(
+            StepDelta(
+                step_name=filter_step.__class__.__name__,
+                n_prediction_times_before=n_prediction_times,
+                n_prediction_times_after=current_step_frame.height,
+                n_ids_before=n_ids,
+                n_ids_after=current_step_frame[entity_id_col_name].n_unique(),
+                step_index=i,
+            )
+        )
+        n_prediction_times = stepdeltas[-1].n_prediction_times_after
+        n_ids = stepdeltas[-1].n_ids_after
+
+    if "date_of_birth" in current_step_frame.columns:
+        current_step_frame = current_step_frame.drop("date_of_birth")
+
+    return FilteredPredictionTimeBundle(
+        prediction_times=PredictionTimeFrame(
+            frame=current_step_frame,
+            entity_id_col_name=entity_id_col_name,
+            timestamp_col_name=timestamp_col_name,
+        ),
         filter_steps=stepdeltas,
     )
@@ -0,0 +1,291 @@
+"""Persistent cache of CohortDefiner outputs.
+
+Outputs are stored as Parquet (frames) and JSON (filter steps), keyed by the definer's class, an explicit version, a
+fingerprint of its code and a fingerprint of the source data. The code is fingerprinted by the source of the definer
+class and of the psycop classes and functions it refers to by name, transitively, e.g. its filters and loaders, plus
+the values of constants they refer to. Code reached in other ways, e.g. through attributes of an imported module, is
+not followed, so bump the version when changing it. If any of the source can not be read, e.g. for a definer defined
+in a notebook, outputs are not cached.
+
+Changes to the data in SQL are only detected if a source_data_fingerprint is given, e.g. a function returning the last
+load date of the source views. Otherwise, call invalidate() when the source data is updated.
+
+Example:
+    >>> CachedT2DCohortDefiner = cache_cohort_definer(T2DCohortDefiner)
+    >>> CachedT2DCohortDefiner.get_filtered_prediction_times_bundle()  # Computed and stored
+    >>> CachedT2DCohortDefiner.get_filtered_prediction_times_bundle()  # Loaded from the cache
+"""
+
+from __future__ import annotations
+
+import glob
+import hashlib
+import inspect
+import json
+import logging
+import os
+import re
+import shutil
+import uuid
+from datetime import date, datetime, timedelta
+from types import CodeType, FunctionType, ModuleType
+from typing import TYPE_CHECKING, Any
+
+import polars as pl
+
+from psycop.automation.environment import on_ovartaci
+from psycop.common.cohort_definition import (
+    CohortDefiner,
+    FilteredPredictionTimeBundle,
+    OutcomeTimestampFrame,
+    PredictionTimeFrame,
+    StepDelta,
+)
+from psycop.common.global_utils.paths import OVARTACI_SHARED_DIR, PSYCOP_PKG_ROOT
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+
+_CONSTANT_TYPES = (str, int, float, bool, date, datetime, timedelta, type(None))
+
+
+def _code_names(code: CodeType) -> set[str]:
+    """All global names used in code, including in nested functions and comprehensions."""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            names |= _code_names(const)
+    return names
+
+
+def _functions(obj: Any) -> list[FunctionType]:
+    """The functions defined by a class or function, unwrapping decorators."""
+    members = vars(obj).values() if isinstance(obj, type) else [obj]
+    functions: list[FunctionType] = []
+    for member in members:
+        function = member
+        if isinstance(member, (staticmethod, classmethod)):
+            function = member.__func__
+        elif isinstance(member, property):
+            function = member.fget
+        if callable(function):
+            function = inspect.unwrap(function)
+        if isinstance(function, FunctionType):
+            functions.append(function)
+    return functions
+
+
+def _in_psycop(obj: Any) -> bool:
+    return (getattr(obj, "__module__", None) or "").startswith("psycop")
+
+
+def code_fingerprint(obj: type | Callable[..., Any]) -> str:
+    """Fingerprint the source of obj and of the psycop classes and functions it refers to by name, transitively.
+
+    Raises:
+        OSError: If the source of any of them can not be read.
+    """
+    parts: list[str] = []
+    seen: set[int] = set()
+    to_visit: list[Any] = [obj]
+
+    while to_visit:
+        current = to_visit.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+
+        try:
+            parts.append(inspect.getsource(current))
+        except TypeError as e:
+            raise OSError(f"Could not get the source of {current!r}") from e
+
+        if isinstance(current, type):
+            to_visit += [base for base in current.__bases__ if _in_psycop(base)]
+
+        for function in _functions(current):
+            for name in sorted(_code_names(function.__code__)):
+                if name not in function.__globals__:
+                    continue
+                value = function.__globals__[name]
+                if isinstance(value, _CONSTANT_TYPES):
+                    parts.append(f"{name}={value!r}")
+                    continue
+                if isinstance(value, ModuleType) or not (
+                    isinstance(value, type) or callable(value)
+                ):
+                    continue
+                value = inspect.unwrap(value)
+                if _in_psycop(value):
+                    to_visit.append(value)
+
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def _write_atomically(path: Path, write: Callable[[Path], object]) -> None:
+    """Write to a temporary file next to path, and move it into place, so readers never see a partial file."""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}-{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        write(tmp_path)
+        tmp_path.replace(path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def default_cohort_definer_cache_dir() -> Path:
+    if on_ovartaci():
+        return OVARTACI_SHARED_DIR / "cache" / "cohorts"
+    return PSYCOP_PKG_ROOT / ".cache" / "cohorts"
+
+
+class CohortDefinerCache:
+    """Cache of CohortDefiner outputs in cache_dir.
+
+    Args:
+        cache_dir: Directory to store the cached outputs in. Each definer and key gets a subdirectory.
+        source_data_fingerprint: Called on every lookup. Its return value is part of the key, so outputs are recomputed when it changes.
+    """
+
+    def __init__(self, cache_dir: Path, source_data_fingerprint: Callable[[], str] | None = None):
+        self.cache_dir = cache_dir
+        self.source_data_fingerprint = source_data_fingerprint
+
+    @staticmethod
+    def _definer_name(definer: type[CohortDefiner]) -> str:
+        """The module-qualified name of definer, so definers with the same name in different modules get separate entries."""
+        return re.sub(r"[^\w.]", "_", f"{definer.__module__}.{definer.__qualname__}")
+
+    def key(self, definer: type[CohortDefiner], version: int = 1) -> str | None:
+        """The key of definer's outputs, or None if its source can not be read."""
+        try:
+            code = code_fingerprint(definer)
+        except OSError as e:
+            log.warning(
+                f"Not caching {definer.__qualname__}, since its source can not be read: {e}"
+            )
+            return None
+        source_data = self.source_data_fingerprint() if self.source_data_fingerprint else ""
+        return hashlib.sha256(
+            f"{CACHE_VERSION}\n{self._definer_name(definer)}\n{version}\n{code}\n{source_data}".encode()
+        ).hexdigest()
+
+    def _entry_dir(self, definer: type[CohortDefiner], version: int) -> Path | None:
+        key = self.key(definer, version=version)
+        if key is None:
+            return None
+        return self.cache_dir / f"{self._definer_name(definer)}-{key[:16]}"
+
+    def get_filtered_prediction_times_bundle(
+        self, definer: type[CohortDefiner], version: int = 1
+    ) -> FilteredPredictionTimeBundle:
+        """Load the definer's prediction times bundle from the cache, or compute and store it."""
+        entry_dir = self._entry_dir(definer, version=version)
+        if entry_dir is None:
+            return definer.get_filtered_prediction_times_bundle()
+        frame_path = entry_dir / "prediction_times.parquet"
+        metadata_path = entry_dir / "prediction_times.json"
+
+        if frame_path.exists() and metadata_path.exists():
+            log.info(f"Loading cached prediction times for {definer.__qualname__} from {entry_dir}")
+            metadata = json.loads(metadata_path.read_text())
+            return FilteredPredictionTimeBundle(
+                prediction_times=PredictionTimeFrame(
+                    frame=pl.read_parquet(frame_path),
+                    entity_id_col_name=metadata["entity_id_col_name"],
+                    timestamp_col_name=metadata["timestamp_col_name"],
+                ),
+                filter_steps=[StepDelta(**step) for step in metadata["filter_steps"]],
+            )
+
+        bundle = definer.get_filtered_prediction_times_bundle()
+
+        entry_dir.mkdir(parents=True, exist_ok=True)
+        _write_atomically(frame_path, bundle.prediction_times.frame.write_parquet)
+        # Written last, so an interrupted write is treated as a miss
+        metadata = json.dumps(
+            {
+                "entity_id_col_name": bundle.prediction_times.entity_id_col_name,
+                "timestamp_col_name": bundle.prediction_times.timestamp_col_name,
+                "filter_steps": [step.model_dump() for step in bundle.filter_steps],
+            }
+        )
+        _write_atomically(metadata_path, lambda path: path.write_text(metadata))
+        return bundle
+
+    def get_outcome_timestamps(
+        self, definer: type[CohortDefiner], version: int = 1
+    ) -> OutcomeTimestampFrame:
+        """Load the definer's outcome timestamps from the cache, or compute and store them."""
+        entry_dir = self._entry_dir(definer, version=version)
+        if entry_dir is None:
+            return definer.get_outcome_timestamps()
+        frame_path = entry_dir / "outcome_timestamps.parquet"
+        metadata_path = entry_dir / "outcome_timestamps.json"
+
+        if frame_path.exists() and metadata_path.exists():
+            log.info(
+                f"Loading cached outcome timestamps for {definer.__qualname__} from {entry_dir}"
+            )
+            metadata = json.loads(metadata_path.read_text())
+            return OutcomeTimestampFrame(
+                frame=pl.read_parquet(frame_path),
+                entity_id_col_name=metadata["entity_id_col_name"],
+                timestamp_col_name=metadata["timestamp_col_name"],
+            )
+
+        outcome_timestamps = definer.get_outcome_timestamps()
+
+        entry_dir.mkdir(parents=True, exist_ok=True)
+        _write_atomically(frame_path, outcome_timestamps.frame.write_parquet)
+        metadata = json.dumps(
+            {
+                "entity_id_col_name": outcome_timestamps.entity_id_col_name,
+                "timestamp_col_name": outcome_timestamps.timestamp_col_name,
+            }
+        )
+        _write_atomically(metadata_path, lambda path: path.write_text(metadata))
+        return outcome_timestamps
+
+    def invalidate(self, definer: type[CohortDefiner]) -> int:
+        """Remove all cached outputs of definer, for any key. Returns the number of removed entries."""
+        entry_dirs = list(self.cache_dir.glob(f"{glob.escape(self._definer_name(definer))}-*"))
+        for entry_dir in entry_dirs:
+            shutil.rmtree(entry_dir)
+        return len(entry_dirs)
+
+    def clear(self) -> None:
+        """Remove all cached outputs."""
+        if self.cache_dir.exists():
+            shutil.rmtree(self.cache_dir)
+
+
+def cache_cohort_definer(
+    definer: type[CohortDefiner], cache: CohortDefinerCache | None = None, version: int = 1
+) -> type[CohortDefiner]:
+    """Create a subclass of definer whose outputs are loaded from cache when available. If cache is None, uses a cache in the default directory.
+
+    Bump version to invalidate the cached outputs after changes the code fingerprint does not cover.
+    """
+    if cache is None:
+        cache = CohortDefinerCache(cache_dir=default_cohort_definer_cache_dir())
+    active_cache = cache
+
+    class CachedCohortDefiner(definer):  # type: ignore
+        cache = active_cache
+
+        @staticmethod
+        def get_filtered_prediction_times_bundle() -> FilteredPredictionTimeBundle:
+            return active_cache.get_filtered_prediction_times_bundle(definer, version=version)
+
+        @staticmethod
+        def get_outcome_timestamps() -> OutcomeTimestampFrame:
+            return active_cache.get_outcome_timestamps(definer, version=version)
+
+    CachedCohortDefiner.__name__ = f"Cached{definer.__name__}"
+    CachedCohortDefiner.__qualname__ = f"Cached{definer.__qualname__}"
+    return CachedCohortDefiner
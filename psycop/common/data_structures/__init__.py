@@ -1,5 +1,14 @@
 from .patient import Patient, PatientSlice
+from .patient_store import PatientStore
 from .static_feature import StaticFeature
 from .temporal_event import TemporalEvent
+from .temporal_event_arrays import TemporalEventArrays
 
-__all__ = ["StaticFeature", "TemporalEvent", "PatientSlice", "Patient"]
+__all__ = [
+    "StaticFeature",
+    "TemporalEvent",
+    "TemporalEventArrays",
+    "PatientSlice",
+    "Patient",
+    "PatientStore",
+]
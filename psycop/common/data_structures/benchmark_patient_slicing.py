@@ -0,0 +1,96 @@
+"""Benchmark Patient.to_prediction_times against a linear scan per prediction time.
+
+The linear scan is the previous implementation, which filtered all events for each prediction time, i.e.
+O(events x prediction times) per patient. The binary search finds the window bounds of all prediction
+times in O(prediction times x log(events)).
+"""
+
+import datetime as dt
+import logging
+import time
+
+import numpy as np
+
+from psycop.common.data_structures.patient import Patient
+from psycop.common.data_structures.temporal_event import TemporalEvent
+
+log = logging.getLogger(__name__)
+
+
+def synthetic_patient(n_events: int, seed: int = 42) -> Patient:
+    rng = np.random.default_rng(seed)
+    offsets_minutes = rng.integers(0, 20 * 365 * 24 * 60, size=n_events)
+    return Patient(
+        patient_id=1,
+        date_of_birth=dt.datetime(1980, 1, 1),
+        unsorted_temporal_events=[
+            TemporalEvent(
+                timestamp=dt.datetime(2000, 1, 1) + dt.timedelta(minutes=int(offset)),
+                source_type="diagnosis",
+                source_subtype="A",
+                value="f20",
+            )
+            for offset in offsets_minutes
+        ],
+    )
+
+
+def _linear_scan_n_events(
+    patient: Patient, lookbehind: dt.timedelta, prediction_timestamps: list[dt.datetime]
+) -> list[int]:
+    events = list(patient.temporal_events)
+    return [
+        len(
+            [
+                e
+                for e in events
+                if prediction_timestamp - lookbehind <= e.timestamp < prediction_timestamp
+            ]
+        )
+        for prediction_timestamp in prediction_timestamps
+    ]
+
+
+def benchmark(
+    n_events_per_patient: tuple[int, ...] = (1_000, 10_000, 100_000), n_prediction_times: int = 200
+) -> dict[int, dict[str, float]]:
+    lookbehind = dt.timedelta(days=730)
+    prediction_timestamps = [
+        dt.datetime(2002, 1, 1) + dt.timedelta(days=30 * i) for i in range(n_prediction_times)
+    ]
+
+    results = {}
+    for n_events in n_events_per_patient:
+        patient = synthetic_patient(n_events)
+        patient.temporal_events  # noqa: B018 # Sort outside the timed sections
+
+        start = time.perf_counter()
+        linear_n_events = _linear_scan_n_events(patient, lookbehind, prediction_timestamps)
+        linear_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        prediction_times = patient.to_prediction_times(
+            lookbehind=lookbehind,
+            lookahead=dt.timedelta(days=365),
+            outcome_timestamp=None,
+            prediction_timestamps=prediction_timestamps,
+        )
+        binary_search_seconds = time.perf_counter() - start
+
+        if [len(p.patient_slice.temporal_events) for p in prediction_times] != linear_n_events:
+            raise ValueError("Binary search and linear scan disagree")
+
+        results[n_events] = {
+            "linear_scan_seconds": linear_seconds,
+            "binary_search_seconds": binary_search_seconds,
+        }
+
+    return results
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    for n_events, seconds in benchmark().items():
+        log.info(
+            f"{n_events} events: linear scan {seconds['linear_scan_seconds']:.3f}s, binary search {seconds['binary_search_seconds']:.4f}s"
+        )
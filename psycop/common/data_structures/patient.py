@@ -1,11 +1,14 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, field
+from dataclasses import InitVar, dataclass, field
 from typing import TYPE_CHECKING
 
+import numpy as np
+
 from psycop.common.data_structures.prediction_time import PredictionTime
 from psycop.common.data_structures.static_feature import StaticFeature
 from psycop.common.data_structures.temporal_event import TemporalEvent
+from psycop.common.data_structures.temporal_event_arrays import TemporalEventArrays
 
 if TYPE_CHECKING:
     import datetime as dt
@@ -20,34 +23,53 @@ class TimeInterval:
     end: dt.datetime
 
 
-@dataclass
+@dataclass(eq=False)
 class Patient:
-    """All task-agnostic data for a patient."""
+    """All task-agnostic data for a patient.
+
+    Temporal events are held in sorted, column-wise arrays (see TemporalEventArrays), and are only sorted when events have been added.
+    Pass temporal_event_arrays to create a patient from arrays which are already sorted, e.g. a view from a PatientStore.
+    """
 
     patient_id: PATIENT_ID
     date_of_birth: dt.datetime
-    unsorted_temporal_events: list[TemporalEvent] = field(default_factory=list)
+    unsorted_temporal_events: InitVar[Sequence[TemporalEvent]] = ()
     unsorted_static_features: list[StaticFeature] = field(default_factory=list)
+    temporal_event_arrays: InitVar[TemporalEventArrays | None] = None
+
+    def __post_init__(
+        self,
+        unsorted_temporal_events: Sequence[TemporalEvent],
+        temporal_event_arrays: TemporalEventArrays | None,
+    ):
+        self._event_arrays = (
+            temporal_event_arrays
+            if temporal_event_arrays is not None
+            else TemporalEventArrays.empty()
+        )
+        self._unsorted_temporal_events = list(unsorted_temporal_events)
 
     def __repr__(self) -> str:
         return f"""
     patient_id: {self.patient_id}
     date_of_birth: {self.date_of_birth}
-    n temporal_events: {len(self.unsorted_temporal_events)}
+    n temporal_events: {len(self._event_arrays) + len(self._unsorted_temporal_events)}
     n static_features: {len(self.unsorted_static_features)}"""
 
-    @staticmethod
-    def _filter_events_within_time_interval(
-        events: Sequence[TemporalEvent], start: dt.datetime, end: dt.datetime
-    ) -> Sequence[TemporalEvent]:
-        # This could be much faster if we assume that the events are already sorted.
-        # Then we could implement binary search, which is O(log n) instead of O(n).
-        # However, this might be plenty fast. We can always optimize later.
-        return [event for event in events if start <= event.timestamp < end]
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Patient):
+            return NotImplemented
+        return (
+            self.patient_id == other.patient_id
+            and self.date_of_birth == other.date_of_birth
+            and self.temporal_events == other.temporal_events
+            and self.static_features == other.static_features
+        )
+
+    __hash__ = None  # type: ignore
 
     def add_events(self, events: Sequence[TemporalEvent | StaticFeature]):
-        # add patient reference to each event
-        self.unsorted_temporal_events += [
+        self._unsorted_temporal_events += [
             event for event in events if isinstance(event, TemporalEvent)
         ]
         self.unsorted_static_features += [
@@ -55,9 +77,17 @@ class Patient:
         ]
 
     @property
-    def temporal_events(self) -> Sequence[TemporalEvent]:
-        self.unsorted_temporal_events.sort(key=lambda event: event.timestamp)
-        return self.unsorted_temporal_events
+    def temporal_events(self) -> TemporalEventArrays:
+        """The patient's temporal events, sorted by timestamp. Added events are merged into the arrays on first access."""
+        if self._unsorted_temporal_events:
+            self._event_arrays = TemporalEventArrays.concat(
+                [
+                    self._event_arrays,
+                    TemporalEventArrays.from_events(self._unsorted_temporal_events),
+                ]
+            )
+            self._unsorted_temporal_events = []
+        return self._event_arrays
 
     @property
     def static_features(self) -> Sequence[StaticFeature]:
@@ -72,8 +102,8 @@ class Patient:
     ) -> PatientSlice:
         """Creates a patient slice, i.e. a subset of the patient's data within a specific time interval."""
         if time_interval is not None:
-            filtered_events = self._filter_events_within_time_interval(
-                events=self.temporal_events, start=time_interval.start, end=time_interval.end
+            filtered_events = self.temporal_events.within(
+                start=time_interval.start, end=time_interval.end
             )
         else:
             filtered_events = self.temporal_events
@@ -88,35 +118,31 @@ class Patient:
         prediction_timestamps: Sequence[dt.datetime],
     ) -> list[PredictionTime]:
         """Creates prediction times for a boolean outome. E.g. for the task of predicting whether a patient will be diagnosed with diabetes within the next year, this function will return a list of PredictionTime objects, each of which contains the patient's data for a specific prediction time (predictors, prediction timestamp and whether the outcome occurs within the lookahead)."""
-        # Map each prediction time to a prediction sequence:
-        prediction_sequences = []
-
-        for prediction_timestamp in prediction_timestamps:
-            # 1. Filter the predictor events to those that are relevant to the prediction time. (Keep all static, drop all temporal that are outside the lookbehind window.)
-            time_interval = TimeInterval(
-                start=prediction_timestamp - lookbehind, end=prediction_timestamp
-            )
-            patient_slice = self.slice(time_interval=time_interval)
-
-            outcome_within_lookahead = (
-                outcome_timestamp <= (prediction_timestamp + lookahead)
+        # 1. Find the predictor events within the lookbehind window of each prediction time. (Keep all static, drop all temporal that are outside the lookbehind window.)
+        # The events are sorted, so all windows are found with one binary search per boundary.
+        events = self.temporal_events
+        prediction_timestamps_array = np.asarray(prediction_timestamps, dtype="datetime64[us]")
+        start_idxs, end_idxs = events.window_bounds(
+            starts=prediction_timestamps_array - np.timedelta64(lookbehind),
+            ends=prediction_timestamps_array,
+        )
+
+        # 2. Return prediction sequences
+        return [
+            PredictionTime(
+                patient_slice=PatientSlice(patient=self, temporal_events=events[start:end]),
+                prediction_timestamp=prediction_timestamp,
+                outcome=outcome_timestamp <= (prediction_timestamp + lookahead)
                 if outcome_timestamp is not None
-                else False
-            )
-
-            # 2. Return prediction sequences
-            prediction_sequences.append(
-                PredictionTime(
-                    patient_slice=patient_slice,
-                    prediction_timestamp=prediction_timestamp,
-                    outcome=outcome_within_lookahead,
-                )
+                else False,
             )
-
-        return prediction_sequences
+            for prediction_timestamp, start, end in zip(prediction_timestamps, start_idxs, end_idxs)
+        ]
 
 
 @dataclass(frozen=True)
 class PatientSlice:
+    """A patient and a subset of their temporal events."""
+
     patient: Patient
     temporal_events: Sequence[TemporalEvent]
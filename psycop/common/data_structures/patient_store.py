@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+import polars as pl
+
+from psycop.common.data_structures.temporal_event_arrays import (
+    TemporalEventArrays,
+    polars_column_to_numpy,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator, Sequence
+
+    from psycop.common.feature_generation.sequences.prediction_times_from_cohort import PATIENT_ID
+
+
+def _timestamp_as_datetime(df: pl.DataFrame, timestamp_col_name: str) -> pl.Expr:
+    """Parse string timestamps, and cast the rest to microsecond datetimes."""
+    if df.schema[timestamp_col_name] == pl.Utf8:
+        return pl.col(timestamp_col_name).str.to_datetime(time_unit="us")
+    return pl.col(timestamp_col_name).cast(pl.Datetime("us"))
+
+
+def _patient_codes(patient_ids: pl.Series) -> np.ndarray:
+    """Integer codes which are equal for equal patient ids. Used for grouping, so the codes need not preserve the order of the ids."""
+    if patient_ids.dtype.is_integer():
+        return patient_ids.to_numpy()
+    return patient_ids.cast(pl.Utf8).cast(pl.Categorical).to_physical().to_numpy()
+
+
+def _patient_timestamp_order(patient_codes: np.ndarray, timestamps: np.ndarray) -> np.ndarray:
+    """Indices which sort by patient and timestamp, keeping the order of events with equal timestamps.
+
+    After a stable sort by timestamp, each event's position is unique, so the final sort by (patient, position) can be
+    a single quicksort on a combined key, which is much faster than a second stable sort.
+    """
+    order = np.argsort(timestamps, kind="stable")
+    patient_codes = patient_codes[order].astype(np.int64) - patient_codes.min()
+
+    if int(patient_codes.max()) < np.iinfo(np.int64).max // len(order):
+        return order[np.argsort(patient_codes * len(order) + np.arange(len(order)))]
+    return order[np.argsort(patient_codes, kind="stable")]
+
+
+class PatientStore:
+    """Temporal events for many patients, stored column-wise in one set of arrays.
+
+    Events are sorted by patient and timestamp, so the events of patient i are the contiguous range offsets[i]:offsets[i + 1].
+    Getting a patient's events returns a view of the arrays, without copying.
+    """
+
+    def __init__(
+        self, patient_ids: list[PATIENT_ID], offsets: np.ndarray, events: TemporalEventArrays
+    ):
+        if len(offsets) != len(patient_ids) + 1:
+            raise ValueError("offsets must have one more element than patient_ids")
+
+        self.patient_ids = patient_ids
+        self.offsets = offsets
+        self.events = events
+        self._patient_idx = {patient_id: i for i, patient_id in enumerate(patient_ids)}
+
+    @classmethod
+    def from_frames(
+        cls: type[PatientStore],
+        dfs: Sequence[pl.DataFrame],
+        patient_id_col_name: str,
+        timestamp_col_name: str,
+        source_col_name: str,
+        value_col_name: str,
+        source_subtype_col_name: str | None = None,
+    ) -> PatientStore:
+        """Create a store from dataframes with one row per temporal event.
+
+        The frames are sorted together once by patient and timestamp, and the patients' offsets are where the patient id changes.
+        Events with equal timestamps keep their order in dfs.
+        """
+        if sum(df.height for df in dfs) == 0:
+            return cls(
+                patient_ids=[],
+                offsets=np.zeros(1, dtype=np.int64),
+                events=TemporalEventArrays.empty(),
+            )
+
+        keys = pl.concat(
+            [
+                df.select(
+                    pl.col(patient_id_col_name),
+                    _timestamp_as_datetime(df, timestamp_col_name=timestamp_col_name),
+                )
+                for df in dfs
+            ],
+            how="vertical_relaxed",
+        )
+        timestamps = keys.get_column(timestamp_col_name).to_numpy()
+        patient_codes = _patient_codes(keys.get_column(patient_id_col_name))
+
+        order = _patient_timestamp_order(patient_codes=patient_codes, timestamps=timestamps)
+
+        sorted_patient_codes = patient_codes[order]
+        offsets = np.concatenate(
+            [[0], np.flatnonzero(np.diff(sorted_patient_codes)) + 1, [len(order)]]
+        )
+
+        def sorted_column(col_name: str) -> np.ndarray:
+            columns = [df.get_column(col_name) for df in dfs]
+            if (
+                len({column.dtype for column in columns}) == 1
+                and columns[0].dtype != pl.Categorical
+            ):
+                return polars_column_to_numpy(pl.concat(columns), idxs=order)
+            return np.concatenate([polars_column_to_numpy(column) for column in columns])[order]
+
+        return cls(
+            patient_ids=keys.get_column(patient_id_col_name).gather(order[offsets[:-1]]).to_list(),
+            offsets=offsets,
+            events=TemporalEventArrays(
+                timestamps=timestamps[order],
+                source_types=sorted_column(source_col_name),
+                source_subtypes=sorted_column(source_subtype_col_name)
+                if source_subtype_col_name is not None
+                else np.full(len(order), None, dtype=object),
+                values=sorted_column(value_col_name),
+            ),
+        )
+
+    @classmethod
+    def from_frame(
+        cls: type[PatientStore],
+        df: pl.DataFrame,
+        patient_id_col_name: str,
+        timestamp_col_name: str,
+        source_col_name: str,
+        value_col_name: str,
+        source_subtype_col_name: str | None = None,
+    ) -> PatientStore:
+        """Create a store from a dataframe with one row per temporal event. Events with equal timestamps keep their order in df."""
+        return cls.from_frames(
+            [df],
+            patient_id_col_name=patient_id_col_name,
+            timestamp_col_name=timestamp_col_name,
+            source_col_name=source_col_name,
+            value_col_name=value_col_name,
+            source_subtype_col_name=source_subtype_col_name,
+        )
+
+    def __len__(self) -> int:
+        return len(self.patient_ids)
+
+    def __contains__(self, patient_id: PATIENT_ID) -> bool:
+        return patient_id in self._patient_idx
+
+    def events_for(self, patient_id: PATIENT_ID) -> TemporalEventArrays:
+        """The patient's events, sorted by timestamp. Empty if the patient has no events."""
+        patient_idx = self._patient_idx.get(patient_id)
+        if patient_idx is None:
+            return TemporalEventArrays.empty()
+        return self.events[self.offsets[patient_idx] : self.offsets[patient_idx + 1]]
+
+    def __iter__(self) -> Iterator[tuple[PATIENT_ID, TemporalEventArrays]]:
+        for patient_idx, patient_id in enumerate(self.patient_ids):
+            yield patient_id, self.events[self.offsets[patient_idx] : self.offsets[patient_idx + 1]]
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+from collections.abc import Sequence
+from typing import TYPE_CHECKING, Any, overload
+
+import numpy as np
+
+from psycop.common.data_structures.temporal_event import TemporalEvent
+
+if TYPE_CHECKING:
+    import datetime as dt
+
+    import polars as pl
+
+
+def _to_python(value: Any) -> Any:
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _string_column_to_numpy(column: pl.Series, idxs: np.ndarray | None) -> np.ndarray:
+    """Object array in which equal strings share one Python object, instead of one object per row."""
+    import polars as pl
+
+    categorical = column.cast(pl.Categorical)
+    categories = np.array([*categorical.cat.get_categories().to_list(), None], dtype=object)
+    # Nulls point to the trailing None
+    codes = categorical.to_physical().fill_null(len(categories) - 1).to_numpy()
+    return categories[codes if idxs is None else codes[idxs]]
+
+
+def polars_column_to_numpy(column: pl.Series, idxs: np.ndarray | None = None) -> np.ndarray:
+    """Convert a polars column to NumPy, optionally gathering the rows in idxs.
+
+    Gathering strings as categorical codes before creating the object array is much faster than gathering the object array.
+    """
+    import polars as pl
+
+    if column.dtype in (pl.Utf8, pl.Categorical):
+        return _string_column_to_numpy(column, idxs=idxs)
+    if column.dtype == pl.Datetime:
+        column = column.cast(pl.Datetime("us"))
+    array = column.to_numpy()
+    return array if idxs is None else array[idxs]
+
+
+class TemporalEventArrays(Sequence[TemporalEvent]):
+    """Temporal events stored column-wise in NumPy arrays, sorted by timestamp.
+
+    Indexing materialises TemporalEvent objects on demand, so the arrays can be used wherever a sequence of events is expected,
+    without holding a Python object per event. Slicing returns views of the same arrays.
+    """
+
+    def __init__(
+        self,
+        timestamps: np.ndarray,
+        source_types: np.ndarray,
+        source_subtypes: np.ndarray,
+        values: np.ndarray,
+    ):
+        self.timestamps = np.asarray(timestamps, dtype="datetime64[us]")
+        self.source_types = source_types
+        self.source_subtypes = source_subtypes
+        self.values = values
+
+    @classmethod
+    def empty(cls: type[TemporalEventArrays]) -> TemporalEventArrays:
+        return cls(
+            timestamps=np.array([], dtype="datetime64[us]"),
+            source_types=np.array([], dtype=object),
+            source_subtypes=np.array([], dtype=object),
+            values=np.array([], dtype=object),
+        )
+
+    @classmethod
+    def from_events(
+        cls: type[TemporalEventArrays], events: Sequence[TemporalEvent]
+    ) -> TemporalEventArrays:
+        """Create arrays from event objects, sorted by timestamp. Events with equal timestamps keep their order."""
+        if isinstance(events, TemporalEventArrays):
+            return events
+        if not events:
+            return cls.empty()
+
+        return cls(
+            timestamps=np.array([event.timestamp for event in events], dtype="datetime64[us]"),
+            source_types=np.array([event.source_type for event in events], dtype=object),
+            source_subtypes=np.array([event.source_subtype for event in events], dtype=object),
+            values=np.array([event.value for event in events], dtype=object),
+        ).sorted()
+
+    @classmethod
+    def concat(
+        cls: type[TemporalEventArrays], arrays: Sequence[TemporalEventArrays]
+    ) -> TemporalEventArrays:
+        """Concatenate arrays, sorted by timestamp. Events with equal timestamps keep their order."""
+        return cls(
+            timestamps=np.concatenate([a.timestamps for a in arrays]),
+            source_types=np.concatenate([a.source_types for a in arrays]),
+            source_subtypes=np.concatenate([a.source_subtypes for a in arrays]),
+            values=np.concatenate([a.values for a in arrays]),
+        ).sorted()
+
+    def sorted(self) -> TemporalEventArrays:  # noqa: A003
+        return self.take(np.argsort(self.timestamps, kind="stable"))
+
+    def take(self, idxs: np.ndarray) -> TemporalEventArrays:
+        """Select events by an index or boolean array."""
+        return TemporalEventArrays(
+            timestamps=self.timestamps[idxs],
+            source_types=self.source_types[idxs],
+            source_subtypes=self.source_subtypes[idxs],
+            values=self.values[idxs],
+        )
+
+    def within(self, start: dt.datetime, end: dt.datetime) -> TemporalEventArrays:
+        """View of the events with start <= timestamp < end, found by binary search."""
+        [start_idxs], [end_idxs] = self.window_bounds(starts=[start], ends=[end])
+        return self[start_idxs:end_idxs]
+
+    def window_bounds(
+        self, starts: Sequence[dt.datetime] | np.ndarray, ends: Sequence[dt.datetime] | np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Index bounds of the events with starts[i] <= timestamp < ends[i], for all windows at once."""
+        return (
+            np.searchsorted(
+                self.timestamps, np.asarray(starts, dtype="datetime64[us]"), side="left"
+            ),
+            np.searchsorted(self.timestamps, np.asarray(ends, dtype="datetime64[us]"), side="left"),
+        )
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @overload
+    def __getitem__(self, idx: int) -> TemporalEvent: ...
+
+    @overload
+    def __getitem__(self, idx: slice) -> TemporalEventArrays: ...
+
+    def __getitem__(self, idx: int | slice) -> TemporalEvent | TemporalEventArrays:
+        if isinstance(idx, slice):
+            return TemporalEventArrays(
+                timestamps=self.timestamps[idx],
+                source_types=self.source_types[idx],
+                source_subtypes=self.source_subtypes[idx],
+                values=self.values[idx],
+            )
+
+        return TemporalEvent(
+            timestamp=self.timestamps[idx].item(),
+            source_type=_to_python(self.source_types[idx]),
+            source_subtype=_to_python(self.source_subtypes[idx]),
+            value=_to_python(self.values[idx]),
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self) -> str:
+        return f"TemporalEventArrays(n_events={len(self)})"
@@ -55,3 +55,38 @@ class TestPatientSequenceGenerator:
 
         outcome_within_lookahead = prediction_sequences[1].outcome is True
         assert outcome_within_lookahead
+
+
+def test_prediction_time_windows_match_linear_scan():
+    patient = get_test_patient(patient_id=1)
+    event_timestamps = [dt.datetime(2021, 1, 1) + dt.timedelta(hours=7 * i) for i in range(200)]
+    patient.add_events(
+        [
+            TemporalEvent(
+                timestamp=timestamp, value=1, source_type="test_source", source_subtype=None
+            )
+            for timestamp in reversed(event_timestamps)
+        ]
+    )
+    lookbehind = dt.timedelta(days=3)
+    # Includes prediction times exactly on an event, before the first and after the last event
+    prediction_timestamps = [
+        dt.datetime(2020, 12, 31) + dt.timedelta(hours=7 * i) for i in range(220)
+    ]
+
+    prediction_times = patient.to_prediction_times(
+        lookbehind=lookbehind,
+        lookahead=dt.timedelta(days=2),
+        outcome_timestamp=None,
+        prediction_timestamps=prediction_timestamps,
+    )
+
+    for prediction_time in prediction_times:
+        expected = [
+            t
+            for t in event_timestamps
+            if prediction_time.prediction_timestamp - lookbehind
+            <= t
+            < prediction_time.prediction_timestamp
+        ]
+        assert [e.timestamp for e in prediction_time.patient_slice.temporal_events] == expected
@@ -0,0 +1,92 @@
+import datetime as dt
+
+import polars as pl
+
+from psycop.common.data_structures.patient import Patient
+from psycop.common.data_structures.patient_store import PatientStore
+from psycop.common.data_structures.temporal_event import TemporalEvent
+from psycop.common.data_structures.temporal_event_arrays import TemporalEventArrays
+
+
+def test_temporal_event_arrays_round_trip():
+    events = [
+        TemporalEvent(
+            timestamp=dt.datetime(2021, 1, 3), source_type="lab", source_subtype=None, value=2.5
+        ),
+        TemporalEvent(
+            timestamp=dt.datetime(2021, 1, 1),
+            source_type="diagnosis",
+            source_subtype="A",
+            value="f20",
+        ),
+        TemporalEvent(
+            timestamp=dt.datetime(2021, 1, 1),
+            source_type="diagnosis",
+            source_subtype="B",
+            value="f32",
+        ),
+    ]
+
+    arrays = TemporalEventArrays.from_events(events)
+
+    assert list(arrays) == [events[1], events[2], events[0]]
+    assert arrays[1:] == [events[2], events[0]]
+
+
+def test_patient_from_arrays_equals_patient_from_events():
+    events = [
+        TemporalEvent(
+            timestamp=dt.datetime(2021, 1, day), source_type="lab", source_subtype=None, value=day
+        )
+        for day in (3, 1, 2)
+    ]
+    from_events = Patient(
+        patient_id=1, date_of_birth=dt.datetime(1990, 1, 1), unsorted_temporal_events=events
+    )
+    from_arrays = Patient(
+        patient_id=1,
+        date_of_birth=dt.datetime(1990, 1, 1),
+        temporal_event_arrays=TemporalEventArrays.from_events(events),
+    )
+
+    assert from_events == from_arrays
+    assert [e.value for e in from_arrays.temporal_events] == [1, 2, 3]
+
+
+def test_patient_store_from_frame():
+    df = pl.DataFrame(
+        {
+            "dw_ek_borger": [2, 1, 2, 1],
+            "timestamp": [
+                dt.datetime(2021, 1, 2),
+                dt.datetime(2021, 1, 3),
+                dt.datetime(2021, 1, 1),
+                dt.datetime(2021, 1, 1),
+            ],
+            "source": ["a", "b", "a", None],
+            "value": [1.0, 2.0, 3.0, 4.0],
+        }
+    )
+
+    store = PatientStore.from_frame(
+        df,
+        patient_id_col_name="dw_ek_borger",
+        timestamp_col_name="timestamp",
+        source_col_name="source",
+        value_col_name="value",
+    )
+
+    assert store.patient_ids == [1, 2]
+    assert store.events_for(1) == [
+        TemporalEvent(
+            timestamp=dt.datetime(2021, 1, 1),
+            source_type=None,
+            source_subtype=None,
+            value=4.0,  # type: ignore
+        ),
+        TemporalEvent(
+            timestamp=dt.datetime(2021, 1, 3), source_type="b", source_subtype=None, value=2.0
+        ),
+    ]
+    assert [e.value for e in store.events_for(2)] == [3.0, 1.0]
+    assert len(store.events_for(3)) == 0
@@ -0,0 +1,160 @@
+"""Pack feature specs into chunks under a memory budget.
+
+The estimates follow how timeseriesflattener v1 flattens a temporal spec: the prediction times are merged with all of
+the entity's values, and values outside the look window are dropped afterwards. The peak memory of a spec is therefore
+driven by the number of prediction times times the mean number of values per entity, plus the rows that survive the
+look window. Within a chunk, each worker holds one spec's intermediate frames, while the parent holds the flattened
+output of every spec in the chunk until they are concatenated.
+
+The bytes per row are rough upper bounds for pandas frames with an object uuid column, so the budget is conservative.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from timeseriesflattener.v1.feature_specs.single_specs import OutcomeSpec, PredictorSpec
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from timeseriesflattener.v1.feature_specs.single_specs import AnySpec
+
+log = logging.getLogger(__name__)
+
+BYTES_PER_JOINED_ROW = 200
+BYTES_PER_OUTPUT_ROW = 100
+
+
+@dataclass(frozen=True)
+class SpecMemoryEstimate:
+    intermediate_bytes: int
+    """Peak memory while the spec is processed in a worker."""
+    output_bytes: int
+    """Memory of the spec's flattened column, held until the chunk is concatenated."""
+
+
+@dataclass(frozen=True)
+class FeatureChunk:
+    start: int
+    """Index of the chunk's first spec in the full list of specs. Identifies the chunk."""
+    specs: list[AnySpec]
+    n_workers: int
+    estimated_memory_bytes: int
+
+
+def _look_window_fraction(
+    spec: AnySpec, timeseries_df: pd.DataFrame, timestamp_col_name: str
+) -> float:
+    """Fraction of an entity's values that fall within the spec's look window, assuming values are spread evenly in time."""
+    if isinstance(spec, PredictorSpec):
+        window_days = spec.lookbehind_period.max_days - spec.lookbehind_period.min_days
+    elif isinstance(spec, OutcomeSpec):
+        window_days = spec.lookahead_period.max_days - spec.lookahead_period.min_days
+    else:
+        return 1.0
+
+    timestamps = timeseries_df[timestamp_col_name]
+    span_days = (timestamps.max() - timestamps.min()).days
+    if span_days <= 0:
+        return 1.0
+    return min(1.0, window_days / span_days)
+
+
+def estimate_spec_memory(
+    spec: AnySpec,
+    n_prediction_times: int,
+    entity_id_col_name: str = "entity_id",
+    timestamp_col_name: str = "timestamp",
+) -> SpecMemoryEstimate:
+    """Estimate the memory needed to flatten spec for n_prediction_times prediction times."""
+    output_bytes = n_prediction_times * BYTES_PER_OUTPUT_ROW
+    timeseries_df = spec.timeseries_df
+    if len(timeseries_df) == 0:
+        return SpecMemoryEstimate(intermediate_bytes=output_bytes, output_bytes=output_bytes)
+
+    values_per_entity = len(timeseries_df) / max(timeseries_df[entity_id_col_name].nunique(), 1)
+    joined_rows = n_prediction_times * values_per_entity
+    if timestamp_col_name in timeseries_df.columns:
+        joined_rows *= 1 + _look_window_fraction(
+            spec, timeseries_df=timeseries_df, timestamp_col_name=timestamp_col_name
+        )
+
+    return SpecMemoryEstimate(
+        intermediate_bytes=int(joined_rows * BYTES_PER_JOINED_ROW) + output_bytes,
+        output_bytes=output_bytes,
+    )
+
+
+def _chunk_memory(estimates: list[SpecMemoryEstimate], n_workers: int) -> int:
+    largest_intermediates = sorted((e.intermediate_bytes for e in estimates), reverse=True)
+    return sum(e.output_bytes for e in estimates) + sum(largest_intermediates[:n_workers])
+
+
+def plan_feature_chunks(
+    feature_specs: list[AnySpec],
+    n_prediction_times: int,
+    memory_budget_bytes: int,
+    max_workers: int | None = None,
+    entity_id_col_name: str = "entity_id",
+    timestamp_col_name: str = "timestamp",
+) -> list[FeatureChunk]:
+    """Split feature_specs into consecutive chunks which each fit in memory_budget_bytes.
+
+    Chunks are filled greedily, assuming one worker. Each chunk then gets as many workers, up to max_workers, as its
+    budget allows. A spec which does not fit the budget on its own gets a chunk with a single worker.
+    """
+    max_workers = max_workers or os.cpu_count() or 4
+    estimates = [
+        estimate_spec_memory(
+            spec,
+            n_prediction_times=n_prediction_times,
+            entity_id_col_name=entity_id_col_name,
+            timestamp_col_name=timestamp_col_name,
+        )
+        for spec in feature_specs
+    ]
+
+    chunk_bounds: list[tuple[int, int]] = []
+    start = output_bytes = max_intermediate_bytes = 0
+    for i, estimate in enumerate(estimates):
+        if (
+            i > start
+            and output_bytes
+            + estimate.output_bytes
+            + max(max_intermediate_bytes, estimate.intermediate_bytes)
+            > memory_budget_bytes
+        ):
+            chunk_bounds.append((start, i))
+            start, output_bytes, max_intermediate_bytes = i, 0, 0
+        output_bytes += estimate.output_bytes
+        max_intermediate_bytes = max(max_intermediate_bytes, estimate.intermediate_bytes)
+    if feature_specs:
+        chunk_bounds.append((start, len(feature_specs)))
+
+    chunks = []
+    for start, end in chunk_bounds:
+        chunk_estimates = estimates[start:end]
+        n_workers = 1
+        while n_workers < min(max_workers, end - start) and (
+            _chunk_memory(chunk_estimates, n_workers=n_workers + 1) <= memory_budget_bytes
+        ):
+            n_workers += 1
+
+        estimated_memory_bytes = _chunk_memory(chunk_estimates, n_workers=n_workers)
+        if estimated_memory_bytes > memory_budget_bytes:
+            log.warning(
+                f"{feature_specs[start].get_output_col_name()} is estimated to need {estimated_memory_bytes / 1024**3:.1f} GiB, more than the budget of {memory_budget_bytes / 1024**3:.1f} GiB"
+            )
+        chunks.append(
+            FeatureChunk(
+                start=start,
+                specs=feature_specs[start:end],
+                n_workers=n_workers,
+                estimated_memory_bytes=estimated_memory_bytes,
+            )
+        )
+
+    return chunks
@@ -1,9 +1,21 @@
+import hashlib
+import json
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
 import pandas as pd
 import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
 from timeseriesflattener.v1.feature_specs.single_specs import AnySpec
 
+from psycop.common.feature_generation.application_modules.chunk_sizing import (
+    FeatureChunk,
+    plan_feature_chunks,
+)
 from psycop.common.feature_generation.application_modules.flatten_dataset import (
     create_flattened_dataset_tsflattener_v1,
 )
@@ -12,6 +24,34 @@ from psycop.common.feature_generation.application_modules.save_dataset_to_disk i
     save_chunk_to_disk,
 )
 
+log = logging.getLogger(__name__)
+
+CHUNK_MANIFEST_FILENAME = "chunk_manifest.json"
+MERGED_CHUNKS_FILENAME = "flattened_dataset_merged.parquet"
+
+
+def _chunk_file_name(chunk: int) -> str:
+    return f"flattened_dataset_chunk_{chunk}.parquet"
+
+
+def _generate_chunk(
+    project_info: ProjectInfo,
+    eligible_prediction_times: pd.DataFrame,
+    feature_specs: list[AnySpec],
+    chunk: int,
+    feature_set_dir: Path,
+    n_workers: int | None = None,
+) -> int:
+    flattened_df_chunk = create_flattened_dataset_tsflattener_v1(
+        feature_specs=feature_specs,
+        prediction_times_df=eligible_prediction_times,
+        drop_pred_times_with_insufficient_look_distance=False,
+        project_info=project_info,
+        n_workers=n_workers,
+    )
+    save_chunk_to_disk(flattened_df_chunk, chunk, feature_set_dir)
+    return chunk
+
 
 class ChunkedFeatureGenerator:
     @staticmethod
@@ -21,33 +61,254 @@ class ChunkedFeatureGenerator:
         feature_specs: list[AnySpec],
         feature_set_dir: Path | None = None,
         chunksize: int = 400,
+        n_workers: int = 1,
+        memory_budget_bytes: int | None = None,
     ) -> pd.DataFrame:
-        """Generate features in chunks to avoid memory issues"""
+        """Generate features in chunks to avoid memory issues.
+
+        Completed chunks are recorded in a manifest in feature_set_dir, with a hash of their specs and the prediction times.
+        If a run crashes, rerunning with the same specs and prediction times only generates the missing chunks.
+
+        Args:
+            project_info: Project info.
+            eligible_prediction_times: Prediction times to generate features for.
+            feature_specs: Feature specifications.
+            feature_set_dir: Directory to save the chunks in. Defaults to project_info.flattened_dataset_dir.
+            chunksize: Number of feature specs per chunk. Ignored if memory_budget_bytes is set.
+            n_workers: Number of chunks to generate concurrently, each in its own process. Defaults to 1, which
+                generates the chunks one at a time in the current process.
+            memory_budget_bytes: If set, specs are packed into chunks by their estimated memory use, and each chunk
+                gets as many spec workers as fit, so that the chunks generated concurrently fit in memory_budget_bytes
+                together. See chunk_sizing.plan_feature_chunks.
+        """
 
         if not feature_set_dir:
             feature_set_dir = project_info.flattened_dataset_dir
+        feature_set_dir.mkdir(parents=True, exist_ok=True)
+
+        if memory_budget_bytes is not None:
+            chunks = plan_feature_chunks(
+                feature_specs=feature_specs,
+                n_prediction_times=len(eligible_prediction_times),
+                memory_budget_bytes=memory_budget_bytes // n_workers,
+                entity_id_col_name=project_info.col_names.id,
+                timestamp_col_name=project_info.col_names.timestamp,
+            )
+        else:
+            chunks = [
+                FeatureChunk(
+                    start=i,
+                    specs=feature_specs[i : i + chunksize],
+                    # The CPUs are shared by the n_workers chunks generated concurrently
+                    n_workers=min(
+                        len(feature_specs[i : i + chunksize]),
+                        max((os.cpu_count() or 4) // n_workers, 1),
+                    ),
+                    estimated_memory_bytes=0,
+                )
+                for i in range(0, len(feature_specs), chunksize)
+            ]
+        chunks_by_start = {chunk.start: chunk for chunk in chunks}
+
+        prediction_times_hash = ChunkedFeatureGenerator._prediction_times_hash(
+            eligible_prediction_times[[project_info.col_names.id, project_info.col_names.timestamp]]
+        )
+        chunk_spec_hashes = {
+            chunk.start: ChunkedFeatureGenerator._chunk_spec_hash(
+                chunk.specs, prediction_times_hash=prediction_times_hash
+            )
+            for chunk in chunks
+        }
 
-        ChunkedFeatureGenerator.remove_files_from_dir(  # Ensures that all saved chunks from previous crashed run are removed
-            feature_set_dir
+        manifest = ChunkedFeatureGenerator._read_valid_manifest(
+            feature_set_dir=feature_set_dir, chunk_spec_hashes=chunk_spec_hashes
+        )
+        missing_chunks = [i for i in chunk_spec_hashes if str(i) not in manifest]
+        print(
+            f"Generating features in {len(chunks)} chunks. {len(chunk_spec_hashes) - len(missing_chunks)} of {len(chunk_spec_hashes)} chunks are already done."
         )
 
-        print(f"Generating features in chunks of {chunksize}")
-        for i in range(0, len(feature_specs), chunksize):
-            print(f"Generating features for chunk {i} to {i + chunksize}")
-            flattened_df_chunk = create_flattened_dataset_tsflattener_v1(
-                feature_specs=feature_specs[i : i + chunksize],
-                prediction_times_df=eligible_prediction_times,
-                drop_pred_times_with_insufficient_look_distance=False,
-                project_info=project_info,
+        def mark_done(chunk: int) -> None:
+            manifest[str(chunk)] = chunk_spec_hashes[chunk]
+            ChunkedFeatureGenerator._write_manifest(
+                feature_set_dir=feature_set_dir, manifest=manifest
             )
-            save_chunk_to_disk(flattened_df_chunk, i, feature_set_dir)
+
+        if n_workers == 1:
+            for i in missing_chunks:
+                chunk = chunks_by_start[i]
+                print(
+                    f"Generating features for chunk {i} to {i + len(chunk.specs)} with {chunk.n_workers} workers"
+                )
+                mark_done(
+                    _generate_chunk(
+                        project_info=project_info,
+                        eligible_prediction_times=eligible_prediction_times,
+                        feature_specs=chunk.specs,
+                        chunk=i,
+                        feature_set_dir=feature_set_dir,
+                        n_workers=chunk.n_workers,
+                    )
+                )
+        else:
+            failures: list[tuple[int, Exception]] = []
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                futures = {
+                    executor.submit(
+                        _generate_chunk,
+                        project_info=project_info,
+                        eligible_prediction_times=eligible_prediction_times,
+                        feature_specs=chunks_by_start[i].specs,
+                        chunk=i,
+                        feature_set_dir=feature_set_dir,
+                        n_workers=chunks_by_start[i].n_workers,
+                    ): i
+                    for i in missing_chunks
+                }
+                # Every chunk which succeeds is recorded, also after another chunk has failed, so a rerun resumes from it
+                for future in as_completed(futures):
+                    try:
+                        chunk = future.result()
+                    except Exception as e:
+                        log.error(f"Generating features for chunk {futures[future]} failed: {e}")
+                        failures.append((futures[future], e))
+                        continue
+                    print(
+                        f"Generated features for chunk {chunk} to {chunk + len(chunks_by_start[chunk].specs)}"
+                    )
+                    mark_done(chunk)
+
+            if failures:
+                log.error(
+                    f"{len(failures)} of {len(futures)} chunks failed. Rerun to generate only the missing chunks."
+                )
+                raise failures[0][1]
 
         print("Feature generation done. Merging feature sets...")
-        df = ChunkedFeatureGenerator.merge_feature_sets_from_dirs(feature_set_dir)
+        merged_path = ChunkedFeatureGenerator.stream_merge_feature_chunks(
+            chunk_paths=[feature_set_dir / _chunk_file_name(chunk) for chunk in chunk_spec_hashes],
+            output_path=feature_set_dir / MERGED_CHUNKS_FILENAME,
+        )
+        df = pd.read_parquet(merged_path)
 
         ChunkedFeatureGenerator.remove_files_from_dir(feature_set_dir)
 
-        return df.to_pandas()
+        return df
+
+    @staticmethod
+    def _prediction_times_hash(prediction_times: pd.DataFrame) -> str:
+        """Hash of the ids and timestamps. Other columns are not hashed, since flattening may add columns to the prediction times in place."""
+        return hashlib.sha256(
+            pd.util.hash_pandas_object(prediction_times, index=False).to_numpy().tobytes()
+        ).hexdigest()
+
+    @staticmethod
+    def _chunk_spec_hash(feature_specs: list[AnySpec], prediction_times_hash: str) -> str:
+        """Hash of the output columns of the specs, which encode their names, look periods, aggregations and fallbacks."""
+        return hashlib.sha256(
+            "\n".join(
+                [prediction_times_hash, *(spec.get_output_col_name() for spec in feature_specs)]
+            ).encode()
+        ).hexdigest()
+
+    @staticmethod
+    def _read_valid_manifest(
+        feature_set_dir: Path, chunk_spec_hashes: dict[int, str]
+    ) -> dict[str, str]:
+        """Read the manifest of completed chunks, keeping only chunks whose spec hash matches the current run.
+        Chunk files which are not in the resulting manifest, e.g. from a crashed or different run, are removed.
+        """
+        manifest_path = feature_set_dir / CHUNK_MANIFEST_FILENAME
+        manifest: dict[str, str] = (
+            json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+        )
+        valid_manifest = {
+            chunk: spec_hash
+            for chunk, spec_hash in manifest.items()
+            if chunk_spec_hashes.get(int(chunk)) == spec_hash
+            and (feature_set_dir / _chunk_file_name(int(chunk))).exists()
+        }
+
+        for chunk_path in feature_set_dir.glob("flattened_dataset_chunk_*.parquet"):
+            if ChunkedFeatureGenerator._chunk_idx(chunk_path) not in valid_manifest:
+                log.info(f"Removing chunk {chunk_path}, which does not match the current run")
+                chunk_path.unlink()
+
+        return valid_manifest
+
+    @staticmethod
+    def _write_manifest(feature_set_dir: Path, manifest: dict[str, str]) -> None:
+        tmp_path = feature_set_dir / f"{CHUNK_MANIFEST_FILENAME}.tmp"
+        tmp_path.write_text(json.dumps(manifest, indent=2))
+        tmp_path.replace(feature_set_dir / CHUNK_MANIFEST_FILENAME)
+
+    @staticmethod
+    def _chunk_idx(chunk_path: Path) -> str:
+        return re.sub(r"^flattened_dataset_chunk_", "", chunk_path.stem)
+
+    @staticmethod
+    def stream_merge_feature_chunks(
+        chunk_paths: list[Path],
+        output_path: Path,
+        uuid_col_name: str = "prediction_time_uuid",
+        batch_size: int = 100_000,
+    ) -> Path:
+        """Merge chunks horizontally into one Parquet file, reading batch_size rows from each chunk at a time.
+
+        Columns which are already in an earlier chunk (e.g. ids and timestamps) are only kept from the first chunk.
+        Each batch is checked to have the same prediction time uuids in all chunks, so misaligned chunks raise instead of being merged silently.
+        """
+        chunk_files = [pq.ParquetFile(path) for path in chunk_paths]
+
+        n_rows = {file.metadata.num_rows for file in chunk_files}
+        if len(n_rows) > 1:
+            raise ValueError(f"Chunks have different numbers of rows: {sorted(n_rows)}")
+
+        seen_columns: set[str] = set()
+        new_columns_per_chunk: list[list[str]] = []
+        for file in chunk_files:
+            new_columns = [col for col in file.schema_arrow.names if col not in seen_columns]
+            new_columns_per_chunk.append(new_columns)
+            seen_columns.update(new_columns)
+
+        batch_iterators = [
+            file.iter_batches(
+                batch_size=batch_size, columns=list(dict.fromkeys([uuid_col_name, *new_columns]))
+            )
+            for file, new_columns in zip(chunk_files, new_columns_per_chunk)
+        ]
+
+        merged_schema = pa.schema(
+            [
+                file.schema_arrow.field(col)
+                for file, new_columns in zip(chunk_files, new_columns_per_chunk)
+                for col in new_columns
+            ]
+        )
+
+        tmp_path = output_path.with_suffix(".tmp")
+        with pq.ParquetWriter(tmp_path, schema=merged_schema) as writer:
+            for batch_idx, batches in enumerate(zip(*batch_iterators)):
+                uuids = batches[0].column(uuid_col_name)
+                for chunk_path, batch in zip(chunk_paths[1:], batches[1:]):
+                    if not batch.column(uuid_col_name).equals(uuids):
+                        raise ValueError(
+                            f"Rows of {chunk_path} are not aligned with {chunk_paths[0]} in batch {batch_idx}"
+                        )
+
+                writer.write_table(
+                    pa.Table.from_arrays(
+                        [
+                            batch.column(col)
+                            for batch, new_columns in zip(batches, new_columns_per_chunk)
+                            for col in new_columns
+                        ],
+                        schema=merged_schema,
+                    )
+                )
+
+        tmp_path.replace(output_path)
+        return output_path
 
     @staticmethod
     def merge_feature_sets_from_dirs(feature_dir: Path) -> pl.DataFrame:
@@ -77,9 +338,13 @@ class ChunkedFeatureGenerator:
 
     @staticmethod
     def _read_chunk_dfs_from_dir(feature_dir: Path) -> list[pl.DataFrame]:
-        df_dirs = feature_dir.glob("flattened_dataset_chunk_*.parquet")
+        """Read the chunks in order of their first feature spec, so the column order of the merged dataset is deterministic."""
+        df_dirs = sorted(
+            feature_dir.glob("flattened_dataset_chunk_*.parquet"),
+            key=lambda path: int(ChunkedFeatureGenerator._chunk_idx(path)),
+        )
 
-        return [pl.read_parquet(chunk_dir) for chunk_dir in df_dirs]  # type: ignore
+        return [pl.read_parquet(chunk_dir) for chunk_dir in df_dirs]
 
     @staticmethod
     def _find_shared_cols(dfs: list[pl.DataFrame]) -> list[str]:
@@ -97,3 +362,6 @@ class ChunkedFeatureGenerator:
 
         for file in df_dirs:
             Path.unlink(Path(file))
+
+        (feature_dir / CHUNK_MANIFEST_FILENAME).unlink(missing_ok=True)
+        (feature_dir / MERGED_CHUNKS_FILENAME).unlink(missing_ok=True)
@@ -0,0 +1,165 @@
+"""Non-interactive management of feature set directories.
+
+A feature set is written to a temporary directory next to its target, which is moved into place when writing has
+succeeded, so an interrupted job never leaves a half-written feature set behind. A lock file next to the target makes
+concurrent jobs that write the same feature set wait for each other. Combined with overwrite_policy="reuse", jobs that
+waited use the completed feature set instead of recomputing it.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Literal
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator, Sequence
+    from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+OverwritePolicy = Literal["fail", "overwrite", "version", "reuse"]
+"""What to do when the feature set already exists.
+
+fail: Raise FeatureSetExistsError.
+overwrite: Replace the files in the directory with the newly written files. Other files in the directory are kept.
+version: Write to the first free directory named <feature_set_dir>_v2, <feature_set_dir>_v3, ...
+reuse: Do not write anything, and use the existing feature set.
+"""
+
+
+class FeatureSetExistsError(FileExistsError):
+    pass
+
+
+@contextmanager
+def feature_set_lock(
+    feature_set_dir: Path, timeout: float | None = None, poll_interval: float = 5
+) -> Iterator[None]:
+    """Hold a lock on feature_set_dir, waiting for other holders to release it.
+
+    The lock is a file next to feature_set_dir, created exclusively, so it also works on network drives and Windows.
+    If a job is killed while holding the lock, the lock file must be removed by hand.
+    """
+    lock_path = feature_set_dir.with_name(f"{feature_set_dir.name}.lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+
+    start = time.monotonic()
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            if timeout is not None and time.monotonic() - start > timeout:
+                raise TimeoutError(
+                    f"Could not acquire {lock_path} within {timeout} seconds. If no other job is writing the feature set, remove the lock file."
+                ) from None
+            log.info(f"Waiting for another job to release {lock_path}")
+            time.sleep(poll_interval)
+
+    try:
+        os.write(fd, f"{os.getpid()}\n".encode())
+        os.close(fd)
+        yield
+    finally:
+        lock_path.unlink(missing_ok=True)
+
+
+def _next_version_dir(feature_set_dir: Path) -> Path:
+    version = 2
+    while (
+        versioned_dir := feature_set_dir.with_name(f"{feature_set_dir.name}_v{version}")
+    ).exists():
+        version += 1
+    return versioned_dir
+
+
+def _feature_set_exists(feature_set_dir: Path, output_names: Sequence[str] | None) -> bool:
+    if output_names is None:
+        return feature_set_dir.exists()
+    return all((feature_set_dir / name).exists() for name in output_names)
+
+
+def _move_contents(src_dir: Path, dst_dir: Path) -> None:
+    """Move each entry of src_dir into dst_dir, replacing existing entries. Files are replaced atomically."""
+    dst_dir.mkdir(parents=True, exist_ok=True)
+    for src_path in src_dir.iterdir():
+        dst_path = dst_dir / src_path.name
+        if dst_path.is_dir():
+            shutil.rmtree(dst_path)
+        src_path.replace(dst_path)
+
+
+@dataclass(frozen=True)
+class FeatureSetWrite:
+    """Where to write a feature set.
+
+    Args:
+        feature_set_dir: The directory the feature set ends up in.
+        write_dir: The temporary directory to write the feature set to, or None if an existing feature set is reused.
+    """
+
+    feature_set_dir: Path
+    write_dir: Path | None
+
+    @property
+    def reused(self) -> bool:
+        return self.write_dir is None
+
+
+@contextmanager
+def write_feature_set_dir(
+    feature_set_dir: Path,
+    overwrite_policy: OverwritePolicy = "fail",
+    lock_timeout: float | None = None,
+    output_names: Sequence[str] | None = None,
+) -> Iterator[FeatureSetWrite]:
+    """Lock feature_set_dir and provide a temporary directory to write the feature set to.
+
+    The feature set exists if feature_set_dir exists, or, if output_names is given, if all the named entries exist in
+    it. Pass output_names when feature_set_dir is shared with other files, e.g. flattened_dataset_dir itself.
+
+    If the block succeeds, the contents of the temporary directory are moved into the feature set directory. If it
+    raises, the temporary directory is removed and the feature set directory is left untouched.
+
+    Example:
+        >>> with write_feature_set_dir(feature_set_dir, overwrite_policy="reuse") as feature_set_write:
+        >>>     if not feature_set_write.reused:
+        >>>         df.write_parquet(feature_set_write.write_dir / "features.parquet")
+    """
+    with feature_set_lock(feature_set_dir, timeout=lock_timeout):
+        if _feature_set_exists(feature_set_dir, output_names=output_names):
+            match overwrite_policy:
+                case "fail":
+                    raise FeatureSetExistsError(
+                        f"The path '{feature_set_dir}' already exists. Set overwrite_policy to 'overwrite', 'version' or 'reuse' to write anyway."
+                    )
+                case "reuse":
+                    log.info(f"Reusing existing feature set in '{feature_set_dir}'")
+                    yield FeatureSetWrite(feature_set_dir=feature_set_dir, write_dir=None)
+                    return
+                case "version":
+                    feature_set_dir = _next_version_dir(feature_set_dir)
+                    log.info(f"Feature set already exists, writing to '{feature_set_dir}'")
+                case "overwrite":
+                    log.info(f"Files in '{feature_set_dir}' will be overwritten")
+                case _:
+                    raise ValueError(f"Unknown overwrite_policy {overwrite_policy}")
+
+        write_dir = feature_set_dir.with_name(f".{feature_set_dir.name}.tmp-{uuid.uuid4().hex[:8]}")
+        write_dir.mkdir(parents=True)
+        try:
+            yield FeatureSetWrite(feature_set_dir=feature_set_dir, write_dir=write_dir)
+
+            if feature_set_dir.exists():
+                _move_contents(src_dir=write_dir, dst_dir=feature_set_dir)
+            else:
+                write_dir.replace(feature_set_dir)
+        finally:
+            if write_dir.exists():
+                shutil.rmtree(write_dir)
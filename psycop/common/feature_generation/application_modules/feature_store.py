@@ -0,0 +1,166 @@
+"""On-disk store of flattened feature columns, one entry per spec.
+
+Each spec's processed output (the prediction time uuid and the spec's feature columns) is stored under a key made from
+the spec's configuration, a fingerprint of its value frame and a fingerprint of the prediction times. When a feature set
+is regenerated, only new or changed specs are processed, and the feature set is assembled from the stored columns.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import shutil
+from typing import TYPE_CHECKING, Any
+
+import pandas as pd
+import polars as pl
+from timeseriesflattener.utils import horizontally_concatenate_dfs
+
+from psycop.common.feature_generation.application_modules.flatten_dataset import (
+    process_specs,
+    validate_specs,
+)
+
+if TYPE_CHECKING:
+    import datetime as dt
+    from collections.abc import Sequence
+    from pathlib import Path
+
+    from timeseriesflattener import Flattener
+    from timeseriesflattener import PredictionTimeFrame as FlattenerPredictionTimeFrame
+
+    from psycop.common.feature_generation.application_modules.flattening_profile import (
+        FlatteningProfiler,
+    )
+    from psycop.common.feature_generation.application_modules.generate_feature_set import (
+        ValueSpecification,
+    )
+
+log = logging.getLogger(__name__)
+
+
+def frame_fingerprint(df: pl.DataFrame | pd.DataFrame) -> str:
+    """Hash of the schema and the rows of df, in order."""
+    if isinstance(df, pd.DataFrame):
+        df = pl.from_pandas(df)
+
+    fingerprint = hashlib.sha256(repr(list(df.schema.items())).encode())
+    fingerprint.update(df.hash_rows(seed=0).to_numpy().tobytes())
+    return fingerprint.hexdigest()
+
+
+def _describe(obj: Any, frame_fingerprints: dict[int, str]) -> Any:
+    """JSON-serialisable description of obj, with frames replaced by their fingerprint.
+
+    Objects are described by their type and attributes, since e.g. aggregators do not have a stable repr.
+    """
+    if isinstance(obj, (pl.DataFrame, pd.DataFrame)):
+        if id(obj) not in frame_fingerprints:
+            frame_fingerprints[id(obj)] = frame_fingerprint(obj)
+        return frame_fingerprints[id(obj)]
+    if isinstance(obj, (list, tuple)):
+        return [_describe(item, frame_fingerprints) for item in obj]
+    if isinstance(obj, dict):
+        return {str(key): _describe(value, frame_fingerprints) for key, value in obj.items()}
+    if hasattr(obj, "__dict__"):
+        return {
+            "type": f"{type(obj).__module__}.{type(obj).__qualname__}",
+            "attributes": _describe(vars(obj), frame_fingerprints),
+        }
+    return repr(obj)
+
+
+class FeatureStore:
+    """Processed spec outputs, stored as one Parquet file per key in store_dir."""
+
+    def __init__(self, store_dir: Path):
+        self.store_dir = store_dir
+        # Specs often share a value frame, so each frame is only hashed once per run
+        self._frame_fingerprints: dict[int, str] = {}
+
+    def key(
+        self,
+        spec: ValueSpecification,
+        prediction_times_fingerprint: str,
+        step_size: dt.timedelta | None = None,
+    ) -> str:
+        description = json.dumps(
+            {
+                "spec": _describe(spec, self._frame_fingerprints),
+                "prediction_times": prediction_times_fingerprint,
+                "step_size": repr(step_size),
+            }
+        )
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.store_dir / f"{key}.parquet"
+
+    def _write(self, key: str, df: pl.DataFrame) -> None:
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._path(key).with_suffix(".tmp")
+        df.write_parquet(tmp_path)
+        tmp_path.replace(self._path(key))
+
+    def aggregate_timeseries(
+        self,
+        flattener: Flattener,
+        specs: Sequence[ValueSpecification],
+        step_size: dt.timedelta | None = None,
+        profiler: FlatteningProfiler | None = None,
+    ) -> pl.DataFrame:
+        """Flatten specs with flattener, processing only the specs which are not in the store.
+
+        All specs are validated before the lookup, so conflicting specs raise a SpecError even if they are stored.
+        """
+        predictiontime_frame: FlattenerPredictionTimeFrame = flattener.predictiontime_frame
+        validate_specs(specs=specs, predictiontime_frame=predictiontime_frame)
+        uuid_col_name = predictiontime_frame.prediction_time_uuid_col_name
+        prediction_times_fingerprint = frame_fingerprint(predictiontime_frame.df)
+
+        try:
+            keys = [
+                self.key(
+                    spec,
+                    prediction_times_fingerprint=prediction_times_fingerprint,
+                    step_size=step_size,
+                )
+                for spec in specs
+            ]
+        finally:
+            self._frame_fingerprints.clear()
+
+        missing = [(key, spec) for key, spec in zip(keys, specs) if not self._path(key).exists()]
+        log.info(
+            f"Feature store: {len(specs) - len(missing)} of {len(specs)} specs are stored, processing {len(missing)}"
+        )
+
+        processed_dfs = process_specs(
+            predictiontime_frame=predictiontime_frame,
+            specs=[spec for _, spec in missing],
+            n_workers=flattener.n_workers,
+            step_size=step_size,
+            profiler=profiler,
+        )
+        for (key, _), processed_df in zip(missing, processed_dfs):
+            self._write(key, processed_df)
+
+        prediction_time_uuids = predictiontime_frame.df.get_column(uuid_col_name)
+        feature_dfs = []
+        for key in keys:
+            feature_df = pl.read_parquet(self._path(key))
+            if not feature_df.get_column(uuid_col_name).equals(prediction_time_uuids):
+                raise ValueError(
+                    f"Stored features in {self._path(key)} are not aligned with the prediction times"
+                )
+            feature_dfs.append(feature_df)
+
+        return horizontally_concatenate_dfs(
+            [predictiontime_frame.df, *feature_dfs], prediction_time_uuid_col_name=uuid_col_name
+        )
+
+    def clear(self) -> None:
+        """Remove all stored features."""
+        if self.store_dir.exists():
+            shutil.rmtree(self.store_dir)
@@ -4,10 +4,19 @@ from __future__ import annotations
 
 import logging
 import os
-from typing import TYPE_CHECKING
+from functools import partial
+from multiprocessing import Pool
+from typing import TYPE_CHECKING, Any
 
 from timeseriesflattener import Flattener
 from timeseriesflattener import PredictionTimeFrame as FlattenerPredictionTimeFrame
+from timeseriesflattener.main import (
+    SpecError,
+    _get_spec_conflicts,  # type: ignore
+    _specs_contain_required_columns,  # type: ignore
+)
+from timeseriesflattener.processors import process_spec
+from timeseriesflattener.utils import horizontally_concatenate_dfs
 from timeseriesflattener.v1.flattened_dataset import TimeseriesFlattener
 
 from psycop.common.feature_generation.application_modules.save_dataset_to_disk import (
@@ -17,14 +26,18 @@ from psycop.common.feature_generation.loaders.raw.load_demographic import birthd
 
 if TYPE_CHECKING:
     import datetime as dt
-    from collections.abc import Sequence
+    from collections.abc import Iterator, Sequence
     from pathlib import Path
 
     import pandas as pd
     import polars as pl
-    from timeseriesflattener.v1.feature_specs.single_specs import AnySpec
+    from timeseriesflattener.v1.feature_specs.single_specs import AnySpec, TemporalSpec
 
     from psycop.common.cohort_definition import PredictionTimeFrame
+    from psycop.common.feature_generation.application_modules.feature_store import FeatureStore
+    from psycop.common.feature_generation.application_modules.flattening_profile import (
+        FlatteningProfiler,
+    )
     from psycop.common.feature_generation.application_modules.generate_feature_set import (
         ValueSpecification,
     )
@@ -58,12 +71,80 @@ def flatten_dataset_to_disk(
     )
 
 
+def _process_spec(
+    spec: ValueSpecification,
+    predictiontime_frame: FlattenerPredictionTimeFrame,
+    step_size: dt.timedelta | None = None,
+    profiler: FlatteningProfiler | None = None,
+) -> pl.DataFrame:
+    if profiler is None:
+        return process_spec(
+            spec=spec, predictiontime_frame=predictiontime_frame, step_size=step_size
+        ).df
+
+    with profiler.measure(
+        name=f"{spec.column_prefix}_{'_'.join(spec.value_frame.value_col_names)}",
+        kind="spec",
+        rows_in=spec.value_frame.df.height,
+    ) as measurement:
+        df = process_spec(
+            spec=spec, predictiontime_frame=predictiontime_frame, step_size=step_size
+        ).df
+        measurement.rows_out = df.height
+        measurement.n_columns_out = df.width - 1  # Excluding the prediction time uuid
+    return df
+
+
+def validate_specs(
+    specs: Sequence[ValueSpecification], predictiontime_frame: FlattenerPredictionTimeFrame
+) -> None:
+    """Raise a SpecError if specs conflict or lack required columns, with the same checks as Flattener.aggregate_timeseries."""
+    errors = _get_spec_conflicts(specs) + _specs_contain_required_columns(
+        specs=specs, predictiontime_frame=predictiontime_frame
+    )
+    if errors:
+        raise SpecError(
+            "Conflicting specs." + "".join(f"  \n - {error.description}" for error in errors)
+        )
+
+
+def process_specs(
+    predictiontime_frame: FlattenerPredictionTimeFrame,
+    specs: Sequence[ValueSpecification],
+    n_workers: int | None,
+    step_size: dt.timedelta | None = None,
+    profiler: FlatteningProfiler | None = None,
+) -> Iterator[pl.DataFrame]:
+    """Process each spec into a frame with the prediction time uuid and the spec's feature columns, in order of specs.
+
+    Like Flattener, specs are processed one at a time if n_workers is None, and in a pool of n_workers processes otherwise.
+    """
+    process = partial(
+        _process_spec,
+        predictiontime_frame=predictiontime_frame,
+        step_size=step_size,
+        profiler=profiler,
+    )
+    if n_workers is None or len(specs) <= 1:
+        yield from map(process, specs)
+        return
+
+    with Pool(n_workers) as pool:
+        yield from pool.imap(process, specs)
+
+
 def create_flattened_dataset(
     feature_specs: Sequence[ValueSpecification],
     prediction_times_frame: PredictionTimeFrame,
     n_workers: int | None,
     step_size: dt.timedelta | None = None,
+    feature_store: FeatureStore | None = None,
+    profiler: FlatteningProfiler | None = None,
 ) -> pl.DataFrame:
+    """Flatten the specs. If a feature_store is given, only specs which are not in the store are processed.
+
+    If a profiler is given, each processed spec is measured.
+    """
     flattener = Flattener(
         predictiontime_frame=FlattenerPredictionTimeFrame(
             init_df=prediction_times_frame.frame,
@@ -72,15 +153,56 @@ def create_flattened_dataset(
         ),
         n_workers=n_workers,
     )
+    if feature_store is not None:
+        return feature_store.aggregate_timeseries(
+            flattener=flattener, specs=feature_specs, step_size=step_size, profiler=profiler
+        )
+    if profiler is not None:
+        predictiontime_frame = flattener.predictiontime_frame
+        validate_specs(specs=feature_specs, predictiontime_frame=predictiontime_frame)
+        return horizontally_concatenate_dfs(
+            [
+                predictiontime_frame.df,
+                *process_specs(
+                    predictiontime_frame=predictiontime_frame,
+                    specs=feature_specs,
+                    n_workers=n_workers,
+                    step_size=step_size,
+                    profiler=profiler,
+                ),
+            ],
+            prediction_time_uuid_col_name=predictiontime_frame.prediction_time_uuid_col_name,
+        )
     return flattener.aggregate_timeseries(specs=feature_specs, step_size=step_size).df
 
 
+class _ProfiledTimeseriesFlattener(TimeseriesFlattener):
+    """Measures each temporal spec. The measurements are written from the worker processes."""
+
+    def __init__(self, *args: Any, profiler: FlatteningProfiler, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.profiler = profiler
+
+    def _get_temporal_feature(self, feature_spec: TemporalSpec) -> pd.DataFrame:
+        with self.profiler.measure(
+            name=feature_spec.get_output_col_name(),
+            kind="spec",
+            rows_in=len(feature_spec.timeseries_df),
+        ) as measurement:
+            df = super()._get_temporal_feature(feature_spec=feature_spec)
+            measurement.rows_out = len(df)
+            measurement.n_columns_out = df.shape[1]
+        return df
+
+
 def create_flattened_dataset_tsflattener_v1(
     project_info: ProjectInfo,
     feature_specs: list[AnySpec],
     prediction_times_df: pd.DataFrame,
     add_birthdays: bool = True,
     drop_pred_times_with_insufficient_look_distance: bool = False,
+    profiler: FlatteningProfiler | None = None,
+    n_workers: int | None = None,
 ) -> pd.DataFrame:
     """Create flattened dataset.
 
@@ -92,18 +214,24 @@ def create_flattened_dataset_tsflattener_v1(
         drop_pred_times_with_insufficient_look_distance (bool): Whether to drop prediction times with insufficient look distance.
             See timeseriesflattener tutorial for more info.
         add_birthdays: Whether to add age at prediction time.
+        profiler: If given, each temporal spec and the birthdays loader are measured.
+        n_workers: Number of processes to flatten temporal specs in. Defaults to one per spec, up to the number of CPUs.
 
     Returns:
         FlattenedDataset: Flattened dataset.
     """
 
-    cpu_count = os.cpu_count()
-    if cpu_count is None:
-        cpu_count = 4
+    if n_workers is None:
+        cpu_count = os.cpu_count()
+        if cpu_count is None:
+            cpu_count = 4
+        n_workers = min(len(feature_specs), cpu_count)
 
-    flattened_dataset = TimeseriesFlattener(
+    flattener_kwargs = {} if profiler is None else {"profiler": profiler}
+    flattened_dataset = (TimeseriesFlattener if profiler is None else _ProfiledTimeseriesFlattener)(
+        **flattener_kwargs,
         prediction_times_df=prediction_times_df,
-        n_workers=min(len(feature_specs), cpu_count),
+        n_workers=n_workers,
         cache=None,
         drop_pred_times_with_insufficient_look_distance=drop_pred_times_with_insufficient_look_distance,
         predictor_col_name_prefix=project_info.prefix.predictor,
@@ -113,8 +241,9 @@ def create_flattened_dataset_tsflattener_v1(
     )
 
     if add_birthdays:
+        load_birthdays = birthdays if profiler is None else profiler.profile_loader(birthdays)
         flattened_dataset.add_age(
-            date_of_birth_df=birthdays(), date_of_birth_col_name="date_of_birth"
+            date_of_birth_df=load_birthdays(), date_of_birth_col_name="date_of_birth"
         )
 
     flattened_dataset.add_spec(spec=feature_specs)
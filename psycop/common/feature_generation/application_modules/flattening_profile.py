@@ -0,0 +1,195 @@
+"""Wall time, row counts and peak memory for each spec and loader call during flattening.
+
+Measurements are appended as JSON lines to a file per process in profile_dir, so specs processed in worker processes
+are profiled as well. write_profile() collects them into a Parquet file and a JSON summary of the slowest specs and the
+most memory-hungry source frames. Loaders are only profiled when wrapped with profile_loader, so the source frames of
+the summary are those of the wrapped loaders.
+
+Example:
+    >>> profiler = FlatteningProfiler(profile_dir=feature_set_dir / "flattening_profile")
+    >>> values_df = profiler.profile_loader(hba1c)()
+    >>> create_flattened_dataset(..., profiler=profiler)
+    >>> profiler.write_profile()
+
+When the feature set directory is not known in advance, e.g. with generate_feature_set, record to any directory and pass
+the profiler on. The profile is then written to the feature set directory:
+    >>> profiler = FlatteningProfiler(profile_dir=Path(tempfile.mkdtemp()))
+    >>> values_df = profiler.profile_loader(hba1c)()
+    >>> generate_feature_set(..., profiler=profiler)
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from functools import wraps
+from typing import TYPE_CHECKING, Any, Literal
+
+import polars as pl
+import psutil
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+    from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+PROFILE_FILENAME = "flattening_profile.parquet"
+PROFILE_SUMMARY_FILENAME = "flattening_profile_summary.json"
+
+MeasurementKind = Literal["spec", "loader"]
+
+
+@dataclass
+class Measurement:
+    """A single spec or loader call. rows_out and n_columns_out are set by the caller when the call has finished."""
+
+    name: str
+    kind: MeasurementKind
+    rows_in: int | None = None
+    rows_out: int | None = None
+    n_columns_out: int | None = None
+    wall_time_seconds: float | None = None
+    start_rss_mb: float | None = None
+    peak_rss_mb: float | None = None
+    pid: int | None = None
+
+
+class _PeakRSSSampler:
+    """Samples the resident set size of the current process in a background thread, keeping the maximum."""
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._process = psutil.Process()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self.start_rss = self.peak_rss = self._process.memory_info().rss
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            self.peak_rss = max(self.peak_rss, self._process.memory_info().rss)
+
+    def __enter__(self) -> _PeakRSSSampler:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak_rss = max(self.peak_rss, self._process.memory_info().rss)
+
+
+class FlatteningProfiler:
+    """Records measurements of spec and loader calls to profile_dir.
+
+    Only holds a path, so it can be pickled to worker processes.
+    """
+
+    def __init__(self, profile_dir: Path, sample_interval_seconds: float = 0.05):
+        self.profile_dir = profile_dir
+        self.sample_interval_seconds = sample_interval_seconds
+
+    def _records_path(self) -> Path:
+        return self.profile_dir / f"records-{os.getpid()}.jsonl"
+
+    @contextmanager
+    def measure(
+        self, name: str, kind: MeasurementKind, rows_in: int | None = None
+    ) -> Iterator[Measurement]:
+        """Measure the wall time and peak memory of the block. The measurement is only recorded if the block succeeds."""
+        measurement = Measurement(name=name, kind=kind, rows_in=rows_in, pid=os.getpid())
+
+        start = time.perf_counter()
+        with _PeakRSSSampler(interval_seconds=self.sample_interval_seconds) as sampler:
+            yield measurement
+        measurement.wall_time_seconds = time.perf_counter() - start
+        measurement.start_rss_mb = sampler.start_rss / 1024**2
+        measurement.peak_rss_mb = sampler.peak_rss / 1024**2
+
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        with self._records_path().open("a") as f:
+            f.write(json.dumps(asdict(measurement)) + "\n")
+
+    def profile_loader(self, loader: Callable[..., Any]) -> Callable[..., Any]:
+        """Wrap a loader, e.g. hba1c, so each call is measured. Row counts are recorded for pandas and polars frames."""
+
+        @wraps(loader)
+        def profiled_loader(*args: Any, **kwargs: Any) -> Any:
+            with self.measure(name=loader.__name__, kind="loader") as measurement:
+                df = loader(*args, **kwargs)
+                if hasattr(df, "shape") and not isinstance(df, pl.LazyFrame):
+                    measurement.rows_out, measurement.n_columns_out = df.shape
+            return df
+
+        return profiled_loader
+
+    def measurements(self) -> pl.DataFrame:
+        """All recorded measurements, from all processes."""
+        records = [
+            json.loads(line)
+            for records_path in sorted(self.profile_dir.glob("records-*.jsonl"))
+            for line in records_path.read_text().splitlines()
+        ]
+        return pl.DataFrame(
+            records,
+            schema={
+                "name": pl.Utf8,
+                "kind": pl.Utf8,
+                "rows_in": pl.Int64,
+                "rows_out": pl.Int64,
+                "n_columns_out": pl.Int64,
+                "wall_time_seconds": pl.Float64,
+                "start_rss_mb": pl.Float64,
+                "peak_rss_mb": pl.Float64,
+                "pid": pl.Int64,
+            },
+        ).with_columns(
+            (pl.col("peak_rss_mb") - pl.col("start_rss_mb")).alias("peak_rss_increase_mb")
+        )
+
+    def summary(self, n: int = 10) -> dict[str, list[dict[str, Any]]]:
+        """The n slowest specs and the n loaders whose frames increased memory the most."""
+        measurements = self.measurements()
+        specs = measurements.filter(pl.col("kind") == "spec")
+        loaders = measurements.filter(pl.col("kind") == "loader")
+        return {
+            "slowest_specs": specs.sort("wall_time_seconds", descending=True, nulls_last=True)
+            .head(n)
+            .to_dicts(),
+            "most_memory_hungry_specs": specs.sort(
+                "peak_rss_increase_mb", descending=True, nulls_last=True
+            )
+            .head(n)
+            .to_dicts(),
+            "most_memory_hungry_loaders": loaders.sort(
+                "peak_rss_increase_mb", descending=True, nulls_last=True
+            )
+            .head(n)
+            .to_dicts(),
+        }
+
+    def write_profile(self, n_summary_rows: int = 10, output_dir: Path | None = None) -> Path:
+        """Write all measurements to a Parquet file and a summary to a JSON file, and log the slowest specs.
+
+        The files are written to output_dir, which defaults to profile_dir. The recorded measurements are removed.
+        """
+        output_dir = output_dir if output_dir is not None else self.profile_dir
+        output_dir.mkdir(parents=True, exist_ok=True)
+        measurements = self.measurements()
+        measurements.write_parquet(output_dir / PROFILE_FILENAME)
+        (output_dir / PROFILE_SUMMARY_FILENAME).write_text(
+            json.dumps(self.summary(n=n_summary_rows), indent=2)
+        )
+        for records_path in self.profile_dir.glob("records-*.jsonl"):
+            records_path.unlink()
+
+        with pl.Config(tbl_rows=n_summary_rows, tbl_cols=-1, fmt_str_lengths=60):
+            log.info(
+                f"Slowest specs:\n{measurements.filter(pl.col('kind') == 'spec').sort('wall_time_seconds', descending=True, nulls_last=True).head(n_summary_rows).select('name', 'rows_in', 'wall_time_seconds', 'peak_rss_increase_mb')}"
+            )
+        return output_dir
@@ -22,10 +22,18 @@ from psycop.common.feature_generation.application_modules.chunked_feature_genera
 from psycop.common.feature_generation.application_modules.describe_flattened_dataset import (
     save_flattened_dataset_description_to_disk,
 )
+from psycop.common.feature_generation.application_modules.feature_set_dir import (
+    OverwritePolicy,
+    write_feature_set_dir,
+)
+from psycop.common.feature_generation.application_modules.feature_store import FeatureStore
 from psycop.common.feature_generation.application_modules.flatten_dataset import (
     create_flattened_dataset,
     create_flattened_dataset_tsflattener_v1,
 )
+from psycop.common.feature_generation.application_modules.flattening_profile import (
+    FlatteningProfiler,
+)
 from psycop.common.feature_generation.application_modules.loggers import init_root_logger
 from psycop.common.feature_generation.application_modules.project_setup import ProjectInfo
 from psycop.common.feature_generation.application_modules.save_dataset_to_disk import (
@@ -47,40 +55,64 @@ def generate_feature_set(
     n_workers: int | None,
     do_dataset_description: bool,
     step_size: datetime.timedelta | None = None,
+    use_feature_store: bool = False,
+    overwrite_policy: OverwritePolicy = "fail",
+    lock_timeout: float | None = None,
+    profile: bool = False,
+    profiler: FlatteningProfiler | None = None,
 ) -> None:
-    feature_set_dir = project_info.flattened_dataset_dir / feature_set_name
-    if feature_set_dir.exists():
-        while True:
-            response = input(
-                f"The path '{feature_set_dir}' already exists. Do you want to potentially overwrite the contents of this folder with new feature sets? (yes/no): "
+    """Flatten the feature specs and write the feature set to project_info.flattened_dataset_dir / feature_set_name.
+
+    If use_feature_store is True, each spec's features are stored in project_info.flattened_dataset_dir / "feature_store",
+    and only new or changed specs are processed when the feature set is regenerated. Stored features are never evicted,
+    so remove them with FeatureStore(store_dir).clear() when they are no longer needed.
+
+    overwrite_policy decides what happens if the feature set already exists, see OverwritePolicy. Concurrent jobs writing
+    the same feature set wait for each other, for at most lock_timeout seconds.
+
+    If profile is True, the wall time and peak memory of each processed spec are written to a flattening_profile
+    directory in the feature set directory. Loaders run when the feature specs are constructed, before this function is
+    called, so loader calls are not profiled here. To profile them, wrap the loaders with
+    FlatteningProfiler.profile_loader while constructing the specs and pass that profiler, which implies profile. Its
+    loader measurements are then written to the flattening_profile directory together with the spec measurements.
+    """
+    with write_feature_set_dir(
+        project_info.flattened_dataset_dir / feature_set_name,
+        overwrite_policy=overwrite_policy,
+        lock_timeout=lock_timeout,
+    ) as feature_set_write:
+        if feature_set_write.reused:
+            return
+        write_dir = feature_set_write.write_dir
+        assert write_dir is not None
+
+        profile_dir = write_dir / "flattening_profile"
+        if profiler is None and profile:
+            profiler = FlatteningProfiler(profile_dir=profile_dir)
+        flattened_df = create_flattened_dataset(
+            feature_specs=feature_specs,
+            prediction_times_frame=eligible_prediction_times_frame,
+            n_workers=n_workers,
+            step_size=step_size,
+            feature_store=FeatureStore(
+                store_dir=project_info.flattened_dataset_dir / "feature_store"
+            )
+            if use_feature_store
+            else None,
+            profiler=profiler,
+        )
+        if profiler is not None:
+            profiler.write_profile(output_dir=profile_dir)
+        if do_dataset_description:
+            # TODO #826
+            logging.info(
+                "Dataset description not yet implemented for tsflattener v2 specs. Perhaps you should implement it?"
             )
 
-            if response.lower() not in ["yes", "y", "no", "n"]:
-                print("Invalid response. Please enter 'yes/y' or 'no/n'.")
-            if response.lower() in ["no", "n"]:
-                print("Process stopped.")
-                return
-            if response.lower() in ["yes", "y"]:
-                print(f"Folder '{feature_set_dir}' will be overwritten.")
-                break
-
-    feature_set_dir.mkdir(parents=True, exist_ok=True)
-
-    flattened_df = create_flattened_dataset(
-        feature_specs=feature_specs,
-        prediction_times_frame=eligible_prediction_times_frame,
-        n_workers=n_workers,
-        step_size=step_size,
-    )
-    if do_dataset_description:
-        # TODO #826
+        flattened_df.write_parquet(write_dir / f"{feature_set_name}.parquet")
         logging.info(
-            "Dataset description not yet implemented for tsflattener v2 specs. Perhaps you should implement it?"
+            f"Writing feature set to {feature_set_write.feature_set_dir / f'{feature_set_name}.parquet'}"
         )
-
-    feature_set_path = feature_set_dir / f"{feature_set_name}.parquet"
-    flattened_df.write_parquet(feature_set_path)
-    logging.info(f"Writing feature set to {feature_set_path}")
     return
 
 
@@ -91,59 +123,85 @@ def generate_feature_set_tsflattener_v1(
     generate_in_chunks: bool = False,
     chunksize: int = 250,
     feature_set_name: str | None = None,
+    memory_budget_bytes: int | None = None,
+    overwrite_policy: OverwritePolicy = "fail",
+    lock_timeout: float | None = None,
+    profile: bool = False,
+    profiler: FlatteningProfiler | None = None,
 ) -> Path:
     """Main function for loading, generating and evaluating a flattened
     dataset.
     If generate_in_chunks is True, feature generation is split into
-    multiple chunks to avoid memory issues"""
+    multiple chunks to avoid memory issues. If memory_budget_bytes is
+    set, chunks are sized by the specs' estimated memory use instead of
+    chunksize.
+    overwrite_policy decides what happens if the feature set directory
+    already exists, see OverwritePolicy. If profile is True, the wall time
+    and peak memory of each temporal spec are written to a
+    flattening_profile directory in the feature set directory, together
+    with the birthdays loader. Other loaders run when the feature specs are
+    constructed, before this function is called, so they are only profiled
+    if they are wrapped with the profile_loader of a profiler which is
+    passed as profiler. Passing a profiler implies profile. Profiling is
+    not supported together with generate_in_chunks. Returns the feature
+    set directory."""
+    if (profile or profiler is not None) and generate_in_chunks:
+        raise ValueError("profile is not supported together with generate_in_chunks")
 
     if feature_set_name:
         feature_set_dir = project_info.flattened_dataset_dir / feature_set_name
     else:
         feature_set_dir = project_info.flattened_dataset_dir
 
-    if Path.exists(feature_set_dir):
-        while True:
-            response = input(
-                f"The path '{feature_set_dir}' already exists. Do you want to potentially overwrite the contents of this folder with new feature sets? (yes/no): "
+    # Without a feature set name, the feature set is written to the shared flattened_dataset_dir, so whether it exists
+    # depends on its split files rather than on the directory
+    with write_feature_set_dir(
+        feature_set_dir,
+        overwrite_policy=overwrite_policy,
+        lock_timeout=lock_timeout,
+        output_names=None
+        if feature_set_name
+        else [f"{split_name}.parquet" for split_name in ("train", "val", "test")],
+    ) as feature_set_write:
+        if feature_set_write.reused:
+            return feature_set_write.feature_set_dir
+        write_dir = feature_set_write.write_dir
+        assert write_dir is not None
+
+        if generate_in_chunks:
+            flattened_df = ChunkedFeatureGenerator.create_flattened_dataset_with_chunking(
+                project_info,
+                eligible_prediction_times,
+                feature_specs,
+                chunksize=chunksize,  # type: ignore
+                memory_budget_bytes=memory_budget_bytes,
             )
 
-            if response.lower() not in ["yes", "y", "no", "n"]:
-                print("Invalid response. Please enter 'yes/y' or 'no/n'.")
-            if response.lower() in ["no", "n"]:
-                print("Process stopped.")
-                return feature_set_dir
-            if response.lower() in ["yes", "y"]:
-                print(f"Folder '{feature_set_dir}' will be overwritten.")
-                break
-
-    if generate_in_chunks:
-        flattened_df = ChunkedFeatureGenerator.create_flattened_dataset_with_chunking(
-            project_info,
-            eligible_prediction_times,
-            feature_specs,
-            chunksize,  # type: ignore
+        else:
+            profile_dir = write_dir / "flattening_profile"
+            if profiler is None and profile:
+                profiler = FlatteningProfiler(profile_dir=profile_dir)
+            flattened_df = create_flattened_dataset_tsflattener_v1(
+                feature_specs=feature_specs,
+                prediction_times_df=eligible_prediction_times,
+                drop_pred_times_with_insufficient_look_distance=False,
+                project_info=project_info,
+                profiler=profiler,
+            )
+            if profiler is not None:
+                profiler.write_profile(output_dir=profile_dir)
+
+        split_and_save_dataset_to_disk(
+            flattened_df=flattened_df, project_info=project_info, feature_set_dir=write_dir
         )
 
-    else:
-        flattened_df = create_flattened_dataset_tsflattener_v1(
-            feature_specs=feature_specs,
-            prediction_times_df=eligible_prediction_times,
-            drop_pred_times_with_insufficient_look_distance=False,
+        save_flattened_dataset_description_to_disk(
             project_info=project_info,
+            feature_specs=feature_specs,  # type: ignore
+            feature_set_dir=write_dir,
         )
 
-    split_and_save_dataset_to_disk(
-        flattened_df=flattened_df, project_info=project_info, feature_set_dir=feature_set_dir
-    )
-
-    save_flattened_dataset_description_to_disk(
-        project_info=project_info,
-        feature_specs=feature_specs,  # type: ignore
-        feature_set_dir=feature_set_dir,
-    )
-
-    return feature_set_dir
+    return feature_set_write.feature_set_dir
 
 
 def init_logger(project_info: ProjectInfo):
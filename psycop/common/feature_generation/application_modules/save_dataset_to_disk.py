@@ -1,12 +1,12 @@
 """Utilities for saving a dataset to disk."""
 
 import logging
-from collections.abc import Sequence
+from collections.abc import Mapping, Sequence
 from pathlib import Path
-from typing import Optional, Union
+from typing import Optional
 
-import numpy as np
 import pandas as pd
+import polars as pl
 
 from psycop.common.feature_generation.application_modules.project_setup import ProjectInfo
 from psycop.common.feature_generation.loaders.raw.load_ids import (
@@ -17,6 +17,8 @@ from psycop.common.feature_generation.utils import write_df_to_file
 
 log = logging.getLogger(__name__)
 
+SPLIT_PARTITION_COL_NAME = "split"
+
 
 def save_chunk_to_disk(
     flattened_df_chunk: pd.DataFrame, chunk: int, feature_set_dir: Path | None = None
@@ -44,75 +46,157 @@ def save_split_to_disk(split_df: pd.DataFrame, split_name: str, feature_set_dir:
     log.info(f"{split_name}: Succesfully saved to {file_path}")
 
 
-def filter_by_split_ids(
-    df_to_split: pd.DataFrame,
-    split_id_df: pd.DataFrame,
-    split_name: Union[list[str], str],
+def get_split_id_df(split_name: SplitName) -> pd.DataFrame:
+    """Get a dataframe with the splits ids."""
+    split_id_df = load_stratified_by_outcome_split_ids(split=split_name)
+
+    return split_id_df.frame.collect().to_pandas()
+
+
+def split_partition_dir(dataset_dir: Path, split_name: str) -> Path:
+    """Directory of a split's partition in a Hive-partitioned dataset."""
+    return dataset_dir / f"{SPLIT_PARTITION_COL_NAME}={split_name}"
+
+
+def _to_split_name(split_name: str) -> SplitName:
+    match split_name:
+        case "train":
+            return SplitName.TRAIN
+        case "val":
+            return SplitName.VALIDATION
+        case "test":
+            return SplitName.TEST
+        case _:
+            raise ValueError(
+                f"Splitname {split_name} is not allowed, try from ['train', 'test', 'val']"
+            )
+
+
+def _split_id_frame(
+    split_ids: Mapping[str, pd.DataFrame | pl.DataFrame | pl.LazyFrame],
+    split_id_col: str,
+    id_dtype: pl.PolarsDataType,
+) -> pl.DataFrame:
+    """Stack the ids of all splits into one frame, with the split name in SPLIT_PARTITION_COL_NAME."""
+    split_id_frames = []
+    for split_name, ids in split_ids.items():
+        if isinstance(ids, pd.DataFrame):
+            ids = pl.from_pandas(ids)  # noqa: PLW2901
+        split_id_frames.append(
+            ids.lazy()
+            .select(pl.col(split_id_col).cast(id_dtype))
+            .unique()
+            .with_columns(pl.lit(split_name).alias(SPLIT_PARTITION_COL_NAME))
+        )
+    split_id_df = pl.concat(split_id_frames).collect()
+
+    n_ids_in_several_splits = split_id_df.height - split_id_df.get_column(split_id_col).n_unique()
+    if n_ids_in_several_splits:
+        raise ValueError(f"{n_ids_in_several_splits} ids are in more than one split")
+    return split_id_df
+
+
+def split_flattened_dataset(
+    flattened: pd.DataFrame | pl.LazyFrame,
+    split_ids: Mapping[str, pd.DataFrame | pl.DataFrame | pl.LazyFrame],
     split_id_col: str = "dw_ek_borger",
-) -> pd.DataFrame:
-    """Filter dataframe by split ids."""
-    # Find IDs which are in split_ids, but not in flattened_df
-    flattened_df_ids = df_to_split[split_id_col].unique()
-    split_ids: pd.Series = split_id_df[split_id_col].unique()  # type: ignore
+) -> dict[str, pl.DataFrame]:
+    """Split the flattened dataset in a single pass, by joining it with the ids of all splits at once.
+
+    If flattened is a LazyFrame, e.g. from pl.scan_parquet, it is only materialised once, after the join.
+
+    Returns:
+        dict[str, pl.DataFrame]: The rows of each split, keyed by split name. Splits without rows are empty frames.
+    """
+    if isinstance(flattened, pd.DataFrame):
+        flattened = pl.from_pandas(flattened).lazy()
 
-    ids_in_split_but_not_in_flattened_df = split_ids[~np.isin(split_ids, flattened_df_ids)]
+    split_id_df = _split_id_frame(
+        split_ids=split_ids, split_id_col=split_id_col, id_dtype=flattened.schema[split_id_col]
+    )
+    split_df = flattened.join(split_id_df.lazy(), on=split_id_col, how="inner").collect()
 
-    log.warning(
-        f"{','.join(split_name)}: There are {len(ids_in_split_but_not_in_flattened_df)} ({round(len(ids_in_split_but_not_in_flattened_df) / len(split_ids) * 100, 2)}%) ids which are in {','.join(split_name)}_ids but not in flattened_df_ids, will get dropped during merge. If examining patients based on physical visits, see 'OBS: Patients without physical visits' on the wiki for more info."
+    n_ids_in_flattened_df = dict(
+        split_df.group_by(SPLIT_PARTITION_COL_NAME).agg(pl.col(split_id_col).n_unique()).rows()
     )
+    n_ids_in_split = dict(
+        split_id_df.group_by(SPLIT_PARTITION_COL_NAME).agg(pl.col(split_id_col).len()).rows()
+    )
+    for split_name in split_ids:
+        n_missing = n_ids_in_split.get(split_name, 0) - n_ids_in_flattened_df.get(split_name, 0)
+        log.warning(
+            f"{split_name}: There are {n_missing} ({round(n_missing / max(n_ids_in_split.get(split_name, 0), 1) * 100, 2)}%) ids which are in {split_name}_ids but not in flattened_df_ids, will get dropped during merge. If examining patients based on physical visits, see 'OBS: Patients without physical visits' on the wiki for more info."
+        )
 
-    split_df = pd.merge(df_to_split, split_id_df, how="inner", validate="m:1")
-    return split_df
+    partitions = split_df.partition_by([SPLIT_PARTITION_COL_NAME], as_dict=True, include_key=False)
+    empty_split = split_df.drop(SPLIT_PARTITION_COL_NAME).clear()
+    return {split_name: partitions.get((split_name,), empty_split) for split_name in split_ids}
 
 
-def get_split_id_df(split_name: SplitName) -> pd.DataFrame:
-    """Get a dataframe with the splits ids."""
-    split_id_df = load_stratified_by_outcome_split_ids(split=split_name)
+def write_split_partitioned_dataset(
+    flattened: pd.DataFrame | pl.LazyFrame,
+    split_ids: Mapping[str, pd.DataFrame | pl.DataFrame | pl.LazyFrame],
+    dataset_dir: Path,
+    split_id_col: str = "dw_ek_borger",
+) -> Path:
+    """Split the flattened dataset in a single pass and write it as a Hive-partitioned Parquet dataset.
 
-    return split_id_df.frame.collect().to_pandas()
+    Each split is written to dataset_dir/split=<split_name>/, so loaders can read only the partition they need, e.g.
+    pl.scan_parquet(dataset_dir / "split=train" / "*.parquet").
+    """
+    splits = split_flattened_dataset(
+        flattened=flattened, split_ids=split_ids, split_id_col=split_id_col
+    )
+    for split_name, split_df in splits.items():
+        partition_dir = split_partition_dir(dataset_dir=dataset_dir, split_name=split_name)
+        partition_dir.mkdir(parents=True, exist_ok=True)
+        file_path = partition_dir / "part-0.parquet"
+        split_df.write_parquet(file_path)
+        log.info(f"{split_name}: Succesfully saved to {file_path}")
+
+    return dataset_dir
 
 
 def split_and_save_dataset_to_disk(
-    flattened_df: pd.DataFrame,
+    flattened_df: pd.DataFrame | pl.LazyFrame,
     project_info: ProjectInfo,
     feature_set_dir: Path,
     split_ids: Optional[dict[str, pd.DataFrame]] = None,
     split_names: Sequence[str] = ("train", "val", "test"),
+    partitioned: bool = False,
 ):
     """Split and save to disk.
 
+    The dataset is split in a single pass, joining against the ids of all splits at once.
+
     Args:
-        flattened_df (pd.DataFrame): Flattened dataframe.
+        flattened_df (pd.DataFrame | pl.LazyFrame): Flattened dataframe. A LazyFrame, e.g. from pl.scan_parquet, is only materialised after the join.
         project_info (ProjectInfo): Project info.
         feature_set_dir (Path): Directory for saving feature sets
         split_ids (dict[str, pd.DataFrame]): Split ids.
         split_names (tuple[str], optional): Names of split to create. Defaults to ("train", "val", "test").
+        partitioned (bool, optional): Whether to write a Hive-partitioned dataset (split=<split_name>/) instead of one <split_name>.parquet file per split. Defaults to False.
     """
-    for split_name in split_names:
-        match split_name:
-            case "train":
-                split_name = SplitName.TRAIN  # noqa: PLW2901
-            case "val":
-                split_name = SplitName.VALIDATION  # noqa: PLW2901
-            case "test":
-                split_name = SplitName.TEST  # noqa: PLW2901
-            case _:
-                raise ValueError(
-                    f"Splitname {split_name} is not allowed, try from ['train', 'test', 'val']"
-                )
-
-        if not split_ids:
-            split_id_df = get_split_id_df(split_name=split_name)
-        else:
-            split_id_df = split_ids[split_name.value]
-
-        split_df = filter_by_split_ids(
-            df_to_split=flattened_df,
-            split_id_df=split_id_df,
-            split_name=split_name.value,
+    split_id_dfs = {
+        split_name.value: get_split_id_df(split_name=split_name)
+        if not split_ids
+        else split_ids[split_name.value]
+        for split_name in (_to_split_name(name) for name in split_names)
+    }
+
+    if partitioned:
+        write_split_partitioned_dataset(
+            flattened=flattened_df,
+            split_ids=split_id_dfs,
+            dataset_dir=feature_set_dir,
             split_id_col=project_info.col_names.id,
         )
+        return
 
+    splits = split_flattened_dataset(
+        flattened=flattened_df, split_ids=split_id_dfs, split_id_col=project_info.col_names.id
+    )
+    for split_name, split_df in splits.items():
         save_split_to_disk(
-            split_df=split_df, split_name=split_name.value, feature_set_dir=feature_set_dir
+            split_df=split_df.to_pandas(), split_name=split_name, feature_set_dir=feature_set_dir
         )
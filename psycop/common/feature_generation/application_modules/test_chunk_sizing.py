@@ -0,0 +1,81 @@
+import pandas as pd
+from timeseriesflattener.v1.aggregation_fns import mean
+from timeseriesflattener.v1.feature_specs.single_specs import PredictorSpec
+
+from psycop.common.feature_generation.application_modules.chunk_sizing import (
+    estimate_spec_memory,
+    plan_feature_chunks,
+)
+
+
+def _spec(n_values_per_entity: int, lookbehind_days: float = 365) -> PredictorSpec:
+    return PredictorSpec(
+        timeseries_df=pd.DataFrame(
+            {
+                "entity_id": [
+                    entity_id for entity_id in range(10) for _ in range(n_values_per_entity)
+                ],
+                "timestamp": pd.date_range(
+                    "2020-01-01", periods=10 * n_values_per_entity, freq="D"
+                ),
+                "value": 1.0,
+            }
+        ),
+        feature_base_name=f"values_{n_values_per_entity}",
+        aggregation_fn=mean,
+        fallback=0,
+        lookbehind_days=lookbehind_days,
+    )
+
+
+def test_estimate_spec_memory_grows_with_values_per_entity_and_look_window():
+    small, large = (
+        estimate_spec_memory(_spec(n_values_per_entity=n), n_prediction_times=1000) for n in (1, 10)
+    )
+    assert large.intermediate_bytes > small.intermediate_bytes
+    assert large.output_bytes == small.output_bytes
+
+    short_window = estimate_spec_memory(_spec(10, lookbehind_days=1), n_prediction_times=1000)
+    assert short_window.intermediate_bytes < large.intermediate_bytes
+
+
+def test_plan_feature_chunks_fits_budget():
+    specs = [_spec(n_values_per_entity=n) for n in (1, 1, 1, 10, 10, 1)]
+    large = estimate_spec_memory(specs[3], n_prediction_times=1000)
+    budget = large.intermediate_bytes + 2 * large.output_bytes
+
+    chunks = plan_feature_chunks(
+        feature_specs=specs, n_prediction_times=1000, memory_budget_bytes=budget, max_workers=4
+    )
+
+    assert len(chunks) > 1
+    assert [id(spec) for chunk in chunks for spec in chunk.specs] == [id(spec) for spec in specs]
+    assert all(chunk.specs[0] is specs[chunk.start] for chunk in chunks)
+    assert all(chunk.estimated_memory_bytes <= budget for chunk in chunks)
+
+
+def test_plan_feature_chunks_adds_workers_within_budget():
+    specs = [_spec(n_values_per_entity=1) for _ in range(4)]
+    estimate = estimate_spec_memory(specs[0], n_prediction_times=1000)
+
+    chunks = plan_feature_chunks(
+        feature_specs=specs,
+        n_prediction_times=1000,
+        memory_budget_bytes=4 * estimate.output_bytes + 3 * estimate.intermediate_bytes,
+        max_workers=4,
+    )
+
+    assert [(chunk.start, len(chunk.specs), chunk.n_workers) for chunk in chunks] == [(0, 4, 3)]
+
+
+def test_plan_feature_chunks_gives_oversized_spec_its_own_chunk():
+    specs = [_spec(n_values_per_entity=1), _spec(n_values_per_entity=10)]
+
+    chunks = plan_feature_chunks(
+        feature_specs=specs, n_prediction_times=1000, memory_budget_bytes=1, max_workers=4
+    )
+
+    assert [(chunk.start, len(chunk.specs), chunk.n_workers) for chunk in chunks] == [
+        (0, 1, 1),
+        (1, 1, 1),
+    ]
@@ -1,5 +1,8 @@
+import json
 import tempfile
+import time
 from pathlib import Path
+from typing import Any
 
 import numpy as np
 import pandas as pd
@@ -9,6 +12,7 @@ from polars.testing import assert_series_equal
 from timeseriesflattener.v1.aggregation_fns import mean
 from timeseriesflattener.v1.feature_specs.single_specs import PredictorSpec
 
+from psycop.common.feature_generation.application_modules import chunked_feature_generation
 from psycop.common.feature_generation.application_modules.chunked_feature_generation import (
     ChunkedFeatureGenerator,
 )
@@ -144,3 +148,136 @@ def test_concatenation_assumptions(
 
     for col in full_dataset.columns:
         assert_series_equal(full_dataset[col], merged_chunked_datasets[col])
+
+
+def test_chunked_generation_resumes_from_manifest(
+    synth_predictor_1: pd.DataFrame,
+    synth_predictor_2: pd.DataFrame,
+    synth_prediction_times: pd.DataFrame,
+    synth_project_info: ProjectInfo,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    predictor_specs = [
+        PredictorSpec(
+            timeseries_df=df,
+            feature_base_name=name,
+            aggregation_fn=mean,
+            fallback=np.nan,
+            lookbehind_days=1,
+        )
+        for name, df in (("pred1", synth_predictor_1), ("pred2", synth_predictor_2))
+    ]
+    generated: list[str] = []
+    crash_on: set[str] = {"pred2"}
+
+    def flatten_without_birthdays(**kwargs: Any) -> pd.DataFrame:
+        feature_base_name = kwargs["feature_specs"][0].feature_base_name
+        if feature_base_name in crash_on:
+            raise RuntimeError(f"Crash while generating {feature_base_name}")
+        generated.append(feature_base_name)
+        return create_flattened_dataset_tsflattener_v1(**kwargs, add_birthdays=False)
+
+    monkeypatch.setattr(
+        chunked_feature_generation,
+        "create_flattened_dataset_tsflattener_v1",
+        flatten_without_birthdays,
+    )
+
+    def generate() -> pd.DataFrame:
+        return ChunkedFeatureGenerator.create_flattened_dataset_with_chunking(
+            project_info=synth_project_info,
+            eligible_prediction_times=synth_prediction_times,
+            feature_specs=predictor_specs,  # type: ignore
+            feature_set_dir=tmp_path,
+            chunksize=1,
+        )
+
+    with pytest.raises(RuntimeError):
+        generate()
+    assert generated == ["pred1"]
+
+    crash_on.clear()
+    resumed = generate()
+
+    # Only the missing chunk is generated, and the chunks are merged in order
+    assert generated == ["pred1", "pred2"]
+    assert [c for c in resumed.columns if c.startswith("pred_")] == [
+        predictor_specs[0].get_output_col_name(),
+        predictor_specs[1].get_output_col_name(),
+    ]
+    assert not list(tmp_path.iterdir())
+
+
+def test_parallel_chunked_generation_records_chunks_which_succeed(
+    synth_predictor_1: pd.DataFrame,
+    synth_predictor_2: pd.DataFrame,
+    synth_prediction_times: pd.DataFrame,
+    synth_project_info: ProjectInfo,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    predictor_specs = [
+        PredictorSpec(
+            timeseries_df=df,
+            feature_base_name=name,
+            aggregation_fn=mean,
+            fallback=np.nan,
+            lookbehind_days=1,
+        )
+        for name, df in (("pred1", synth_predictor_1), ("pred2", synth_predictor_2))
+    ]
+
+    def crash_on_first_chunk(**kwargs: Any) -> pd.DataFrame:
+        if kwargs["feature_specs"][0].feature_base_name == "pred1":
+            raise RuntimeError("Crash while generating pred1")
+        # Finishes after the first chunk has failed
+        time.sleep(0.5)
+        return create_flattened_dataset_tsflattener_v1(**kwargs, add_birthdays=False)
+
+    monkeypatch.setattr(
+        chunked_feature_generation, "create_flattened_dataset_tsflattener_v1", crash_on_first_chunk
+    )
+
+    with pytest.raises(RuntimeError, match="pred1"):
+        ChunkedFeatureGenerator.create_flattened_dataset_with_chunking(
+            project_info=synth_project_info,
+            eligible_prediction_times=synth_prediction_times,
+            feature_specs=predictor_specs,  # type: ignore
+            feature_set_dir=tmp_path,
+            chunksize=1,
+            n_workers=2,
+        )
+
+    manifest = json.loads(
+        (tmp_path / chunked_feature_generation.CHUNK_MANIFEST_FILENAME).read_text()
+    )
+    assert list(manifest) == ["1"]
+    assert (tmp_path / "flattened_dataset_chunk_1.parquet").exists()
+
+
+def test_stream_merge_feature_chunks(tmp_path: Path):
+    uuids = [f"{i}-2020-01-01-00-00-00" for i in range(5)]
+    chunk_paths = [tmp_path / "chunk_0.parquet", tmp_path / "chunk_1.parquet"]
+    pl.DataFrame({"prediction_time_uuid": uuids, "a": range(5)}).write_parquet(chunk_paths[0])
+    pl.DataFrame({"prediction_time_uuid": uuids, "b": range(5, 10)}).write_parquet(chunk_paths[1])
+
+    merged_path = ChunkedFeatureGenerator.stream_merge_feature_chunks(
+        chunk_paths=chunk_paths, output_path=tmp_path / "merged.parquet", batch_size=2
+    )
+
+    assert pl.read_parquet(merged_path).equals(
+        pl.DataFrame({"prediction_time_uuid": uuids, "a": range(5), "b": range(5, 10)})
+    )
+
+
+def test_stream_merge_feature_chunks_raises_on_misaligned_rows(tmp_path: Path):
+    uuids = [f"{i}-2020-01-01-00-00-00" for i in range(5)]
+    chunk_paths = [tmp_path / "chunk_0.parquet", tmp_path / "chunk_1.parquet"]
+    pl.DataFrame({"prediction_time_uuid": uuids, "a": range(5)}).write_parquet(chunk_paths[0])
+    pl.DataFrame({"prediction_time_uuid": uuids[::-1], "b": range(5)}).write_parquet(chunk_paths[1])
+
+    with pytest.raises(ValueError, match="not aligned"):
+        ChunkedFeatureGenerator.stream_merge_feature_chunks(
+            chunk_paths=chunk_paths, output_path=tmp_path / "merged.parquet", batch_size=2
+        )
@@ -0,0 +1,98 @@
+from pathlib import Path
+
+import pytest
+
+from psycop.common.feature_generation.application_modules.feature_set_dir import (
+    FeatureSetExistsError,
+    feature_set_lock,
+    write_feature_set_dir,
+)
+
+
+@pytest.fixture
+def existing_feature_set_dir(tmp_path: Path) -> Path:
+    feature_set_dir = tmp_path / "feature_set"
+    feature_set_dir.mkdir()
+    (feature_set_dir / "train.parquet").write_text("old")
+    (feature_set_dir / "notes.txt").write_text("old")
+    return feature_set_dir
+
+
+def test_write_feature_set_dir_moves_written_files_into_place(tmp_path: Path):
+    feature_set_dir = tmp_path / "feature_set"
+
+    with write_feature_set_dir(feature_set_dir) as feature_set_write:
+        (feature_set_write.write_dir / "train.parquet").write_text("new")  # type: ignore
+        assert not feature_set_dir.exists()
+
+    assert (feature_set_dir / "train.parquet").read_text() == "new"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["feature_set"]
+
+
+def test_write_feature_set_dir_policies(existing_feature_set_dir: Path):
+    with (
+        pytest.raises(FeatureSetExistsError),
+        write_feature_set_dir(existing_feature_set_dir, overwrite_policy="fail"),
+    ):
+        pass
+
+    with write_feature_set_dir(existing_feature_set_dir, overwrite_policy="reuse") as reused:
+        assert reused.reused
+
+    with write_feature_set_dir(existing_feature_set_dir, overwrite_policy="version") as versioned:
+        (versioned.write_dir / "train.parquet").write_text("new")  # type: ignore
+    assert versioned.feature_set_dir.name == "feature_set_v2"
+    assert (existing_feature_set_dir / "train.parquet").read_text() == "old"
+
+    with write_feature_set_dir(existing_feature_set_dir, overwrite_policy="overwrite") as overwrite:
+        (overwrite.write_dir / "train.parquet").write_text("new")  # type: ignore
+    assert (existing_feature_set_dir / "train.parquet").read_text() == "new"
+    assert (existing_feature_set_dir / "notes.txt").read_text() == "old"
+
+
+def test_write_feature_set_dir_with_output_names_ignores_other_files(
+    existing_feature_set_dir: Path,
+):
+    output_names = ["train.parquet", "val.parquet"]
+
+    # The directory exists, but the feature set does not
+    with write_feature_set_dir(
+        existing_feature_set_dir, overwrite_policy="fail", output_names=output_names
+    ) as feature_set_write:
+        assert not feature_set_write.reused
+        for name in output_names:
+            (feature_set_write.write_dir / name).write_text("new")  # type: ignore
+
+    with write_feature_set_dir(
+        existing_feature_set_dir, overwrite_policy="reuse", output_names=output_names
+    ) as reused:
+        assert reused.reused
+
+
+def test_write_feature_set_dir_leaves_existing_files_on_error(existing_feature_set_dir: Path):
+    def write_and_crash():
+        with write_feature_set_dir(
+            existing_feature_set_dir, overwrite_policy="overwrite"
+        ) as feature_set_write:
+            (feature_set_write.write_dir / "train.parquet").write_text("new")  # type: ignore
+            raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        write_and_crash()
+
+    assert (existing_feature_set_dir / "train.parquet").read_text() == "old"
+    assert sorted(p.name for p in existing_feature_set_dir.parent.iterdir()) == ["feature_set"]
+
+
+def test_feature_set_lock_times_out_while_held(tmp_path: Path):
+    feature_set_dir = tmp_path / "feature_set"
+
+    with (
+        feature_set_lock(feature_set_dir),
+        pytest.raises(TimeoutError),
+        feature_set_lock(feature_set_dir, timeout=0.02, poll_interval=0.01),
+    ):
+        pass
+
+    with feature_set_lock(feature_set_dir, timeout=0):
+        pass
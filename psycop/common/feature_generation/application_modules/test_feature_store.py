@@ -0,0 +1,106 @@
+import datetime as dt
+from pathlib import Path
+
+import polars as pl
+import pytest
+from timeseriesflattener import PredictorSpec, ValueFrame
+from timeseriesflattener.aggregators import MaxAggregator, MeanAggregator
+from timeseriesflattener.main import SpecError
+
+from psycop.common.cohort_definition import PredictionTimeFrame
+from psycop.common.feature_generation.application_modules import flatten_dataset
+from psycop.common.feature_generation.application_modules.feature_store import FeatureStore
+from psycop.common.feature_generation.application_modules.flatten_dataset import (
+    create_flattened_dataset,
+)
+from psycop.common.test_utils.str_to_df import str_to_pl_df
+
+
+@pytest.fixture
+def prediction_times_frame() -> PredictionTimeFrame:
+    return PredictionTimeFrame(
+        frame=str_to_pl_df(
+            """dw_ek_borger,timestamp
+1,2020-01-02 00:00:00
+2,2020-01-03 00:00:00
+"""
+        ),
+        entity_id_col_name="dw_ek_borger",
+        timestamp_col_name="timestamp",
+    )
+
+
+def _spec(value_col_name: str, values: list[float]) -> PredictorSpec:
+    return PredictorSpec(
+        value_frame=ValueFrame(
+            init_df=pl.DataFrame(
+                {
+                    "dw_ek_borger": [1, 2],
+                    "timestamp": [dt.datetime(2020, 1, 1), dt.datetime(2020, 1, 2)],
+                    value_col_name: values,
+                }
+            ),
+            entity_id_col_name="dw_ek_borger",
+        ),
+        lookbehind_distances=[dt.timedelta(days=2)],
+        aggregators=[MeanAggregator(), MaxAggregator()],
+        fallback=0,
+    )
+
+
+def test_feature_store_only_processes_new_or_changed_specs(
+    tmp_path: Path, prediction_times_frame: PredictionTimeFrame, monkeypatch: pytest.MonkeyPatch
+):
+    processed_specs: list[list[str]] = []
+
+    def recording_process_spec(spec: PredictorSpec, **kwargs):  # type: ignore # noqa: ANN003, ANN202
+        processed_specs.append(spec.value_frame.value_col_names)
+        return flatten_dataset_process_spec(spec, **kwargs)
+
+    flatten_dataset_process_spec = flatten_dataset.process_spec
+    monkeypatch.setattr(flatten_dataset, "process_spec", recording_process_spec)
+    store = FeatureStore(store_dir=tmp_path)
+
+    specs = [_spec("a", [1.0, 2.0]), _spec("b", [3.0, 4.0])]
+    stored = create_flattened_dataset(
+        feature_specs=specs,
+        prediction_times_frame=prediction_times_frame,
+        n_workers=None,
+        feature_store=store,
+    )
+    assert stored.equals(
+        create_flattened_dataset(
+            feature_specs=specs, prediction_times_frame=prediction_times_frame, n_workers=None
+        )
+    )
+    assert processed_specs == [["a"], ["b"]]
+
+    # Changing the values of b and adding c only processes b and c
+    processed_specs.clear()
+    create_flattened_dataset(
+        feature_specs=[_spec("a", [1.0, 2.0]), _spec("b", [5.0, 6.0]), _spec("c", [7.0, 8.0])],
+        prediction_times_frame=prediction_times_frame,
+        n_workers=None,
+        feature_store=store,
+    )
+    assert processed_specs == [["b"], ["c"]]
+
+
+def test_feature_store_raises_on_conflicting_specs_which_are_stored(
+    tmp_path: Path, prediction_times_frame: PredictionTimeFrame
+):
+    store = FeatureStore(store_dir=tmp_path)
+    create_flattened_dataset(
+        feature_specs=[_spec("a", [1.0, 2.0])],
+        prediction_times_frame=prediction_times_frame,
+        n_workers=None,
+        feature_store=store,
+    )
+
+    with pytest.raises(SpecError, match="'a' is specified in 2 specs"):
+        create_flattened_dataset(
+            feature_specs=[_spec("a", [1.0, 2.0]), _spec("a", [1.0, 2.0])],
+            prediction_times_frame=prediction_times_frame,
+            n_workers=None,
+            feature_store=store,
+        )
@@ -0,0 +1,148 @@
+import datetime as dt
+from pathlib import Path
+
+import pandas as pd
+import polars as pl
+import pytest
+from timeseriesflattener import PredictorSpec, ValueFrame
+from timeseriesflattener.aggregators import MeanAggregator
+from timeseriesflattener.main import SpecError
+
+from psycop.common.cohort_definition import PredictionTimeFrame
+from psycop.common.feature_generation.application_modules.flatten_dataset import (
+    create_flattened_dataset,
+)
+from psycop.common.feature_generation.application_modules.flattening_profile import (
+    PROFILE_FILENAME,
+    PROFILE_SUMMARY_FILENAME,
+    FlatteningProfiler,
+)
+from psycop.common.feature_generation.application_modules.generate_feature_set import (
+    generate_feature_set,
+    generate_feature_set_tsflattener_v1,
+)
+from psycop.common.feature_generation.application_modules.project_setup import ProjectInfo
+
+
+def _values_df(value_col_name: str) -> pl.DataFrame:
+    return pl.DataFrame(
+        {
+            "dw_ek_borger": [1, 1, 2],
+            "timestamp": [
+                dt.datetime(2020, 1, 1),
+                dt.datetime(2020, 1, 2),
+                dt.datetime(2020, 1, 2),
+            ],
+            value_col_name: [1.0, 2.0, 3.0],
+        }
+    )
+
+
+def test_flattening_profile_records_specs_and_loaders(tmp_path: Path):
+    profiler = FlatteningProfiler(profile_dir=tmp_path / "profile")
+    load_values = profiler.profile_loader(_values_df)
+
+    flattened = create_flattened_dataset(
+        feature_specs=[
+            PredictorSpec(
+                value_frame=ValueFrame(
+                    init_df=load_values(value_col_name), entity_id_col_name="dw_ek_borger"
+                ),
+                lookbehind_distances=[dt.timedelta(days=2)],
+                aggregators=[MeanAggregator()],
+                fallback=0,
+            )
+            for value_col_name in ("a", "b")
+        ],
+        prediction_times_frame=PredictionTimeFrame(
+            frame=pl.DataFrame(
+                {"dw_ek_borger": [1, 2], "timestamp": [dt.datetime(2020, 1, 3)] * 2}
+            ),
+            entity_id_col_name="dw_ek_borger",
+            timestamp_col_name="timestamp",
+        ),
+        n_workers=None,
+        profiler=profiler,
+    )
+    profiler.write_profile()
+
+    profile = pl.read_parquet(tmp_path / "profile" / PROFILE_FILENAME)
+    assert profile.select("name", "kind", "rows_in", "rows_out").rows() == [
+        ("_values_df", "loader", None, 3),
+        ("_values_df", "loader", None, 3),
+        ("pred_a", "spec", 3, 2),
+        ("pred_b", "spec", 3, 2),
+    ]
+    assert (profile.get_column("wall_time_seconds") >= 0).all()
+    assert flattened.height == 2
+    assert (tmp_path / "profile" / PROFILE_SUMMARY_FILENAME).exists()
+    assert not list((tmp_path / "profile").glob("records-*.jsonl"))
+
+
+def test_generate_feature_set_writes_loader_measurements_of_given_profiler(tmp_path: Path):
+    profiler = FlatteningProfiler(profile_dir=tmp_path / "records")
+    load_values = profiler.profile_loader(_values_df)
+    project_info = ProjectInfo(project_name="test", project_path=tmp_path)
+
+    generate_feature_set(
+        project_info=project_info,
+        eligible_prediction_times_frame=PredictionTimeFrame(
+            frame=pl.DataFrame(
+                {"dw_ek_borger": [1, 2], "timestamp": [dt.datetime(2020, 1, 3)] * 2}
+            ),
+            entity_id_col_name="dw_ek_borger",
+            timestamp_col_name="timestamp",
+        ),
+        feature_specs=[
+            PredictorSpec(
+                value_frame=ValueFrame(init_df=load_values("a"), entity_id_col_name="dw_ek_borger"),
+                lookbehind_distances=[dt.timedelta(days=2)],
+                aggregators=[MeanAggregator()],
+                fallback=0,
+            )
+        ],
+        feature_set_name="test",
+        n_workers=None,
+        do_dataset_description=False,
+        profiler=profiler,
+    )
+
+    profile = pl.read_parquet(
+        project_info.flattened_dataset_dir / "test" / "flattening_profile" / PROFILE_FILENAME
+    )
+    assert profile.select("name", "kind").rows() == [("_values_df", "loader"), ("pred_a", "spec")]
+    assert not list((tmp_path / "records").glob("records-*.jsonl"))
+
+
+def test_profiled_flattening_raises_on_conflicting_specs(tmp_path: Path):
+    spec = PredictorSpec(
+        value_frame=ValueFrame(init_df=_values_df("a"), entity_id_col_name="dw_ek_borger"),
+        lookbehind_distances=[dt.timedelta(days=2)],
+        aggregators=[MeanAggregator()],
+        fallback=0,
+    )
+
+    with pytest.raises(SpecError, match="'a' is specified in 2 specs"):
+        create_flattened_dataset(
+            feature_specs=[spec, spec],
+            prediction_times_frame=PredictionTimeFrame(
+                frame=pl.DataFrame({"dw_ek_borger": [1], "timestamp": [dt.datetime(2020, 1, 3)]}),
+                entity_id_col_name="dw_ek_borger",
+                timestamp_col_name="timestamp",
+            ),
+            n_workers=None,
+            profiler=FlatteningProfiler(profile_dir=tmp_path / "profile"),
+        )
+
+
+def test_profiling_chunked_feature_generation_raises(tmp_path: Path):
+    with pytest.raises(ValueError, match="generate_in_chunks"):
+        generate_feature_set_tsflattener_v1(
+            project_info=ProjectInfo(project_name="test", project_path=tmp_path),
+            eligible_prediction_times=pd.DataFrame(),
+            feature_specs=[],
+            generate_in_chunks=True,
+            feature_set_name="test",
+            profile=True,
+        )
+    assert not (tmp_path / "flattened_datasets").exists()
@@ -0,0 +1,78 @@
+from pathlib import Path
+
+import pandas as pd
+import polars as pl
+import pytest
+
+from psycop.common.feature_generation.application_modules.project_setup import ProjectInfo
+from psycop.common.feature_generation.application_modules.save_dataset_to_disk import (
+    split_and_save_dataset_to_disk,
+    split_flattened_dataset,
+    write_split_partitioned_dataset,
+)
+from psycop.common.feature_generation.loaders.flattened.local_feature_loaders import load_split
+from psycop.common.test_utils.str_to_df import str_to_df
+
+SPLIT_IDS = {
+    "train": pd.DataFrame({"dw_ek_borger": [1, 2]}),
+    "val": pd.DataFrame({"dw_ek_borger": [3]}),
+    "test": pd.DataFrame({"dw_ek_borger": [4, 5]}),  # 5 is not in the flattened dataset
+}
+
+
+@pytest.fixture
+def flattened_df() -> pd.DataFrame:
+    return str_to_df(
+        """dw_ek_borger,timestamp,pred_feature
+1,2020-01-01,1
+1,2020-01-02,2
+2,2020-01-01,3
+3,2020-01-01,4
+4,2020-01-01,5
+6,2020-01-01,6
+"""
+    )
+
+
+def test_split_flattened_dataset(flattened_df: pd.DataFrame):
+    splits = split_flattened_dataset(
+        flattened=pl.from_pandas(flattened_df).lazy(), split_ids=SPLIT_IDS
+    )
+
+    assert {
+        split_name: sorted(split_df.get_column("pred_feature").to_list())
+        for split_name, split_df in splits.items()
+    } == {"train": [1, 2, 3], "val": [4], "test": [5]}
+    assert splits["train"].columns == ["dw_ek_borger", "timestamp", "pred_feature"]
+
+
+def test_split_flattened_dataset_raises_on_id_in_several_splits(flattened_df: pd.DataFrame):
+    with pytest.raises(ValueError, match="more than one split"):
+        split_flattened_dataset(
+            flattened=flattened_df,
+            split_ids={**SPLIT_IDS, "val": pd.DataFrame({"dw_ek_borger": [1, 3]})},
+        )
+
+
+def test_write_split_partitioned_dataset(tmp_path: Path, flattened_df: pd.DataFrame):
+    flattened_path = tmp_path / "flattened.parquet"
+    flattened_df.to_parquet(flattened_path)
+
+    write_split_partitioned_dataset(
+        flattened=pl.scan_parquet(flattened_path), split_ids=SPLIT_IDS, dataset_dir=tmp_path
+    )
+
+    train = load_split(feature_set_dir=tmp_path, file_suffix=".parquet", split="train")
+    assert sorted(train["pred_feature"]) == [1, 2, 3]
+    assert pl.scan_parquet(tmp_path / "split=test" / "*.parquet").collect().height == 1
+
+
+def test_split_and_save_dataset_to_disk(tmp_path: Path, flattened_df: pd.DataFrame):
+    split_and_save_dataset_to_disk(
+        flattened_df=flattened_df,
+        project_info=ProjectInfo(project_name="test", project_path=tmp_path),
+        feature_set_dir=tmp_path,
+        split_ids=SPLIT_IDS,  # type: ignore
+    )
+
+    assert sorted(pd.read_parquet(tmp_path / "val.parquet")["pred_feature"]) == [4]
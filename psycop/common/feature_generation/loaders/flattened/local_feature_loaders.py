@@ -43,6 +43,11 @@ def load_split(
     Returns:
         pd.DataFrame: The loaded dataframe
     """
+    partition_dir = feature_set_dir / f"split={split}"
+    if partition_dir.is_dir():
+        # Hive-partitioned dataset, as written by write_split_partitioned_dataset
+        return load_dataset_from_file(file_path=partition_dir, nrows=nrows)
+
     file_path = list(feature_set_dir.glob(f"*{split}*{file_suffix}"))[0]  # noqa: RUF015
 
     return load_dataset_from_file(file_path=file_path, nrows=nrows)
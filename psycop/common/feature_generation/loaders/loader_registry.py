@@ -0,0 +1,161 @@
+"""Share source frames between feature specs that load the same data.
+
+Feature specs sometimes call the same loader with the same arguments, e.g. the scz_bp metadata specs and layer 2 both
+load physical visits to psychiatry. Inside a LoaderRegistry, loaders decorated with @shared_loader are called once per
+unique set of arguments. Later calls get a shallow copy of the first frame, which shares its data buffers, so the
+source data is only held in memory once. Frames returned by a shared loader must be treated as read-only: replacing or
+adding columns is fine, modifying values in place is not.
+
+Example:
+    >>> with LoaderRegistry() as registry:
+    >>>     feature_specs = get_feature_specs()
+    >>> registry.log_report()
+"""
+
+from __future__ import annotations
+
+import inspect
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import wraps
+from typing import TYPE_CHECKING, Any, TypeVar
+
+import pandas as pd
+import polars as pl
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from contextvars import Token
+
+log = logging.getLogger(__name__)
+
+LoaderT = TypeVar("LoaderT", bound="Callable[..., Any]")
+
+_active_registry: ContextVar[LoaderRegistry | None] = ContextVar(
+    "active_loader_registry", default=None
+)
+
+
+@dataclass
+class LoaderCall:
+    """A unique combination of a loader and its arguments."""
+
+    loader_name: str
+    arguments: str
+    n_calls: int = 0
+    load_seconds: float = 0.0
+    frame_bytes: int = 0
+
+
+def _frame_bytes(df: Any) -> int:
+    if isinstance(df, pd.DataFrame):
+        return int(df.memory_usage(deep=True).sum())
+    if isinstance(df, pl.DataFrame):
+        return int(df.estimated_size())
+    return 0
+
+
+def _share(df: Any) -> Any:
+    """A new frame object which shares df's data, so callers can rename or add columns without affecting each other."""
+    if isinstance(df, pd.DataFrame):
+        return df.copy(deep=False)
+    if isinstance(df, pl.DataFrame):
+        return df.clone()
+    return df
+
+
+class LoaderRegistry:
+    """Memoizes calls to @shared_loader loaders while active, and keeps track of the loading it avoided."""
+
+    def __init__(self):
+        self._frames: dict[tuple[str, str], Any] = {}
+        self._calls: dict[tuple[str, str], LoaderCall] = {}
+        self._token: Token[LoaderRegistry | None] | None = None
+
+    def __enter__(self) -> LoaderRegistry:
+        self._token = _active_registry.set(self)
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        if self._token is not None:
+            _active_registry.reset(self._token)
+            self._token = None
+
+    @staticmethod
+    def _key(
+        loader: Callable[..., Any], args: tuple[Any, ...], kwargs: dict[str, Any]
+    ) -> tuple[str, str]:
+        """Identify a call by the loader's qualified name and all its arguments, including defaults.
+
+        Calls which pass the same values positionally, as keywords or by relying on defaults get the same key.
+        """
+        bound = inspect.signature(loader).bind(*args, **kwargs)
+        bound.apply_defaults()
+        return f"{loader.__module__}.{loader.__qualname__}", repr(sorted(bound.arguments.items()))
+
+    def load(self, loader: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Call loader, or return the frame from an earlier call with the same arguments."""
+        key = self._key(loader, args=args, kwargs=kwargs)
+        if key not in self._frames:
+            start = time.perf_counter()
+            df = loader(*args, **kwargs)
+            self._calls[key] = LoaderCall(
+                loader_name=key[0],
+                arguments=key[1],
+                load_seconds=time.perf_counter() - start,
+                frame_bytes=_frame_bytes(df),
+            )
+            self._frames[key] = df
+
+        self._calls[key].n_calls += 1
+        return _share(self._frames[key])
+
+    def report(self) -> pl.DataFrame:
+        """One row per unique loader call, with how many loads, seconds and bytes sharing the frame avoided."""
+        return (
+            pl.DataFrame(
+                [vars(call) for call in self._calls.values()],
+                schema={
+                    "loader_name": pl.Utf8,
+                    "arguments": pl.Utf8,
+                    "n_calls": pl.Int64,
+                    "load_seconds": pl.Float64,
+                    "frame_bytes": pl.Int64,
+                },
+            )
+            .with_columns(avoided_loads=pl.col("n_calls") - 1)
+            .with_columns(
+                avoided_seconds=pl.col("avoided_loads") * pl.col("load_seconds"),
+                avoided_bytes=pl.col("avoided_loads") * pl.col("frame_bytes"),
+            )
+            .sort("avoided_seconds", descending=True)
+        )
+
+    def log_report(self) -> None:
+        report = self.report()
+        log.info(
+            f"Shared loaders were called {report['n_calls'].sum()} times for {len(report)} unique frames, avoiding {report['avoided_loads'].sum()} loads, {report['avoided_seconds'].sum():.1f} seconds and {report['avoided_bytes'].sum() / 1024**2:.1f} MB"
+        )
+
+    def clear(self) -> None:
+        """Release the shared frames. Frames already returned to callers are unaffected."""
+        self._frames.clear()
+        self._calls.clear()
+
+
+def shared_loader(loader: LoaderT) -> LoaderT:
+    """Share loader's frames between calls with the same arguments while a LoaderRegistry is active.
+
+    Without an active registry, the loader is called as usual.
+    """
+
+    @wraps(loader)
+    def registered_loader(*args: Any, **kwargs: Any) -> Any:
+        registry = _active_registry.get()
+        if registry is None:
+            return loader(*args, **kwargs)
+        return registry.load(loader, *args, **kwargs)
+
+    return registered_loader  # type: ignore
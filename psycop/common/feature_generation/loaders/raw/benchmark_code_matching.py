@@ -0,0 +1,119 @@
+"""Benchmark DiagnosisCodeMatcher against the SQL LIKE path on synthetic contacts.
+
+The SQL path issues one query with a LIKE chain per predictor, as load_from_codes does. The matcher path
+loads the contacts once and matches all predictors in memory. SQLite stands in for the SQL server, so
+absolute timings differ from production, but both paths scale with the number of predictors in the
+same way.
+"""
+
+import logging
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+from psycop.common.feature_generation.loaders.raw.code_matching import (
+    ContactCodes,
+    DiagnosisCodeMatcher,
+)
+from psycop.common.feature_generation.loaders.raw.utils import codes_to_sql_match_logic
+
+log = logging.getLogger(__name__)
+
+
+def synthetic_contacts(n_contacts: int, seed: int = 42) -> pl.DataFrame:
+    """Contacts with 1-4 diagnoses each, drawn from a pool of ICD-10-like codes."""
+    rng = np.random.default_rng(seed)
+    code_pool = pl.Series(
+        [f"D{chapter}{number:03}" for chapter in "EFGIJK" for number in range(1000)]
+    )
+    prefix_pool = pl.Series(["A:", "B:", "+:"])
+
+    n_tokens = rng.integers(1, 5, size=n_contacts)
+    tokens = [
+        pl.when(pl.lit(n_tokens) > i)
+        .then(
+            prefix_pool.gather(rng.integers(0, len(prefix_pool), size=n_contacts))
+            + code_pool.gather(rng.integers(0, len(code_pool), size=n_contacts))
+        )
+        .alias(f"token_{i}")
+        for i in range(4)
+    ]
+
+    return pl.DataFrame(
+        {"dw_ek_borger": rng.integers(0, n_contacts // 10 + 1, size=n_contacts)}
+    ).with_columns(
+        pl.concat_list(tokens).list.drop_nulls().list.join("#").alias("diagnosegruppestreng")
+    )
+
+
+def synthetic_predictors(n_predictors: int, seed: int = 42) -> dict[str, ContactCodes]:
+    rng = np.random.default_rng(seed)
+    return {
+        f"pred_{i}": ContactCodes(
+            codes=[
+                f"{rng.choice(list('EFGIJK'))}{rng.integers(0, 100):02}"
+                for _ in range(rng.integers(1, 4))
+            ],
+            wildcard=bool(rng.random() < 0.5),
+        )
+        for i in range(n_predictors)
+    }
+
+
+def benchmark(n_contacts: int = 10_000_000, n_predictors: int = 40) -> dict[str, float]:
+    contacts = synthetic_contacts(n_contacts)
+    predictors = synthetic_predictors(n_predictors)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        conn = sqlite3.connect(Path(tmp_dir) / "contacts.db")
+        conn.execute("CREATE TABLE contacts (dw_ek_borger INTEGER, diagnosegruppestreng TEXT)")
+        conn.executemany("INSERT INTO contacts VALUES (?, ?)", contacts.iter_rows())
+        conn.commit()
+
+        start = time.perf_counter()
+        sql_n_rows = {}
+        for name, codes in predictors.items():
+            match_sql = codes_to_sql_match_logic(
+                codes_to_match=codes.codes,
+                code_sql_col_name="diagnosegruppestreng",
+                load_diagnoses=True,
+                match_with_wildcard=codes.wildcard,
+            )
+            sql_n_rows[name] = len(
+                conn.execute(
+                    f"SELECT dw_ek_borger, diagnosegruppestreng FROM contacts WHERE {match_sql}"
+                ).fetchall()
+            )
+        sql_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        loaded = pl.DataFrame(
+            conn.execute("SELECT dw_ek_borger, diagnosegruppestreng FROM contacts").fetchall(),
+            schema=["dw_ek_borger", "diagnosegruppestreng"],
+            orient="row",
+        )
+        load_seconds = time.perf_counter() - start
+        conn.close()
+
+    start = time.perf_counter()
+    matches = DiagnosisCodeMatcher(predictors).match(loaded, code_col_name="diagnosegruppestreng")
+    match_seconds = time.perf_counter() - start
+
+    if matches.sum().row(0, named=True) != sql_n_rows:
+        raise ValueError("Matcher and SQL path disagree")
+
+    return {
+        "sql_seconds": sql_seconds,
+        "matcher_load_seconds": load_seconds,
+        "matcher_match_seconds": match_seconds,
+    }
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    for name, seconds in benchmark().items():
+        log.info(f"{name}: {seconds:.1f}")
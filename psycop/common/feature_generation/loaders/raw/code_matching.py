@@ -0,0 +1,167 @@
+"""Match diagnosis codes in memory, with the same semantics as the SQL match logic in utils.py.
+
+A diagnosis string looks like this:
+    A:DF431#+:ALFC3#B:DF329
+It is split into its '#'-delimited tokens once. All codes are compiled into a prefix trie, which is
+only walked for the distinct tokens (a few thousand, even for millions of contacts). Matching tokens
+are then selected with vectorised polars expressions.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+import polars as pl
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Mapping
+
+ROW_IDX_COL = "_row_idx"
+TOKEN_COL = "_token"
+IS_FIRST_TOKEN_COL = "_is_first_token"
+IS_LAST_TOKEN_COL = "_is_last_token"
+
+
+@dataclass(frozen=True)
+class ContactCodes:
+    """Codes to match in a diagnosis string. Matches the same rows as from_contacts(icd_code=codes, wildcard_icd_code=wildcard)."""
+
+    codes: list[str] | str
+    wildcard: bool = False
+
+    @property
+    def lowercase_codes(self) -> list[str]:
+        codes = [self.codes] if isinstance(self.codes, str) else self.codes
+        return [code.lower() for code in codes]
+
+
+def split_diagnosis_tokens(df: pl.DataFrame, code_col_name: str) -> pl.DataFrame:
+    """Split the lowercased diagnosis strings in code_col_name into one row per token. Rows of df are referenced by ROW_IDX_COL."""
+    return (
+        df.select(pl.col(code_col_name).str.to_lowercase().str.split("#").alias(TOKEN_COL))
+        .with_row_index(ROW_IDX_COL)
+        .with_columns(pl.col(TOKEN_COL).list.len().alias("_n_tokens"))
+        .explode(TOKEN_COL)
+        .with_columns(
+            pl.int_range(0, pl.len()).over(ROW_IDX_COL).alias("_token_idx")  # type: ignore
+        )
+        .select(
+            ROW_IDX_COL,
+            TOKEN_COL,
+            (pl.col("_token_idx") == 0).alias(IS_FIRST_TOKEN_COL),
+            (pl.col("_token_idx") == pl.col("_n_tokens") - 1).alias(IS_LAST_TOKEN_COL),
+        )
+        .filter(pl.col(TOKEN_COL).is_not_null())
+    )
+
+
+@dataclass
+class _TrieNode:
+    children: dict[str, _TrieNode] = field(default_factory=dict)
+    code: str | None = None
+
+
+@dataclass
+class _TokenMatches:
+    """Tokens which contain, end with or equal a code."""
+
+    contains: set[str] = field(default_factory=set)
+    ends_with: set[str] = field(default_factory=set)
+    equals: set[str] = field(default_factory=set)
+
+
+class _CodeTrie:
+    def __init__(self, codes: Iterable[str]):
+        self.root = _TrieNode()
+        for code in codes:
+            node = self.root
+            for char in code:
+                node = node.children.setdefault(char, _TrieNode())
+            node.code = code
+
+    def match(self, tokens: Iterable[str]) -> dict[str, _TokenMatches]:
+        """Find all occurrences of the codes in each token, by walking the trie from each position in the token."""
+        matches: dict[str, _TokenMatches] = defaultdict(_TokenMatches)
+
+        for token in tokens:
+            for start in range(len(token)):
+                node = self.root
+                for end in range(start, len(token)):
+                    next_node = node.children.get(token[end])
+                    if next_node is None:
+                        break
+                    node = next_node
+                    if node.code is None:
+                        continue
+
+                    code_matches = matches[node.code]
+                    code_matches.contains.add(token)
+                    if end == len(token) - 1:
+                        code_matches.ends_with.add(token)
+                        if start == 0:
+                            code_matches.equals.add(token)
+
+        return matches
+
+
+class DiagnosisCodeMatcher:
+    """Compiled matcher for many sets of codes at once.
+
+    Mirrors the SQL generated by load_from_codes(load_diagnoses=True):
+        A single code (str_to_sql_match_logic) matches '%code%' with wildcard, else '%code' or '%code#%'.
+        Multiple codes (list_to_sql_logic) match '%code%' with wildcard, else '%code' or 'code#%'.
+
+    Example:
+        >>> matcher = DiagnosisCodeMatcher({"f20": ContactCodes("F20", wildcard=True)})
+        >>> contacts.with_columns(matcher.match(contacts, code_col_name="diagnosegruppestreng"))
+    """
+
+    def __init__(self, codes_by_name: Mapping[str, ContactCodes]):
+        self.codes_by_name = codes_by_name
+        self._trie = _CodeTrie(
+            code for codes in codes_by_name.values() for code in codes.lowercase_codes
+        )
+
+    def _match_expr(
+        self, codes: ContactCodes, token_matches: Mapping[str, _TokenMatches]
+    ) -> pl.Expr:
+        code_matches = [token_matches.get(code, _TokenMatches()) for code in codes.lowercase_codes]
+        token = pl.col(TOKEN_COL)
+
+        if codes.wildcard:
+            return token.is_in(list(set().union(*(match.contains for match in code_matches))))
+
+        ends_with = list(set().union(*(match.ends_with for match in code_matches)))
+        if len(code_matches) == 1:
+            # '%code' matches the last token, '%code#%' any other token
+            return token.is_in(ends_with)
+
+        # '%code' matches the last token, 'code#%' only a first token which is not also the last
+        equals = list(set().union(*(match.equals for match in code_matches)))
+        return (pl.col(IS_LAST_TOKEN_COL) & token.is_in(ends_with)) | (
+            pl.col(IS_FIRST_TOKEN_COL) & ~pl.col(IS_LAST_TOKEN_COL) & token.is_in(equals)
+        )
+
+    def matching_row_idxs(self, tokens: pl.DataFrame) -> dict[str, pl.Series]:
+        """Get the indices of the rows matching each set of codes, from the output of split_diagnosis_tokens."""
+        token_matches = self._trie.match(tokens.get_column(TOKEN_COL).unique().to_list())
+
+        return {
+            name: tokens.filter(self._match_expr(codes, token_matches))
+            .get_column(ROW_IDX_COL)
+            .unique()
+            for name, codes in self.codes_by_name.items()
+        }
+
+    def match(self, df: pl.DataFrame, code_col_name: str) -> pl.DataFrame:
+        """Get a boolean column for each set of codes, which is true for the rows of df whose code_col_name matches."""
+        row_idxs = pl.Series(ROW_IDX_COL, range(df.height), dtype=pl.UInt32)
+        matching_row_idxs = self.matching_row_idxs(
+            split_diagnosis_tokens(df, code_col_name=code_col_name)
+        )
+
+        return pl.DataFrame(
+            [row_idxs.is_in(idxs).alias(name) for name, idxs in matching_row_idxs.items()]
+        )
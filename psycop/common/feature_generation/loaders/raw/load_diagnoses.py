@@ -9,14 +9,28 @@ from __future__ import annotations
 import logging
 from typing import TYPE_CHECKING, Literal
 
+import polars as pl
+
 from psycop.common.feature_generation.loaders.filters.cvd_filters import only_SCORE2_CVD_diagnoses
 from psycop.common.feature_generation.loaders.filters.diabetes_filters import (
     keep_rows_where_diag_matches_t1d_diag,
     keep_rows_where_diag_matches_t2d_diag,
 )
-from psycop.common.feature_generation.loaders.raw.utils import load_from_codes
+from psycop.common.feature_generation.loaders.raw.code_matching import (
+    ROW_IDX_COL,
+    ContactCodes,
+    DiagnosisCodeMatcher,
+    split_diagnosis_tokens,
+)
+from psycop.common.feature_generation.loaders.raw.sql_load import sql_load
+from psycop.common.feature_generation.loaders.raw.utils import (
+    codes_to_sql_match_logic,
+    load_from_codes,
+)
 
 if TYPE_CHECKING:
+    from collections.abc import Mapping
+
     import pandas as pd
 
 log = logging.getLogger(__name__)
@@ -95,6 +109,92 @@ def from_contacts(
     return df.reset_index(drop=True)  # type: ignore
 
 
+def from_contacts_batched(
+    codes_by_name: Mapping[str, ContactCodes],
+    code_col_name: str = "diagnosegruppestreng",
+    n_rows: int | None = None,
+    shak_location_col: str | None = None,
+    shak_code: int | None = None,
+    shak_sql_operator: str | None = None,
+    timestamp_purpose: Literal["predictor", "outcome"] = "predictor",
+) -> dict[str, pd.DataFrame]:
+    """Load diagnoses for many code lists with a single scan of the contacts view.
+
+    Issues one query for the union of all codes, matches all codes against the diagnosis strings at once with a
+    DiagnosisCodeMatcher, and returns a frame per name
+    which is identical to the output of the corresponding from_contacts call.
+
+    Args:
+        codes_by_name (Mapping[str, ContactCodes]): The codes to match for each output frame.
+        code_col_name (str, optional): Name of column in loaded data frame from which to extract the diagnosis codes. Defaults to "diagnosegruppestreng".
+        n_rows: Number of rows to load from the view, i.e. before splitting by codes. Defaults to None.
+        shak_location_col (str, optional): Name of column containing shak code. Defaults to None. Combine with shak_code and shak_sql_operator.
+        shak_code (int, optional): Shak code indicating where to keep/not keep visits from (e.g. 6600). Defaults to None.
+        shak_sql_operator (str, optional): Operator indicating how to filter shak_code, e.g. "!= 6600" or "= 6600". Defaults to None.
+        timestamp_purpose (Literal[str], optional): Whether the diagnoses are used as predictors (contact end time) or outcomes (contact start time). See from_contacts.
+
+    Returns:
+        dict[str, pd.DataFrame]: Frames with dw_ek_borger, timestamp and value = 1, by name.
+
+    Example:
+        >>> dfs = from_contacts_batched(
+        ...     {
+        ...         "hyperlipidemia": ContactCodes(codes=["E780", "E785"]),
+        ...         "schizophrenia": ContactCodes(codes="f20", wildcard=True),
+        ...     }
+        ... )
+    """
+    if timestamp_purpose == "predictor":
+        source_timestamp_col_name = "datotid_slut"
+    elif timestamp_purpose == "outcome":
+        source_timestamp_col_name = "datotid_start"
+    else:
+        raise ValueError(
+            "Invalid value for timestamp_purpose. Allowed values are ('predictor', 'outcome')."
+        )
+
+    match_sql_strs = {
+        codes_to_sql_match_logic(
+            codes_to_match=codes.codes,
+            code_sql_col_name=code_col_name,
+            load_diagnoses=True,
+            match_with_wildcard=codes.wildcard,
+        )
+        for codes in codes_by_name.values()
+    }
+
+    sql = (
+        f"SELECT dw_ek_borger, {source_timestamp_col_name}, {code_col_name} "
+        + "FROM [fct].[FOR_kohorte_indhold_pt_journal_psyk_somatik_inkl_2021_feb2022] "
+        + f"WHERE {source_timestamp_col_name} IS NOT NULL AND ({' OR '.join(sorted(match_sql_strs))})"
+    )
+    if shak_code is not None:
+        sql += (
+            f" AND left({shak_location_col}, {len(str(shak_code))}) {shak_sql_operator} {shak_code}"
+        )
+
+    contacts = pl.from_pandas(sql_load(sql, database="USR_PS_FORSK", n_rows=n_rows)).rename(
+        {source_timestamp_col_name: "timestamp"}
+    )
+    tokens = split_diagnosis_tokens(contacts, code_col_name=code_col_name)
+    contacts = contacts.drop(code_col_name).with_row_index(ROW_IDX_COL)
+    row_idxs_by_name = DiagnosisCodeMatcher(codes_by_name).matching_row_idxs(tokens)
+
+    dfs: dict[str, pd.DataFrame] = {}
+    for name, row_idxs in row_idxs_by_name.items():
+        dfs[name] = (
+            contacts.filter(pl.col(ROW_IDX_COL).is_in(row_idxs))
+            .drop(ROW_IDX_COL)
+            .with_columns(pl.lit(1, dtype=pl.Int64).alias("value"))
+            .unique(
+                subset=["dw_ek_borger", "timestamp", "value"], keep="first", maintain_order=True
+            )
+            .to_pandas()
+        )
+
+    return dfs
+
+
 def essential_hypertension(
     n_rows: int | None = None,
     shak_location_col: str | None = None,
@@ -2,22 +2,29 @@
 
 from __future__ import annotations
 
+import logging
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
-from multiprocessing import Pool
 from typing import TYPE_CHECKING
 
 import pandas as pd
+from sqlalchemy.exc import InterfaceError, OperationalError
 
-from psycop.common.feature_generation.loaders.raw.sql_load import sql_load
+from psycop.common.feature_generation.loaders.raw.sql_load import sql_load, sql_load_batches
+from psycop.common.global_utils.retry import call_with_retries
 
 if TYPE_CHECKING:
     from collections.abc import Iterable, Sequence
+    from pathlib import Path
 
     from psycop.common.model_training_v2.trainer.preprocessing.step import PresplitStep
 
 
 import polars as pl
 
+log = logging.getLogger(__name__)
+
 
 def get_valid_text_sfi_names() -> set[str]:
     """Returns a set of valid text sfi names. Notice that 'Konklusion' is replaced
@@ -51,11 +58,29 @@ def get_valid_text_sfi_names() -> set[str]:
     }
 
 
+TEXT_SFI_VIEW = "FOR_SFI_fritekst_resultat_udfoert_i_psykiatrien_aendret"
+TEXT_SFI_YEARS = [str(year) for year in range(2011, 2022)]
+
+
+def _text_sfis_for_year_query(
+    year: str, text_sfi_names: str, include_sfi_name: bool = False, view: str = TEXT_SFI_VIEW
+) -> str:
+    sql = "SELECT dw_ek_borger, datotid_senest_aendret_i_sfien, fritekst"
+
+    if include_sfi_name:
+        sql += ", overskrift"
+
+    sql += (
+        f" FROM [fct].[{view}_{year}_inkl_2021_feb2022]" + f" WHERE overskrift IN {text_sfi_names}"
+    )
+    return sql
+
+
 def _load_text_sfis_for_year(
     year: str,
-    text_sfi_names: str | list[str],
+    text_sfi_names: str,
     include_sfi_name: bool = False,
-    view: str | None = "FOR_SFI_fritekst_resultat_udfoert_i_psykiatrien_aendret",
+    view: str = TEXT_SFI_VIEW,
     n_rows: int | None = None,
 ) -> pd.DataFrame:
     """Loads clinical notes from sql from a specified year and matching
@@ -63,7 +88,7 @@ def _load_text_sfis_for_year(
 
     Args:
         year (str): Which year to load
-        text_sfi_names (Union[str, list[str]]): Which types of notes to load.
+        text_sfi_names (str): Which types of notes to load, as a SQL tuple.
         include_sfi_name (bool): Whether to include column with sfi name ("overskrift"). Defaults to False.
         view (str, optional): Which table to load.
             Defaults to "[FOR_SFI_fritekst_resultat_udfoert_i_psykiatrien_aendret".
@@ -73,29 +98,47 @@ def _load_text_sfis_for_year(
     Returns:
         pd.DataFrame: Dataframe with clinical notes
     """
+    sql = _text_sfis_for_year_query(
+        year=year, text_sfi_names=text_sfi_names, include_sfi_name=include_sfi_name, view=view
+    )
+    return call_with_retries(
+        partial(sql_load, sql, database="USR_PS_FORSK", n_rows=n_rows),
+        description=f"Loading text sfis for {year}",
+        retry_on=(OperationalError, InterfaceError),
+    )
 
-    sql = "SELECT dw_ek_borger, datotid_senest_aendret_i_sfien, fritekst"
 
-    if include_sfi_name:
-        sql += ", overskrift"
+def _text_sfi_names_to_sql(text_sfi_names: str | Iterable[str]) -> str:
+    if isinstance(text_sfi_names, str):
+        text_sfi_names = [text_sfi_names]
 
-    sql += (
-        f" FROM [fct].[{view}_{year}_inkl_2021_feb2022]" + f" WHERE overskrift IN {text_sfi_names}"
-    )
+    # check for invalid note types
+    if not set(text_sfi_names).issubset(get_valid_text_sfi_names()):
+        raise ValueError(
+            "Invalid note type. Valid note types are: " + str(get_valid_text_sfi_names())
+        )
 
-    return sql_load(sql, database="USR_PS_FORSK", n_rows=n_rows)
+    # convert text_sfi_names to sql query
+    return "('" + "', '".join(text_sfi_names) + "')"
 
 
 def load_text_sfis(
-    text_sfi_names: str | Iterable[str], include_sfi_name: bool = False, n_rows: int | None = None
+    text_sfi_names: str | Iterable[str],
+    include_sfi_name: bool = False,
+    n_rows: int | None = None,
+    max_workers: int = 4,
 ) -> pd.DataFrame:
     """Loads all clinical notes that match the specified note from all years.
 
+    Years are loaded concurrently in threads, which share the pooled SQL engine. Failed years are retried.
+    To avoid holding all notes in memory, use write_text_sfis_to_dataset.
+
     Args:
         text_sfi_names (Union[str, list[str]]): Which sfi types to load. See
             `get_all_valid_text_sfi_names()` for valid sfi types.
         include_sfi_name (bool): Whether to include column with sfi name ("overskrift"). Defaults to False.
         n_rows (Optional[int], optional): Number of rows to load. Defaults to None.
+        max_workers (int, optional): Maximum number of years to load concurrently. Defaults to 4.
 
     Raises:
         ValueError: If given invalid note type
@@ -103,38 +146,107 @@ def load_text_sfis(
     Returns:
         pd.DataFrame: Featurized clinical notes
     """
-    if isinstance(text_sfi_names, str):
-        text_sfi_names = [text_sfi_names]
-
-    # check for invalid note types
-    if not set(text_sfi_names).issubset(get_valid_text_sfi_names()):
-        raise ValueError(
-            "Invalid note type. Valid note types are: " + str(get_valid_text_sfi_names())
-        )
-
-    # convert text_sfi_names to sql query
-    text_sfi_names = "('" + "', '".join(text_sfi_names) + "')"
-
-    view = "FOR_SFI_fritekst_resultat_udfoert_i_psykiatrien_aendret"
-
     text_sfi_year_loader = partial(
         _load_text_sfis_for_year,
-        text_sfi_names=text_sfi_names,
+        text_sfi_names=_text_sfi_names_to_sql(text_sfi_names),
         include_sfi_name=include_sfi_name,
-        view=view,
         n_rows=n_rows,
     )
 
-    years = list(range(2011, 2022))
-
-    with Pool(processes=len(years)) as p:
-        dfs = p.map(text_sfi_year_loader, [str(y) for y in years])
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        dfs = list(executor.map(text_sfi_year_loader, TEXT_SFI_YEARS))
 
     df = pd.concat(dfs)
     df = df.rename({"datotid_senest_aendret_i_sfien": "timestamp", "fritekst": "value"}, axis=1)
     return df
 
 
+def _write_text_sfis_for_year(
+    year: str,
+    text_sfi_names: str,
+    output_dir: Path,
+    include_sfi_name: bool,
+    n_rows: int | None,
+    batch_size: int,
+) -> None:
+    partition_dir = output_dir / f"year={year}"
+    if partition_dir.exists():
+        log.info(f"{partition_dir} already exists, skipping")
+        return
+
+    # Write to a temporary directory outside the dataset, so a partially written year is never read
+    tmp_partition_dir = output_dir.parent / f".{output_dir.name}_tmp" / f"year={year}"
+    shutil.rmtree(tmp_partition_dir, ignore_errors=True)
+    tmp_partition_dir.mkdir(parents=True)
+
+    sql = _text_sfis_for_year_query(
+        year=year, text_sfi_names=text_sfi_names, include_sfi_name=include_sfi_name
+    )
+    for i, batch in enumerate(
+        sql_load_batches(sql, batch_size=batch_size, database="USR_PS_FORSK", n_rows=n_rows)
+    ):
+        batch.rename(
+            {"datotid_senest_aendret_i_sfien": "timestamp", "fritekst": "value"}
+        ).write_parquet(tmp_partition_dir / f"part-{i:05}.parquet")
+
+    tmp_partition_dir.rename(partition_dir)
+
+
+def write_text_sfis_to_dataset(
+    text_sfi_names: str | Iterable[str],
+    output_dir: Path,
+    include_sfi_name: bool = False,
+    n_rows: int | None = None,
+    max_workers: int = 4,
+    batch_size: int = 500_000,
+    max_attempts: int = 3,
+) -> Path:
+    """Writes all clinical notes that match the specified note types to a Parquet dataset, partitioned by year.
+
+    Each year is streamed from SQL in batches straight to disk, so at most max_workers batches are held in memory.
+    Years which fail are retried, and years which have already been written are skipped, so an interrupted
+    run can be resumed by calling the function again.
+
+    Args:
+        text_sfi_names (Union[str, list[str]]): Which sfi types to load. See
+            `get_all_valid_text_sfi_names()` for valid sfi types.
+        output_dir (Path): Directory to write the dataset to, with one year=<year> directory per year.
+        include_sfi_name (bool): Whether to include column with sfi name ("overskrift"). Defaults to False.
+        n_rows (Optional[int], optional): Number of rows to load per year. Defaults to None.
+        max_workers (int, optional): Maximum number of years to load concurrently. Defaults to 4.
+        batch_size (int, optional): Number of rows per Parquet file. Defaults to 500_000.
+        max_attempts (int, optional): Maximum number of attempts per year. Defaults to 3.
+
+    Returns:
+        Path: output_dir. Read the dataset with e.g. pl.scan_parquet(output_dir / "*" / "*.parquet").
+    """
+    text_sfi_names_sql = _text_sfi_names_to_sql(text_sfi_names)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    def write_year(year: str) -> None:
+        call_with_retries(
+            partial(
+                _write_text_sfis_for_year,
+                year=year,
+                text_sfi_names=text_sfi_names_sql,
+                output_dir=output_dir,
+                include_sfi_name=include_sfi_name,
+                n_rows=n_rows,
+                batch_size=batch_size,
+            ),
+            max_attempts=max_attempts,
+            description=f"Writing text sfis for {year}",
+            retry_on=(OperationalError, InterfaceError),
+        )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Consume the results to raise any exceptions
+        list(executor.map(write_year, TEXT_SFI_YEARS))
+
+    shutil.rmtree(output_dir.parent / f".{output_dir.name}_tmp", ignore_errors=True)
+    return output_dir
+
+
 def load_text_split(
     text_sfi_names: str | Iterable[str] | None,
     split_ids_presplit_step: PresplitStep,
@@ -8,6 +8,7 @@ import pandas as pd
 import polars as pl
 from pydantic import BaseModel
 
+from psycop.common.feature_generation.loaders.loader_registry import shared_loader
 from psycop.common.feature_generation.loaders.raw.sql_load import sql_load
 
 log = logging.getLogger(__name__)
@@ -31,6 +32,7 @@ class RawValueSourceSchema(BaseModel):
     where_clause: str
 
 
+@shared_loader
 def physical_visits(
     timestamp_for_output: Literal["start", "end"] = "end",
     shak_code: Union[int, None] = None,
@@ -172,6 +174,7 @@ def physical_visits(
     return output_df[output_cols].reset_index(drop=True)
 
 
+@shared_loader
 def physical_visits_loader(
     n_rows: Union[int, None] = None, return_value_as_visit_length_days: Union[bool, None] = False
 ) -> pd.DataFrame:
@@ -181,6 +184,7 @@ def physical_visits_loader(
     )
 
 
+@shared_loader
 def physical_visits_to_psychiatry(
     n_rows: Union[int, None] = None,
     timestamps_only: bool = False,
@@ -202,6 +206,7 @@ def physical_visits_to_psychiatry(
     return df
 
 
+@shared_loader
 def physical_visits_to_somatic(
     n_rows: Union[int, None] = None, return_value_as_visit_length_days: Union[bool, None] = False
 ) -> pd.DataFrame:
@@ -214,6 +219,7 @@ def physical_visits_to_somatic(
     )
 
 
+@shared_loader
 def admissions(
     n_rows: Union[int, None] = None,
     return_value_as_visit_length_days: Union[bool, None] = False,
@@ -236,6 +242,7 @@ def admissions(
     return df
 
 
+@shared_loader
 def ambulatory_visits(
     n_rows: Union[int, None] = None,
     return_value_as_visit_length_days: Union[bool, None] = False,
@@ -259,6 +266,7 @@ def ambulatory_visits(
     return df
 
 
+@shared_loader
 def emergency_visits(
     n_rows: Union[int, None] = None,
     return_value_as_visit_length_days: Union[bool, None] = False,
@@ -275,6 +283,7 @@ def emergency_visits(
     )
 
 
+@shared_loader
 def ambulatory_and_emergency_visits(
     n_rows: Union[int, None] = None,
     return_value_as_visit_length_days: Union[bool, None] = False,
@@ -2,17 +2,77 @@
 
 from __future__ import annotations
 
+import datetime as dt
+import decimal
 import logging
-import urllib
-import urllib.parse
+from typing import TYPE_CHECKING, Any
 
 import pandas as pd
-from sqlalchemy import create_engine, text
+import polars as pl
+from sqlalchemy import text
 
-from psycop.automation.environment import on_ovartaci
+from psycop.common.global_utils.sql.engine import get_engine
+from psycop.common.global_utils.sql.query_cache import get_sql_query_cache, normalise_query
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator, Sequence
 
 log = logging.getLogger(__name__)
 
+_CURSOR_TYPE_DTYPES: dict[type, pl.PolarsDataType] = {
+    str: pl.Utf8,
+    int: pl.Int64,
+    float: pl.Float64,
+    decimal.Decimal: pl.Float64,
+    bool: pl.Boolean,
+    dt.datetime: pl.Datetime,
+    dt.date: pl.Date,
+    dt.time: pl.Time,
+    bytes: pl.Binary,
+    bytearray: pl.Binary,
+}
+
+
+def _get_datetime_col_names(col_names: Sequence[str]) -> list[str]:
+    return [
+        colname
+        for colname in col_names
+        if any(substr in colname.lower() for substr in ["datotid", "timestamp"])
+    ]
+
+
+def _is_select_query(query: str) -> bool:
+    return normalise_query(query).lower().startswith(("select", "with"))
+
+
+def _batch_schema(
+    col_names: Sequence[str],
+    cursor_description: Sequence[Sequence[Any]] | None,
+    first_rows: Sequence[tuple[Any, ...]],
+) -> dict[str, pl.PolarsDataType]:
+    """The schema of all batches, so they can be concatenated.
+
+    Uses the column types reported by the driver where they are Python types, e.g. for pyodbc, and otherwise infers
+    them from the first batch. Columns which are all null in the first batch and have no reported type are read as
+    strings, since inferring them would give them the Null dtype.
+    """
+    first_batch_schema = pl.DataFrame(
+        first_rows, schema=list(col_names), orient="row", infer_schema_length=None
+    ).schema
+    reported_types = [
+        description[1] for description in cursor_description or [[None, None]] * len(col_names)
+    ]
+
+    schema: dict[str, pl.PolarsDataType] = {}
+    for col_name, reported_type in zip(col_names, reported_types):
+        if reported_type in _CURSOR_TYPE_DTYPES:
+            schema[col_name] = _CURSOR_TYPE_DTYPES[reported_type]
+        elif first_batch_schema[col_name] != pl.Null:
+            schema[col_name] = first_batch_schema[col_name]
+        else:
+            schema[col_name] = pl.Utf8
+    return schema
+
 
 def sql_load(
     query: str,
@@ -20,10 +80,14 @@ def sql_load(
     database: str = "USR_PS_FORSK",
     format_timestamp_cols_to_datetime: bool | None = True,
     n_rows: int | None = None,
+    use_cache: bool = True,
 ) -> pd.DataFrame:
-    """Function to load a SQL query. If chunksize is None, all data will be
-    loaded into memory. Otherwise, will stream the data in chunks of chunksize
-    as a generator.
+    """Function to load a SQL query. Connections are checked out of a pooled engine which is
+    shared by all calls in the process, see psycop.common.global_utils.sql.engine.
+    All data is loaded into memory. To stream the data in batches, use sql_load_batches.
+
+    If the SQL query cache has been enabled (see psycop.common.global_utils.sql.query_cache),
+    results of SELECT queries are read from and written to it.
 
     Args:
         query (str): The SQL query
@@ -32,9 +96,10 @@ def sql_load(
         format_timestamp_cols_to_datetime (bool, optional): Whether to format all
             columns with "datotid" in their name as pandas datetime. Defaults to true.
         n_rows (int, optional): Defaults to None. If specified, only returns the first n rows.
+        use_cache (bool, optional): Whether to use the SQL query cache, if it is enabled. Defaults to true.
 
     Returns:
-        Union[pd.DataFrame, Generator[pd.DataFrame]]: DataFrame or generator of DataFrames
+        pd.DataFrame: The result of the query
 
     Example:
         # From USR_PS_Forsk
@@ -42,39 +107,81 @@ def sql_load(
         >>> sql = "SELECT * FROM [fct]." + view
         >>> df = sql_load(sql)
     """
-    # Driver for Kubeflow is different from driver on Ovartaci
-    driver = "SQL Server"
+    if n_rows:
+        query = query.replace("SELECT", f"SELECT TOP {n_rows} ")
 
-    # Separate setup for kubeflow
-    if not on_ovartaci():
-        driver = "ODBC Driver 18 for SQL Server"
-        server = "rmsqls0175.onerm.dk"
+    cache = get_sql_query_cache() if use_cache and _is_select_query(query) else None
+    df = cache.get(query, server=server, database=database) if cache else None
 
-    params = urllib.parse.quote(
-        f"DRIVER={driver};SERVER={server};DATABASE={database};Trusted_Connection=yes;"
-    )
+    if df is None:
+        engine = get_engine(server=server, database=database)
+        log.info(f"Loading {query}")
+        with engine.connect() as conn:
+            df = pd.read_sql(text(query), conn.execution_options(stream_results=True))  # type: ignore
 
-    if not on_ovartaci():
-        params += "TrustServerCertificate=yes;"
+        if cache:
+            cache.put(df, query, server=server, database=database)
 
-    if n_rows:
-        query = query.replace("SELECT", f"SELECT TOP {n_rows} ")
+    if format_timestamp_cols_to_datetime:
+        datetime_col_names = _get_datetime_col_names(df.columns)
+        df[datetime_col_names] = df[datetime_col_names].apply(pd.to_datetime)
 
-    engine = create_engine(f"mssql+pyodbc:///?odbc_connect={params}")
-    conn = engine.connect().execution_options(stream_results=True, fast_executemany=True)
-    log.info(f"Loading {query}")
-    df = pd.read_sql(text(query), conn)  # type: ignore
+    return df
 
-    if format_timestamp_cols_to_datetime:
-        datetime_col_names = [
-            colname
-            for colname in df.columns
-            if any(substr in colname.lower() for substr in ["datotid", "timestamp"])
-        ]
 
-        df[datetime_col_names] = df[datetime_col_names].apply(pd.to_datetime)
+def sql_load_batches(
+    query: str,
+    batch_size: int = 1_000_000,
+    server: str = "BI-DPA-PROD",
+    database: str = "USR_PS_FORSK",
+    format_timestamp_cols_to_datetime: bool = True,
+    n_rows: int | None = None,
+) -> Iterator[pl.DataFrame]:
+    """Stream the result of a SQL query as polars DataFrames of at most batch_size rows.
+    Only one batch is held in memory at a time, so peak memory is bounded by batch_size rather than the size of the result.
+    All batches have the same schema, taken from the cursor description or the first batch, so they can be concatenated.
+
+    Args:
+        query (str): The SQL query
+        batch_size (int): Maximum number of rows in each batch. Defaults to 1_000_000.
+        server (str): The BI server
+        database (str): The BI database
+        format_timestamp_cols_to_datetime (bool, optional): Whether to format all
+            columns with "datotid" or "timestamp" in their name as datetime, per batch. Defaults to true.
+        n_rows (int, optional): Defaults to None. If specified, only returns the first n rows.
 
-    conn.close()  # type: ignore
-    engine.dispose()  # type: ignore
+    Example:
+        >>> view = "[FOR_kohorte_indhold_pt_journal_psyk_somatik_inkl_2021_feb2022]"
+        >>> batches = sql_load_batches("SELECT * FROM [fct]." + view, batch_size=500_000)
+        >>> n_rows = sum(batch.height for batch in batches)
+    """
+    if n_rows:
+        query = query.replace("SELECT", f"SELECT TOP {n_rows} ")
 
-    return df
+    engine = get_engine(server=server, database=database)
+    log.info(f"Streaming {query}")
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(text(query))
+        col_names = list(result.keys())
+        datetime_col_names = (
+            _get_datetime_col_names(col_names) if format_timestamp_cols_to_datetime else []
+        )
+
+        schema: dict[str, pl.PolarsDataType] | None = None
+        while rows := result.fetchmany(batch_size):
+            batch_rows = [tuple(row) for row in rows]
+            if schema is None:
+                schema = _batch_schema(
+                    col_names=col_names,
+                    cursor_description=result.cursor.description if result.cursor else None,
+                    first_rows=batch_rows,
+                )
+            batch = pl.DataFrame(batch_rows, schema=schema, orient="row")
+            yield batch.with_columns(
+                [
+                    pl.col(col).str.to_datetime()
+                    if batch.schema[col] == pl.Utf8
+                    else pl.col(col).cast(pl.Datetime)
+                    for col in datetime_col_names
+                ]
+            )
@@ -0,0 +1,54 @@
+import random
+import sqlite3
+
+import polars as pl
+import pytest
+
+from psycop.common.feature_generation.loaders.raw.code_matching import (
+    ContactCodes,
+    DiagnosisCodeMatcher,
+)
+from psycop.common.feature_generation.loaders.raw.utils import codes_to_sql_match_logic
+
+
+def _random_diagnosis_string(rng: random.Random) -> str:
+    return "#".join(
+        f"{rng.choice(['A', 'B', '+'])}:D{rng.choice('EF')}{rng.randint(0, 30)}"
+        for _ in range(rng.randint(1, 4))
+    )
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matcher_agrees_with_sql_like_logic(seed: int):
+    rng = random.Random(seed)
+    contacts = pl.DataFrame(
+        {"diagnosegruppestreng": [_random_diagnosis_string(rng) for _ in range(500)]}
+    )
+    codes_by_name = {
+        str(i): ContactCodes(
+            codes=[f"{rng.choice('EF')}{rng.randint(0, 30)}" for _ in range(rng.randint(1, 3))],
+            wildcard=rng.random() < 0.5,
+        )
+        for i in range(20)
+    }
+
+    matches = DiagnosisCodeMatcher(codes_by_name).match(
+        contacts, code_col_name="diagnosegruppestreng"
+    )
+
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE contacts (idx INTEGER, diagnosegruppestreng TEXT)")
+    conn.executemany(
+        "INSERT INTO contacts VALUES (?, ?)",
+        enumerate(contacts.get_column("diagnosegruppestreng").to_list()),
+    )
+    for name, codes in codes_by_name.items():
+        match_sql = codes_to_sql_match_logic(
+            codes_to_match=codes.codes,
+            code_sql_col_name="diagnosegruppestreng",
+            load_diagnoses=True,
+            match_with_wildcard=codes.wildcard,
+        )
+        sql_idxs = {idx for (idx,) in conn.execute(f"SELECT idx FROM contacts WHERE {match_sql}")}
+
+        assert set(matches.with_row_index().filter(pl.col(name))["index"].to_list()) == sql_idxs
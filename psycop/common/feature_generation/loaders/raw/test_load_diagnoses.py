@@ -0,0 +1,64 @@
+from collections.abc import Generator
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from psycop.common.feature_generation.loaders.raw.load_diagnoses import (
+    ContactCodes,
+    from_contacts,
+    from_contacts_batched,
+)
+from psycop.common.global_utils.sql.engine import dispose_engines, register_engine
+from psycop.common.test_utils.sql_stand_in import sqlite_stand_in_engine
+
+DIAGNOSIS_STRINGS = [
+    "A:DF431#+:ALFC3#B:DF329",
+    "A:DF20",
+    "A:DF200#B:DE785",
+    "A:DE780",
+    "A:DI109#B:DF431",
+    "A:DI1090",
+    "A:DE11#B:DF20",
+]
+
+
+@pytest.fixture
+def _contacts_view(tmp_path: Path) -> Generator[None, None, None]:
+    engine = sqlite_stand_in_engine(tmp_path)
+    pd.DataFrame(
+        {
+            "dw_ek_borger": range(len(DIAGNOSIS_STRINGS)),
+            "datotid_start": "2020-01-01 10:00:00",
+            "datotid_slut": "2020-01-02 10:00:00",
+            "diagnosegruppestreng": DIAGNOSIS_STRINGS,
+        }
+    ).to_sql(
+        "FOR_kohorte_indhold_pt_journal_psyk_somatik_inkl_2021_feb2022",
+        engine,
+        schema="fct",
+        index=False,
+    )
+
+    register_engine(engine)
+    yield
+    dispose_engines()
+
+
+@pytest.mark.usefixtures("_contacts_view")
+def test_from_contacts_batched_matches_from_contacts():
+    codes_by_name = {
+        "f43_exact": ContactCodes(codes="F431"),
+        "f20_wildcard": ContactCodes(codes="F20", wildcard=True),
+        "f20_exact": ContactCodes(codes=["F20"]),
+        "hyperlipidemia": ContactCodes(codes=["E780", "E785"]),
+        "i109_f431_exact": ContactCodes(codes=["I109", "F431"]),
+        "i109_e11_wildcard": ContactCodes(codes=["I109", "E11"], wildcard=True),
+    }
+
+    batched = from_contacts_batched(codes_by_name)
+
+    for name, codes in codes_by_name.items():
+        expected = from_contacts(icd_code=codes.codes, wildcard_icd_code=codes.wildcard)
+        assert len(expected) > 0
+        pd.testing.assert_frame_equal(batched[name], expected, check_like=True)
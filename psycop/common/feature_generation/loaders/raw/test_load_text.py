@@ -0,0 +1,86 @@
+from collections.abc import Generator
+from pathlib import Path
+
+import pandas as pd
+import polars as pl
+import pytest
+
+from psycop.common.feature_generation.loaders.raw import load_text
+from psycop.common.feature_generation.loaders.raw.load_text import (
+    TEXT_SFI_VIEW,
+    TEXT_SFI_YEARS,
+    load_text_sfis,
+    write_text_sfis_to_dataset,
+)
+from psycop.common.global_utils.sql.engine import dispose_engines, register_engine
+from psycop.common.test_utils.sql_stand_in import sqlite_stand_in_engine
+
+
+@pytest.fixture
+def _text_sfi_views(tmp_path: Path) -> Generator[None, None, None]:
+    engine = sqlite_stand_in_engine(tmp_path)
+    for year in TEXT_SFI_YEARS:
+        pd.DataFrame(
+            {
+                "dw_ek_borger": [1, 2, 3],
+                "datotid_senest_aendret_i_sfien": f"{year}-01-01 10:00:00",
+                "fritekst": [f"note {year}", "plan", "kontakt"],
+                "overskrift": ["Aktuelt psykisk", "Plan", "Kontaktårsag"],
+            }
+        ).to_sql(f"{TEXT_SFI_VIEW}_{year}_inkl_2021_feb2022", engine, schema="fct", index=False)
+
+    register_engine(engine)
+    yield
+    dispose_engines()
+
+
+@pytest.mark.usefixtures("_text_sfi_views")
+def test_write_text_sfis_to_dataset(tmp_path: Path):
+    sfi_names = ["Aktuelt psykisk", "Plan"]
+    output_dir = write_text_sfis_to_dataset(
+        sfi_names, output_dir=tmp_path / "notes", batch_size=1, max_workers=2
+    )
+
+    assert sorted(path.name for path in output_dir.iterdir()) == [
+        f"year={year}" for year in TEXT_SFI_YEARS
+    ]
+
+    dataset = (
+        pl.scan_parquet(output_dir / "*" / "*.parquet", hive_partitioning=True)
+        .drop("year")
+        .sort("timestamp", "dw_ek_borger")
+        .collect()
+        .to_pandas()
+    )
+    expected = (
+        load_text_sfis(sfi_names).sort_values(["timestamp", "dw_ek_borger"]).reset_index(drop=True)
+    )
+    pd.testing.assert_frame_equal(dataset, expected, check_dtype=False)
+    assert len(dataset) == 2 * len(TEXT_SFI_YEARS)
+
+
+@pytest.mark.usefixtures("_text_sfi_views")
+def test_write_text_sfis_to_dataset_skips_written_years(tmp_path: Path):
+    output_dir = tmp_path / "notes"
+    (output_dir / f"year={TEXT_SFI_YEARS[0]}").mkdir(parents=True)
+
+    write_text_sfis_to_dataset("Plan", output_dir=output_dir)
+
+    assert not list((output_dir / f"year={TEXT_SFI_YEARS[0]}").iterdir())
+    assert list((output_dir / f"year={TEXT_SFI_YEARS[1]}").iterdir())
+
+
+def test_write_text_sfis_to_dataset_does_not_retry_non_transient_errors(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    calls: list[str] = []
+
+    def failing_write(year: str, **_: object) -> None:
+        calls.append(year)
+        raise ValueError("Not a database error")
+
+    monkeypatch.setattr(load_text, "_write_text_sfis_for_year", failing_write)
+
+    with pytest.raises(ValueError, match="Not a database error"):
+        write_text_sfis_to_dataset("Plan", output_dir=tmp_path / "notes", max_workers=1)
+    assert calls == [TEXT_SFI_YEARS[0]]
@@ -0,0 +1,41 @@
+from collections.abc import Generator
+from pathlib import Path
+
+import pandas as pd
+import polars as pl
+import pytest
+from sqlalchemy import create_engine
+
+from psycop.common.feature_generation.loaders.raw.sql_load import sql_load, sql_load_batches
+from psycop.common.global_utils.sql.engine import dispose_engines, register_engine
+
+
+@pytest.fixture
+def _contacts_db(tmp_path: Path) -> Generator[None, None, None]:
+    engine = create_engine(f"sqlite:///{tmp_path / 'stand_in.db'}")
+    pd.DataFrame(
+        {
+            "dw_ek_borger": range(10),
+            "datotid_start": [f"2020-01-{day:02} 10:00:00" for day in range(1, 11)],
+            "diagnosegruppestreng": ["A:DF20#B:DF431"] * 10,
+            "note": [None] * 5 + ["note"] * 5,
+        }
+    ).to_sql("contacts", engine, index=False)
+
+    register_engine(engine)
+    yield
+    dispose_engines()
+
+
+@pytest.mark.usefixtures("_contacts_db")
+def test_sql_load_batches():
+    batches = list(sql_load_batches("SELECT * FROM contacts", batch_size=4))
+
+    assert [batch.height for batch in batches] == [4, 4, 2]
+    assert all(batch.schema["datotid_start"] == pl.Datetime for batch in batches)
+    # The first batch has no values in the note column, but all batches have the same schema
+    assert all(batch.schema == batches[0].schema for batch in batches)
+    assert batches[0].schema["note"] == pl.Utf8
+
+    streamed = pl.concat(batches).to_pandas()
+    pd.testing.assert_frame_equal(streamed, sql_load("SELECT * FROM contacts"), check_dtype=False)
@@ -73,6 +73,39 @@ def list_to_sql_logic(
     return " OR ".join(match_col_sql_strings)
 
 
+def codes_to_sql_match_logic(
+    codes_to_match: list[str] | str,
+    code_sql_col_name: str,
+    load_diagnoses: bool,
+    match_with_wildcard: bool,
+) -> str:
+    """Generate SQL match logic from a string or a list of strings. See str_to_sql_match_logic and list_to_sql_logic."""
+    match codes_to_match:
+        case str():
+            return str_to_sql_match_logic(
+                code_to_match=codes_to_match,
+                code_sql_col_name=code_sql_col_name,
+                load_diagnoses=load_diagnoses,
+                match_with_wildcard=match_with_wildcard,
+            )
+        case list() if len(codes_to_match) == 1:
+            return str_to_sql_match_logic(
+                code_to_match=codes_to_match[0],
+                code_sql_col_name=code_sql_col_name,
+                load_diagnoses=load_diagnoses,
+                match_with_wildcard=match_with_wildcard,
+            )
+        case [*codes_to_match] if len(codes_to_match) > 1:
+            return list_to_sql_logic(
+                codes_to_match=codes_to_match,
+                code_sql_col_name=code_sql_col_name,
+                load_diagnoses=load_diagnoses,
+                match_with_wildcard=match_with_wildcard,
+            )
+        case list():
+            raise ValueError("List is neither of len==1 or len>1")
+
+
 def load_from_codes(
     codes_to_match: list[str] | str,
     load_diagnoses: bool,
@@ -130,30 +163,12 @@ def load_from_codes(
     """
     fct = f"[{view}]"
 
-    match codes_to_match:
-        case str():
-            match_col_sql_str = str_to_sql_match_logic(
-                code_to_match=codes_to_match,
-                code_sql_col_name=code_col_name,
-                load_diagnoses=load_diagnoses,
-                match_with_wildcard=match_with_wildcard,
-            )
-        case list() if len(codes_to_match) == 1:
-            match_col_sql_str = str_to_sql_match_logic(
-                code_to_match=codes_to_match[0],
-                code_sql_col_name=code_col_name,
-                load_diagnoses=load_diagnoses,
-                match_with_wildcard=match_with_wildcard,
-            )
-        case [*codes_to_match] if len(codes_to_match) > 1:
-            match_col_sql_str = list_to_sql_logic(
-                codes_to_match=codes_to_match,
-                code_sql_col_name=code_col_name,
-                load_diagnoses=load_diagnoses,
-                match_with_wildcard=match_with_wildcard,
-            )
-        case list():
-            raise ValueError("List is neither of len==1 or len>1")
+    match_col_sql_str = codes_to_sql_match_logic(
+        codes_to_match=codes_to_match,
+        code_sql_col_name=code_col_name,
+        load_diagnoses=load_diagnoses,
+        match_with_wildcard=match_with_wildcard,
+    )
 
     sql = (
         f"SELECT dw_ek_borger, {source_timestamp_col_name}, {code_col_name} "
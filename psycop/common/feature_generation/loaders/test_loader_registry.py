@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from psycop.common.feature_generation.loaders.loader_registry import LoaderRegistry, shared_loader
+
+calls: list[int | None] = []
+
+
+@shared_loader
+def _values(n_rows: int | None = None, value: float = 1.0) -> pd.DataFrame:
+    calls.append(n_rows)
+    return pd.DataFrame({"dw_ek_borger": [1, 2, 3], "value": [value] * 3}).head(n_rows)
+
+
+def test_shared_loader_loads_each_unique_call_once():
+    calls.clear()
+
+    with LoaderRegistry() as registry:
+        first = _values()
+        # The same arguments, passed differently
+        second = _values(None, value=1.0)
+        third = _values(n_rows=2)
+        # Renaming a column of one frame does not affect the others
+        third.columns = ["dw_ek_borger", "renamed"]
+        assert list(_values(n_rows=2).columns) == ["dw_ek_borger", "value"]
+
+    assert calls == [None, 2]
+    assert np.shares_memory(first["value"].to_numpy(), second["value"].to_numpy())
+    assert first is not second
+
+    report = registry.report()
+    assert report["n_calls"].to_list() == [2, 2]
+    assert report["avoided_loads"].to_list() == [1, 1]
+    assert (report["avoided_bytes"] > 0).all()
+
+
+def test_shared_loader_without_registry_calls_loader():
+    calls.clear()
+
+    _values()
+    _values()
+
+    assert calls == [None, None]
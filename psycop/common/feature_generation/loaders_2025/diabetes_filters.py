@@ -2,20 +2,28 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 
+import polars as pl
+
 if TYPE_CHECKING:
+    import numpy as np
     import pandas as pd
 
 
+def _matches_pattern(series: pd.Series, regex_pattern: str) -> np.ndarray:  # type: ignore
+    """Vectorised regex matching with polars, which avoids pandas' per-row matching in Python."""
+    return pl.from_pandas(series).str.contains(regex_pattern).fill_null(False).to_numpy()
+
+
 def keep_rows_where_col_name_matches_pattern(
     df: pd.DataFrame, col_name: str, regex_pattern: str
 ) -> pd.DataFrame:
-    return df[df[col_name].str.contains(regex_pattern)]
+    return df[_matches_pattern(df[col_name], regex_pattern)]
 
 
 def remove_rows_where_col_name_matches_pattern(
     df: pd.DataFrame, col_name: str, regex_pattern: str
 ) -> pd.DataFrame:
-    return df[~df[col_name].str.contains(regex_pattern)]
+    return df[~_matches_pattern(df[col_name], regex_pattern)]
 
 
 def keep_rows_where_diag_matches_t2d_diag(df: pd.DataFrame, col_name: str) -> pd.DataFrame:
@@ -0,0 +1,67 @@
+"""Benchmark PatientSliceFromEvents.unpack on synthetic events.
+
+On one CPU, 100k patients / 5M events took 42s with the previous per-row unpacking (partition_by, iter_rows and a
+TemporalEvent per row), and about 4s when building patients from group offsets. Both scale linearly with the
+number of events. The default of 1M patients / 50M events needs several GB of memory.
+"""
+
+import datetime as dt
+import logging
+import time
+
+import numpy as np
+import polars as pl
+
+from psycop.common.feature_generation.sequences.patient_slice_from_events import (
+    PatientSliceFromEvents,
+)
+
+log = logging.getLogger(__name__)
+
+
+def synthetic_events(n_patients: int, n_events: int, seed: int = 42) -> pl.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pl.DataFrame(
+        {
+            "dw_ek_borger": rng.integers(0, n_patients, size=n_events),
+            "timestamp": pl.Series(
+                rng.integers(
+                    dt.datetime(2013, 1, 1).timestamp() * 1e6,
+                    dt.datetime(2023, 1, 1).timestamp() * 1e6,
+                    size=n_events,
+                )
+            ).cast(pl.Datetime("us")),
+            "source": rng.choice(["diagnosis", "medication", "lab"], size=n_events),
+            "type": rng.choice(["A", "B", "+"], size=n_events),
+            "value": rng.choice([f"f{i}" for i in range(1000)], size=n_events),
+        }
+    )
+
+
+def benchmark(
+    n_patients: int = 1_000_000, n_events: int = 50_000_000, n_workers: int = 1
+) -> dict[str, float]:
+    events = synthetic_events(n_patients=n_patients, n_events=n_events)
+    date_of_birth_df = pl.DataFrame(
+        {
+            "dw_ek_borger": np.arange(n_patients),
+            "timestamp": pl.repeat(dt.datetime(1990, 1, 1), n_patients, eager=True),
+        }
+    )
+
+    start = time.perf_counter()
+    patients = PatientSliceFromEvents().unpack(
+        source_event_dataframes=[events], date_of_birth_df=date_of_birth_df, n_workers=n_workers
+    )
+    unpack_seconds = time.perf_counter() - start
+
+    if sum(len(patient.temporal_events) for patient in patients) != n_events:
+        raise ValueError("Events were lost while unpacking")
+
+    return {"unpack_seconds": unpack_seconds, "events_per_second": n_events / unpack_seconds}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    for name, value in benchmark().items():
+        log.info(f"{name}: {value:.1f}")
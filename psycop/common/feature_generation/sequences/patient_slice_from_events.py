@@ -1,20 +1,20 @@
+import itertools
+from collections import defaultdict
 from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Any
 
 import polars as pl
-from tqdm import tqdm
 from wasabi import Printer
 
 from psycop.common.data_structures.patient import Patient
+from psycop.common.data_structures.patient_store import PatientStore
 from psycop.common.data_structures.static_feature import StaticFeature
-from psycop.common.data_structures.temporal_event import TemporalEvent
+from psycop.common.data_structures.temporal_event_arrays import TemporalEventArrays
 
 msg = Printer(timestamp=True)
 
-PatientDict = dict[str | int, list[TemporalEvent | StaticFeature]]
-
 
 @dataclass(frozen=True)
 class PatientSliceColumnNames:
@@ -26,55 +26,125 @@ class PatientSliceColumnNames:
 
 
 class PatientSliceFromEvents:
-    """Unpacks a sequence of dataframes containing events into a list of patients."""
+    """Unpacks a sequence of dataframes containing events into a list of patients.
+
+    Temporal events are sorted once by patient and timestamp into a PatientStore, and each patient gets a view of the store's arrays,
+    so no Python object is created per event.
+    """
 
     def __init__(self, column_names: PatientSliceColumnNames | None = None) -> None:
         self._column_names = column_names if column_names is not None else PatientSliceColumnNames()
 
-    def _temporal_event_dict_to_event_obj(self, event_row: dict[str, Any]) -> TemporalEvent:
-        return TemporalEvent(
-            timestamp=event_row[self._column_names.timestamp_col_name],
-            source_type=event_row[self._column_names.source_col_name],
-            source_subtype=event_row[self._column_names.source_subtype_col_name]
-            if self._column_names.source_subtype_col_name is not None
-            else None,
-            value=event_row[self._column_names.value_col_name],
+    def _temporal_events_to_store(self, temporal_event_dfs: Sequence[pl.DataFrame]) -> PatientStore:
+        return PatientStore.from_frames(
+            temporal_event_dfs,
+            patient_id_col_name=self._column_names.patient_id_col_name,
+            timestamp_col_name=self._column_names.timestamp_col_name,
+            source_col_name=self._column_names.source_col_name,
+            value_col_name=self._column_names.value_col_name,
+            source_subtype_col_name=self._column_names.source_subtype_col_name,
         )
 
-    def _static_feature_dict_to_event_obj(self, event_row: dict[str, Any]) -> StaticFeature:
-        return StaticFeature(
-            source_type=event_row[self._column_names.source_col_name],
-            value=event_row[self._column_names.value_col_name],
-        )
-
-    def _patient_df_to_patient_dict(self, patient_events: pl.DataFrame) -> PatientDict:
-        event_dicts = patient_events.iter_rows(named=True)
-
-        is_temporal_events = self._column_names.timestamp_col_name in patient_events.columns
+    def _with_common_id_dtype(self, dfs: Sequence[pl.DataFrame]) -> list[pl.DataFrame]:
+        """Cast the patient ids of all dfs to their common supertype, so ids from different loaders hash and compare equal."""
+        patient_id_col_name = self._column_names.patient_id_col_name
+        if not dfs:
+            return []
+
+        id_dtype = pl.concat(
+            [df.select(patient_id_col_name).clear() for df in dfs], how="vertical_relaxed"
+        ).schema[patient_id_col_name]
+        return [df.with_columns(pl.col(patient_id_col_name).cast(id_dtype)) for df in dfs]
+
+    def _shard(self, df: pl.DataFrame, n_shards: int) -> list[pl.DataFrame]:
+        """Split df into shards with disjoint sets of patients. Keeps the order of rows within each shard."""
+        if n_shards == 1:
+            return [df]
+
+        shard_idx = pl.col(self._column_names.patient_id_col_name).hash() % n_shards
+        return [df.filter(shard_idx == i) for i in range(n_shards)]
+
+    def _temporal_events_by_patient(
+        self, temporal_event_dfs: Sequence[pl.DataFrame], n_workers: int
+    ) -> dict[int | str, TemporalEventArrays]:
+        sharded_dfs = [self._shard(df, n_shards=n_workers) for df in temporal_event_dfs]
+        shards = [[dfs[shard_idx] for dfs in sharded_dfs] for shard_idx in range(n_workers)]
+
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            stores = list(executor.map(self._temporal_events_to_store, shards))
+
+        return dict(itertools.chain.from_iterable(stores))
+
+    def _static_features_by_patient(
+        self, static_feature_dfs: Sequence[pl.DataFrame]
+    ) -> dict[int | str, list[StaticFeature]]:
+        static_features: dict[int | str, list[StaticFeature]] = defaultdict(list)
+
+        for df in static_feature_dfs:
+            for patient_id, source_type, value in zip(
+                df.get_column(self._column_names.patient_id_col_name).to_list(),
+                df.get_column(self._column_names.source_col_name).to_list(),
+                df.get_column(self._column_names.value_col_name).to_list(),
+            ):
+                static_features[patient_id].append(
+                    StaticFeature(source_type=source_type, value=value)
+                )
+
+        return static_features
 
-        if is_temporal_events:
-            event_objects = [
-                self._temporal_event_dict_to_event_obj(event_row=e) for e in event_dicts
-            ]
-        else:
-            event_objects = [
-                self._static_feature_dict_to_event_obj(event_row=e) for e in event_dicts
-            ]
+    def _date_of_birth_df_to_dict(
+        self, date_of_birth_df: pl.DataFrame
+    ) -> dict[int | str, datetime]:
+        return dict(
+            zip(
+                date_of_birth_df.get_column(self._column_names.patient_id_col_name).to_list(),
+                date_of_birth_df.get_column(self._column_names.timestamp_col_name).to_list(),
+            )
+        )
 
-        patient_id: str = patient_events.select(
-            pl.first(self._column_names.patient_id_col_name)
-        ).item()
+    def unpack(
+        self,
+        source_event_dataframes: Sequence[pl.DataFrame],
+        date_of_birth_df: pl.DataFrame,
+        n_workers: int = 1,
+    ) -> list[Patient]:
+        """Unpack the events into patients, in order of their first appearance in source_event_dataframes.
+
+        Dataframes with a timestamp column contain temporal events, the rest contain static features.
+
+        Args:
+            source_event_dataframes: Dataframes with one row per event.
+            date_of_birth_df: Dataframe with the date of birth of each patient.
+            n_workers: Number of patient shards to sort and index concurrently. Sorting and indexing run in polars and NumPy,
+                which release the GIL, so threads can run them in parallel.
+        """
+        patient_id_col_name = self._column_names.patient_id_col_name
+        source_event_dataframes = self._with_common_id_dtype(source_event_dataframes)
+        temporal_event_dfs = [
+            df
+            for df in source_event_dataframes
+            if self._column_names.timestamp_col_name in df.columns
+        ]
+        static_feature_dfs = [
+            df
+            for df in source_event_dataframes
+            if self._column_names.timestamp_col_name not in df.columns
+        ]
 
-        patient_dict = {patient_id: event_objects}
+        msg.info(f"Unpacking {len(source_event_dataframes)} loaders")
+        temporal_events = self._temporal_events_by_patient(temporal_event_dfs, n_workers=n_workers)
+        static_features = self._static_features_by_patient(static_feature_dfs)
+        date_of_birth_dict = self._date_of_birth_df_to_dict(date_of_birth_df=date_of_birth_df)
 
-        return patient_dict  # type: ignore
+        patient_ids = (
+            pl.concat([df.select(patient_id_col_name) for df in source_event_dataframes])
+            .get_column(patient_id_col_name)
+            .unique(maintain_order=True)
+            .to_list()
+        )
 
-    def _cohort_dict_to_patient_slices(
-        self, cohort_dict: PatientDict, date_of_birth_dict: dict[int | str, datetime]
-    ) -> list[Patient]:
         patient_cohort: list[Patient] = []
-
-        for patient_id, patient_events in cohort_dict.items():
+        for patient_id in patient_ids:
             try:
                 date_of_birth = date_of_birth_dict[patient_id]
             except KeyError as e:
@@ -83,52 +153,14 @@ class PatientSliceFromEvents:
                     "Please make sure that the date of birth is included in the "
                     "date_of_birth_df."
                 ) from e
-            patient = Patient(patient_id=patient_id, date_of_birth=date_of_birth)
-            patient.add_events(patient_events)
-            patient_cohort.append(patient)
 
-        return patient_cohort
-
-    def _date_of_birth_df_to_dict(
-        self, date_of_birth_df: pl.DataFrame
-    ) -> dict[int | str, datetime]:
-        date_of_birth_dicts = date_of_birth_df.iter_rows(named=True)
-        date_of_birth_dict = {
-            row[self._column_names.patient_id_col_name]: row[self._column_names.timestamp_col_name]
-            for row in date_of_birth_dicts
-        }
-
-        return date_of_birth_dict
-
-    def unpack(
-        self, source_event_dataframes: Sequence[pl.DataFrame], date_of_birth_df: pl.DataFrame
-    ) -> list[Patient]:
-        patient_dfs_collections = [
-            df.partition_by(by=self._column_names.patient_id_col_name, maintain_order=True)
-            for df in source_event_dataframes
-        ]
-
-        patient_dicts = []
-        for i, collection in enumerate(patient_dfs_collections):
-            msg.info(f"Unpacking loader {i+1} of {len(patient_dfs_collections)}")
-
-            for patient_df in tqdm(collection):
-                patient_dicts.append(self._patient_df_to_patient_dict(patient_df))
-
-        cohort_dict = {}
-
-        for patient_dict in patient_dicts:
-            patient_id = list(patient_dict.keys())[0]  # noqa: RUF015
-            if patient_id not in cohort_dict:
-                cohort_dict.update(patient_dict)
-            else:
-                patient_events = list(patient_dict.values())[0]  # noqa: RUF015
-                cohort_dict[patient_id] += patient_events
-
-        date_of_birth_dict = self._date_of_birth_df_to_dict(date_of_birth_df=date_of_birth_df)
-
-        patient_cohort = self._cohort_dict_to_patient_slices(
-            cohort_dict=cohort_dict, date_of_birth_dict=date_of_birth_dict
-        )
+            patient_cohort.append(
+                Patient(
+                    patient_id=patient_id,
+                    date_of_birth=date_of_birth,
+                    unsorted_static_features=static_features.get(patient_id, []),
+                    temporal_event_arrays=temporal_events.get(patient_id),
+                )
+            )
 
         return patient_cohort
@@ -1,5 +1,6 @@
 import datetime as dt
 
+import polars as pl
 import pytest
 
 from psycop.common.data_structures.static_feature import StaticFeature
@@ -163,3 +164,64 @@ def test_passing_patient_colnames():
         event.source_subtype is None
         for event in [e for p in unpacked_without_source_subtype_column for e in p.temporal_events]
     )
+
+
+def test_sharded_unpacking_equals_unsharded():
+    test_data = str_to_pl_df(
+        """dw_ek_borger,timestamp,source,value
+3,2020-01-02 00:00:00,source1,0
+1,2020-01-01 00:00:00,source1,1
+2,2020-01-01 00:00:00,source2,2
+1,2020-01-01 00:00:00,source2,3
+3,2020-01-01 00:00:00,source1,4
+1,2019-01-01 00:00:00,source1,5
+                             """
+    )
+    unpacker = PatientSliceFromEvents(
+        column_names=PatientSliceColumnNames(source_subtype_col_name=None)
+    )
+    date_of_birth_df = get_test_date_of_birth_df(patient_ids=[1, 2, 3])
+
+    unsharded = unpacker.unpack(
+        source_event_dataframes=[test_data], date_of_birth_df=date_of_birth_df
+    )
+    sharded = unpacker.unpack(
+        source_event_dataframes=[test_data], date_of_birth_df=date_of_birth_df, n_workers=3
+    )
+
+    assert [p.patient_id for p in unsharded] == [3, 1, 2]
+    assert [e.value for e in unsharded[1].temporal_events] == [5, 1, 3]
+    assert sharded == unsharded
+
+
+@pytest.mark.parametrize("n_workers", [1, 4])
+def test_unpacking_loaders_with_different_id_dtypes(n_workers: int):
+    temporal_data = str_to_pl_df(
+        """dw_ek_borger,timestamp,source,value
+1,2020-01-01 00:00:00,source1,0
+2,2020-01-01 00:00:00,source1,1
+                             """
+    )
+    # Same patients, but with Int32 ids, as e.g. another loader may return
+    other_temporal_data = temporal_data.with_columns(
+        pl.col("dw_ek_borger").cast(pl.Int32), pl.col("source").replace("source1", "source2")
+    )
+    static_data = str_to_pl_df(
+        """dw_ek_borger,source,value
+1,test,0
+                             """
+    ).with_columns(pl.col("dw_ek_borger").cast(pl.Int32))
+
+    unpacked = PatientSliceFromEvents(
+        column_names=PatientSliceColumnNames(source_subtype_col_name=None)
+    ).unpack(
+        source_event_dataframes=[temporal_data, other_temporal_data, static_data],
+        date_of_birth_df=get_test_date_of_birth_df(patient_ids=[1, 2]),
+        n_workers=n_workers,
+    )
+
+    assert [p.patient_id for p in unpacked] == [1, 2]
+    assert [{e.source_type for e in p.temporal_events} for p in unpacked] == [
+        {"source1", "source2"}
+    ] * 2
+    assert len(unpacked[0].static_features) == 1
@@ -54,6 +54,9 @@ def load_dataset_from_file(file_path: Path, nrows: int | None = None) -> pd.Data
 
     file_suffix = file_path.suffix
 
+    if file_path.is_dir():  # A partition of a Parquet dataset
+        file_suffix = ".parquet"
+
     if file_suffix == ".csv":
         return pd.read_csv(file_path, nrows=nrows)
 
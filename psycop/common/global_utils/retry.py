@@ -0,0 +1,41 @@
+import logging
+import time
+from collections.abc import Callable
+from typing import TypeVar
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def call_with_retries(
+    fn: Callable[[], T],
+    max_attempts: int = 3,
+    backoff_seconds: float = 5.0,
+    retry_on: tuple[type[Exception], ...] = (Exception,),
+    description: str = "call",
+) -> T:
+    """Call fn, retrying with exponential backoff if it raises one of retry_on.
+
+    Args:
+        fn: The function to call.
+        max_attempts: Maximum number of calls. The last exception is re-raised if all attempts fail.
+        backoff_seconds: Seconds to wait before the first retry. Doubles for each subsequent retry.
+        retry_on: Exceptions which are considered transient.
+        description: Description of the call, for logging.
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return fn()
+        except retry_on as e:
+            if attempt == max_attempts:
+                log.error(f"{description} failed after {max_attempts} attempts")
+                raise
+
+            wait_seconds = backoff_seconds * 2 ** (attempt - 1)
+            log.warning(
+                f"{description} failed on attempt {attempt}/{max_attempts}: {e}. Retrying in {wait_seconds}s"
+            )
+            time.sleep(wait_seconds)
+
+    raise ValueError("max_attempts must be at least 1")
@@ -0,0 +1,160 @@
+"""Process-wide registry of pooled SQLAlchemy engines.
+
+Creating an engine and connecting to the SQL server requires an ODBC handshake, which is slow.
+Instead of creating (and disposing) an engine for every query, engines are cached per process,
+keyed by (server, database, driver), and connections are checked out of the engine's pool.
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import threading
+import urllib
+import urllib.parse
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from sqlalchemy import create_engine
+
+from psycop.automation.environment import on_ovartaci
+
+if TYPE_CHECKING:
+    from sqlalchemy.engine import Engine
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class SQLEngineKey:
+    server: str
+    database: str
+    driver: str
+    trust_server_certificate: bool = False
+
+    def to_url(self) -> str:
+        params = urllib.parse.quote(
+            f"DRIVER={self.driver};SERVER={self.server};DATABASE={self.database};Trusted_Connection=yes;"
+        )
+
+        if self.trust_server_certificate:
+            params += "TrustServerCertificate=yes;"
+
+        return f"mssql+pyodbc:///?odbc_connect={params}"
+
+
+@dataclass(frozen=True)
+class SQLPoolSettings:
+    """Settings for the connection pool of newly created engines.
+
+    Args:
+        pool_size: Number of connections to keep open in the pool.
+        max_overflow: Number of connections to allow beyond pool_size when the pool is exhausted.
+        pool_recycle: Seconds after which a connection is replaced, to avoid server-side timeouts.
+        pool_pre_ping: Whether to test connections for liveness when checking them out.
+    """
+
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_recycle: int = 3600
+    pool_pre_ping: bool = True
+
+
+def resolve_engine_key(server: str, database: str) -> SQLEngineKey:
+    """Get the engine key for the current environment."""
+    # Driver for Kubeflow is different from driver on Ovartaci
+    if on_ovartaci():
+        return SQLEngineKey(server=server, database=database, driver="SQL Server")
+
+    # Separate setup for kubeflow
+    return SQLEngineKey(
+        server="rmsqls0175.onerm.dk",
+        database=database,
+        driver="ODBC Driver 18 for SQL Server",
+        trust_server_certificate=True,
+    )
+
+
+class SQLEngineRegistry:
+    """Engines by key for the current process. Thread-safe."""
+
+    def __init__(self, pool_settings: SQLPoolSettings = SQLPoolSettings()):  # noqa: B008
+        self.pool_settings = pool_settings
+        self._engines: dict[SQLEngineKey, Engine] = {}
+        self._lock = threading.Lock()
+
+    def configure_pool(self, pool_settings: SQLPoolSettings) -> None:
+        """Set the pool settings for engines created from now on. Existing engines are disposed, so they are recreated with the new settings on next use."""
+        self.pool_settings = pool_settings
+        self.dispose()
+
+    def get(self, server: str, database: str) -> Engine:
+        """Get the engine for server and database, creating it on first use."""
+        key = resolve_engine_key(server=server, database=database)
+
+        with self._lock:
+            if key not in self._engines:
+                log.debug(f"Creating SQL engine for {key}")
+                self._engines[key] = create_engine(
+                    key.to_url(),
+                    pool_size=self.pool_settings.pool_size,
+                    max_overflow=self.pool_settings.max_overflow,
+                    pool_recycle=self.pool_settings.pool_recycle,
+                    pool_pre_ping=self.pool_settings.pool_pre_ping,
+                    # Send inserts as one batch instead of row by row
+                    fast_executemany=True,
+                )
+            return self._engines[key]
+
+    def register(self, engine: Engine, server: str, database: str) -> None:
+        """Use engine for all queries against server and database. Replaces (and disposes) any existing engine."""
+        key = resolve_engine_key(server=server, database=database)
+
+        with self._lock:
+            previous_engine = self._engines.get(key)
+            self._engines[key] = engine
+
+        if previous_engine is not None and previous_engine is not engine:
+            previous_engine.dispose()
+
+    def dispose(self) -> None:
+        """Close all pooled connections and forget all engines."""
+        with self._lock:
+            engines = list(self._engines.values())
+            self._engines.clear()
+
+        for engine in engines:
+            engine.dispose()
+
+    def forget_after_fork(self) -> None:
+        """Connections cannot be shared across processes. Forget the engines inherited from the parent process, without closing the parent's connections."""
+        self._lock = threading.Lock()
+
+        for engine in self._engines.values():
+            engine.dispose(close=False)
+        self._engines.clear()
+
+
+SQL_ENGINES = SQLEngineRegistry()
+
+atexit.register(SQL_ENGINES.dispose)
+if hasattr(os, "register_at_fork"):  # Not available on Windows, which spawns fresh processes
+    os.register_at_fork(after_in_child=SQL_ENGINES.forget_after_fork)
+
+
+def get_engine(server: str = "BI-DPA-PROD", database: str = "USR_PS_FORSK") -> Engine:
+    """Get the pooled engine for server and database, creating it on first use in this process."""
+    return SQL_ENGINES.get(server=server, database=database)
+
+
+def register_engine(
+    engine: Engine, server: str = "BI-DPA-PROD", database: str = "USR_PS_FORSK"
+) -> None:
+    """Use engine for all queries against server and database in this process, e.g. a local SQLite stand-in for testing."""
+    SQL_ENGINES.register(engine=engine, server=server, database=database)
+
+
+def dispose_engines() -> None:
+    """Close all pooled connections and forget all engines in this process."""
+    SQL_ENGINES.dispose()
@@ -0,0 +1,221 @@
+"""Local Parquet cache for the results of SQL queries.
+
+Results are keyed by a hash of the normalised query text and the server/database it was run against,
+so the same query from different loaders hits the same entry. Entries expire after a TTL, and the
+least recently used entries are evicted when the cache exceeds its size limit.
+
+The cache is opt-in. Enable it for the current process with enable_sql_query_cache(), after which
+sql_load reads from and writes to it.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import pandas as pd
+
+from psycop.automation.environment import on_ovartaci
+from psycop.common.global_utils.paths import OVARTACI_SHARED_DIR, PSYCOP_PKG_ROOT
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+
+def normalise_query(query: str) -> str:
+    """Collapse whitespace outside of string literals, so formatting differences do not change the cache key."""
+    parts = query.strip().split("'")
+    # Even parts are outside string literals
+    return "'".join(
+        re.sub(r"\s+", " ", part) if i % 2 == 0 else part for i, part in enumerate(parts)
+    )
+
+
+@dataclass
+class SQLQueryCacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        n_lookups = self.hits + self.misses
+        return self.hits / n_lookups if n_lookups else 0.0
+
+
+class SQLQueryCache:
+    """Parquet cache of query results in cache_dir.
+
+    Args:
+        cache_dir: Directory to store the cached results in.
+        ttl: Entries older than this are treated as missing and deleted. If None, entries never expire.
+        max_size_bytes: When the cache grows beyond this size, the least recently used entries are evicted. If None, the cache is unbounded.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        ttl: dt.timedelta | None = dt.timedelta(days=7),  # noqa: B008
+        max_size_bytes: int | None = 50 * 1024**3,
+    ):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_size_bytes = max_size_bytes
+        self.stats = SQLQueryCacheStats()
+        self._lock = threading.Lock()
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(query: str, server: str, database: str) -> str:
+        return hashlib.sha256(
+            f"{server}\n{database}\n{normalise_query(query)}".encode()
+        ).hexdigest()
+
+    def _data_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.parquet"
+
+    def _metadata_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def _is_expired(self, key: str) -> bool:
+        if self.ttl is None:
+            return False
+        created_at = dt.datetime.fromisoformat(
+            json.loads(self._metadata_path(key).read_text())["created_at"]
+        )
+        return dt.datetime.now() - created_at > self.ttl
+
+    def _remove(self, key: str) -> None:
+        self._data_path(key).unlink(missing_ok=True)
+        self._metadata_path(key).unlink(missing_ok=True)
+
+    def get(self, query: str, server: str, database: str) -> pd.DataFrame | None:
+        """Get the cached result of query, or None if it is not cached or has expired."""
+        key = self.key(query=query, server=server, database=database)
+
+        with self._lock:
+            if not self._data_path(key).exists() or not self._metadata_path(key).exists():
+                self.stats.misses += 1
+                return None
+
+            if self._is_expired(key):
+                log.debug(f"Cached result for {key} has expired")
+                self._remove(key)
+                self.stats.misses += 1
+                return None
+
+            # Mark as recently used for eviction
+            self._data_path(key).touch()
+            self.stats.hits += 1
+
+        log.info(f"Loading cached result for {query}")
+        return pd.read_parquet(self._data_path(key))
+
+    def put(self, df: pd.DataFrame, query: str, server: str, database: str) -> None:
+        """Cache df as the result of query. Frames which cannot be written to Parquet, e.g. because of columns with mixed types, are not cached."""
+        key = self.key(query=query, server=server, database=database)
+        tmp_path = self.cache_dir / f"{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+        try:
+            df.to_parquet(tmp_path, index=False)
+        except Exception as e:
+            log.warning(f"Could not cache result of {query}: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return
+
+        with self._lock:
+            # Write atomically, so concurrent readers never see a partial file
+            tmp_path.replace(self._data_path(key))
+            self._metadata_path(key).write_text(
+                json.dumps(
+                    {
+                        "query": query,
+                        "server": server,
+                        "database": database,
+                        "created_at": dt.datetime.now().isoformat(),
+                    }
+                )
+            )
+            self._evict_to_max_size()
+
+    def _evict_to_max_size(self) -> None:
+        if self.max_size_bytes is None:
+            return
+
+        entries = sorted(self.cache_dir.glob("*.parquet"), key=lambda path: path.stat().st_mtime)
+        total_size = sum(path.stat().st_size for path in entries)
+
+        # Never evict the most recently written entry
+        for path in entries[:-1]:
+            if total_size <= self.max_size_bytes:
+                break
+            total_size -= path.stat().st_size
+            self._remove(path.stem)
+            self.stats.evictions += 1
+
+    def invalidate(self, query: str, server: str, database: str) -> bool:
+        """Remove the cached result of query. Returns whether there was a cached result."""
+        key = self.key(query=query, server=server, database=database)
+
+        with self._lock:
+            existed = self._data_path(key).exists()
+            self._remove(key)
+        return existed
+
+    def invalidate_matching(self, substring: str) -> int:
+        """Remove all cached results whose query contains substring, e.g. the name of a view which has been updated. Returns the number of removed results."""
+        n_removed = 0
+
+        with self._lock:
+            for metadata_path in self.cache_dir.glob("*.json"):
+                if substring.lower() in json.loads(metadata_path.read_text())["query"].lower():
+                    self._remove(metadata_path.stem)
+                    n_removed += 1
+        return n_removed
+
+    def clear(self) -> None:
+        """Remove all cached results."""
+        with self._lock:
+            for path in [*self.cache_dir.glob("*.parquet"), *self.cache_dir.glob("*.json")]:
+                path.unlink(missing_ok=True)
+
+
+def default_sql_query_cache_dir() -> Path:
+    if on_ovartaci():
+        return OVARTACI_SHARED_DIR / "cache" / "sql"
+    return PSYCOP_PKG_ROOT / ".cache" / "sql"
+
+
+@dataclass
+class _ActiveSQLQueryCache:
+    cache: SQLQueryCache | None = None
+
+
+_active_sql_query_cache = _ActiveSQLQueryCache()
+
+
+def enable_sql_query_cache(cache: SQLQueryCache | None = None) -> SQLQueryCache:
+    """Cache the results of sql_load in this process. If cache is None, uses a cache in the default directory."""
+    if cache is None:
+        cache = SQLQueryCache(cache_dir=default_sql_query_cache_dir())
+    _active_sql_query_cache.cache = cache
+    return cache
+
+
+def disable_sql_query_cache() -> None:
+    _active_sql_query_cache.cache = None
+
+
+def get_sql_query_cache() -> SQLQueryCache | None:
+    """Get the cache used by sql_load, or None if caching is disabled."""
+    return _active_sql_query_cache.cache
@@ -0,0 +1,50 @@
+from collections.abc import Generator
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+from psycop.common.feature_generation.loaders.raw.sql_load import sql_load
+from psycop.common.global_utils.sql.engine import dispose_engines, get_engine, register_engine
+
+
+@pytest.fixture
+def sqlite_engine(tmp_path: Path) -> Generator[Engine, None, None]:
+    engine = create_engine(f"sqlite:///{tmp_path / 'stand_in.db'}", poolclass=QueuePool)
+    pd.DataFrame(
+        {"dw_ek_borger": [1, 2], "datotid_start": ["2020-01-01 10:00:00", "2021-01-01 12:00:00"]}
+    ).to_sql("contacts", engine, index=False)
+
+    register_engine(engine, server="BI-DPA-PROD", database="USR_PS_FORSK")
+    yield engine
+    dispose_engines()
+
+
+def test_sql_load_reuses_registered_engine(sqlite_engine: Engine):
+    for _ in range(3):
+        df = sql_load("SELECT * FROM contacts")
+        assert get_engine(server="BI-DPA-PROD", database="USR_PS_FORSK") is sqlite_engine
+
+    assert len(df) == 2
+    assert df["datotid_start"].dtype == "datetime64[ns]"
+    # All connections have been returned to the pool
+    assert sqlite_engine.pool.checkedout() == 0  # type: ignore
+
+
+def test_engines_are_keyed_by_database(sqlite_engine: Engine):
+    other_engine = create_engine("sqlite://")
+    register_engine(other_engine, server="BI-DPA-PROD", database="OTHER_DB")
+
+    assert get_engine(database="USR_PS_FORSK") is sqlite_engine
+    assert get_engine(database="OTHER_DB") is other_engine
+
+
+def test_dispose_engines_closes_pooled_connections(sqlite_engine: Engine):
+    sql_load("SELECT * FROM contacts")
+    assert sqlite_engine.pool.checkedin() == 1  # type: ignore
+
+    dispose_engines()
+    assert sqlite_engine.pool.checkedin() == 0  # type: ignore
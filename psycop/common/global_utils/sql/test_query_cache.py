@@ -0,0 +1,91 @@
+import datetime as dt
+from collections.abc import Generator
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+
+from psycop.common.feature_generation.loaders.raw.sql_load import sql_load
+from psycop.common.global_utils.sql.engine import dispose_engines, register_engine
+from psycop.common.global_utils.sql.query_cache import (
+    SQLQueryCache,
+    disable_sql_query_cache,
+    enable_sql_query_cache,
+    normalise_query,
+)
+
+
+@pytest.fixture
+def cache(tmp_path: Path) -> SQLQueryCache:
+    return SQLQueryCache(cache_dir=tmp_path / "cache")
+
+
+@pytest.fixture
+def enabled_cache(cache: SQLQueryCache) -> Generator[SQLQueryCache, None, None]:
+    enable_sql_query_cache(cache)
+    yield cache
+    disable_sql_query_cache()
+
+
+@pytest.fixture
+def sqlite_engine(tmp_path: Path) -> Generator[Engine, None, None]:
+    engine = create_engine(f"sqlite:///{tmp_path / 'stand_in.db'}")
+    pd.DataFrame({"dw_ek_borger": [1, 2], "value": [0.5, 1.5]}).to_sql("lab", engine, index=False)
+
+    register_engine(engine)
+    yield engine
+    dispose_engines()
+
+
+def test_normalise_query_ignores_whitespace_outside_literals():
+    assert normalise_query("SELECT  *\n FROM lab ") == "SELECT * FROM lab"
+    assert normalise_query("SELECT * FROM lab WHERE x = 'a  b'") != normalise_query(
+        "SELECT * FROM lab WHERE x = 'a b'"
+    )
+
+
+def test_sql_load_uses_cache(enabled_cache: SQLQueryCache, sqlite_engine: Engine):
+    first = sql_load("SELECT * FROM lab")
+
+    # A hit does not touch the database
+    with sqlite_engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE lab")
+    second = sql_load("SELECT *\n FROM lab")
+
+    pd.testing.assert_frame_equal(first, second)
+    assert (enabled_cache.stats.hits, enabled_cache.stats.misses) == (1, 1)
+
+
+def test_cache_ttl(cache: SQLQueryCache):
+    df = pd.DataFrame({"a": [1]})
+    cache.put(df, "SELECT * FROM a", server="s", database="d")
+    assert cache.get("SELECT * FROM a", server="s", database="d") is not None
+    # Same query against another database is a different entry
+    assert cache.get("SELECT * FROM a", server="s", database="other") is None
+
+    cache.ttl = dt.timedelta(seconds=0)
+    assert cache.get("SELECT * FROM a", server="s", database="d") is None
+    assert not list(cache.cache_dir.glob("*.parquet"))
+
+
+def test_cache_evicts_least_recently_used(cache: SQLQueryCache):
+    df = pd.DataFrame({"a": range(100)})
+    cache.put(df, "SELECT 1", server="s", database="d")
+    cache.max_size_bytes = next(cache.cache_dir.glob("*.parquet")).stat().st_size
+    cache.put(df, "SELECT 2", server="s", database="d")
+
+    assert cache.get("SELECT 1", server="s", database="d") is None
+    assert cache.get("SELECT 2", server="s", database="d") is not None
+    assert cache.stats.evictions == 1
+
+
+def test_cache_invalidation(cache: SQLQueryCache):
+    df = pd.DataFrame({"a": [1]})
+    for query in ["SELECT * FROM [fct].[view_a]", "SELECT * FROM [fct].[view_b]"]:
+        cache.put(df, query, server="s", database="d")
+
+    assert cache.invalidate_matching("view_a") == 1
+    assert cache.invalidate("SELECT * FROM [fct].[view_b]", server="s", database="d")
+    assert not list(cache.cache_dir.glob("*.parquet"))
@@ -0,0 +1,59 @@
+from collections.abc import Generator
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+
+from psycop.common.global_utils import retry
+from psycop.common.global_utils.sql.engine import dispose_engines, register_engine
+from psycop.common.global_utils.sql.writer import write_df_to_sql
+from psycop.common.test_utils.sql_stand_in import sqlite_stand_in_engine
+
+
+@pytest.fixture
+def sqlite_engine(tmp_path: Path) -> Generator[Engine, None, None]:
+    engine = sqlite_stand_in_engine(tmp_path)
+    register_engine(engine)
+    yield engine
+    dispose_engines()
+
+
+@pytest.mark.parametrize("n_workers", [1, 3])
+def test_write_df_to_sql(sqlite_engine: Engine, n_workers: int):
+    df = pd.DataFrame({"dw_ek_borger": range(1000), "text": [f"note {i}" for i in range(1000)]})
+
+    stats = write_df_to_sql(df, table_name="notes", rows_per_chunk=100, n_workers=n_workers)
+
+    written = pd.read_sql("SELECT * FROM fct.notes ORDER BY dw_ek_borger", sqlite_engine)
+    pd.testing.assert_frame_equal(written, df)
+    assert stats.n_rows == 1000
+    assert stats.rows_per_second > 0
+
+
+def test_write_df_to_sql_respects_if_exists(sqlite_engine: Engine):
+    df = pd.DataFrame({"dw_ek_borger": range(10)})
+    write_df_to_sql(df, table_name="ids", rows_per_chunk=3)
+
+    with pytest.raises(ValueError, match="already exists"):
+        write_df_to_sql(df, table_name="ids")
+
+    write_df_to_sql(df, table_name="ids", if_exists="append")
+    assert len(pd.read_sql("SELECT * FROM fct.ids", sqlite_engine)) == 20
+
+
+def test_write_df_to_sql_does_not_retry_integrity_errors(
+    sqlite_engine: Engine, monkeypatch: pytest.MonkeyPatch
+):
+    retry_waits: list[float] = []
+    monkeypatch.setattr(retry.time, "sleep", retry_waits.append)
+    with sqlite_engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE fct.ids (dw_ek_borger INTEGER PRIMARY KEY)")
+
+    with pytest.raises(IntegrityError):
+        write_df_to_sql(
+            pd.DataFrame({"dw_ek_borger": [1, 1]}), table_name="ids", if_exists="append"
+        )
+
+    assert retry_waits == []
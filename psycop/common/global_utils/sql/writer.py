@@ -1,16 +1,24 @@
 "“”Handle fast writing to SQL database.“”"
 
-import urllib
-import urllib.parse
+import logging
+import time
 from collections.abc import Generator, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
 from typing import Optional
 
 import pandas as pd
-from sqlalchemy import create_engine
-from sqlalchemy.engine import Connection
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import InterfaceError, OperationalError
 from tqdm import tqdm
 from wasabi import msg
 
+from psycop.common.global_utils.retry import call_with_retries
+from psycop.common.global_utils.sql.engine import get_engine
+
+log = logging.getLogger(__name__)
+
 
 def chunker(seq: Sequence | pd.DataFrame, size: int) -> Generator:  # type: ignore
     """Yield successive n-sized chunks from seq."""
@@ -19,27 +27,94 @@ def chunker(seq: Sequence | pd.DataFrame, size: int) -> Generator:  # type: igno
     return (seq[pos : pos + size] for pos in range(0, len(seq), size))
 
 
+@dataclass(frozen=True)
+class SQLWriteStats:
+    n_rows: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.n_rows / self.seconds if self.seconds else float("inf")
+
+
+def _insert_chunk(
+    chunked_df: pd.DataFrame, table_name: str, engine: Engine, if_exists: str, max_attempts: int
+) -> int:
+    """Insert a chunk in its own transaction, so a failed attempt is rolled back before it is retried."""
+
+    def insert() -> None:
+        with engine.begin() as conn:
+            chunked_df.to_sql(
+                schema="fct", con=conn, name=table_name, if_exists=if_exists, index=False
+            )
+
+    # Only connection and server errors are transient. Retrying e.g. IntegrityError or ProgrammingError would hide the
+    # real failure
+    call_with_retries(
+        insert,
+        max_attempts=max_attempts,
+        retry_on=(OperationalError, InterfaceError),
+        description=f"Inserting {len(chunked_df)} rows into {table_name}",
+    )
+    return len(chunked_df)
+
+
 def insert_with_progress(
-    df: pd.DataFrame, table_name: str, conn: Connection, rows_per_chunk: int, if_exists: str
-):
-    """Chunk dataframe and insert each chunk, showing a progress bar.
+    df: pd.DataFrame,
+    table_name: str,
+    engine: Engine,
+    rows_per_chunk: int,
+    if_exists: str,
+    n_workers: int = 1,
+    max_attempts: int = 3,
+) -> SQLWriteStats:
+    """Chunk dataframe and insert each chunk, showing a progress bar with the throughput.
     Args:
         df (pd.DataFrame): Dataframe to insert.
         table_name (str): SQL table name to insert into.
-        conn (_type_): Connected sqlalchemy engine.
+        engine (Engine): Engine to check out connections from.
         rows_per_chunk (int): How many rows to fit into each chunk.
-        if_exists (str): What to do if table exists. Takes {'fail', 'replace', 'append'}.s
+        if_exists (str): What to do if table exists. Takes {'fail', 'replace', 'append'}.
+        n_workers (int): Number of chunks to insert concurrently. Defaults to 1.
+        max_attempts (int): Maximum number of attempts per chunk on transient database errors. Defaults to 3.
     """
+    start = time.perf_counter()
+    chunks = chunker(df, rows_per_chunk)
 
-    with tqdm(total=len(df)) as pbar:
-        for i, chunked_df in enumerate(  # pylint: disable=invalid-name
-            chunker(df, rows_per_chunk)
-        ):
-            replace = if_exists if i == 0 else "append"
-            chunked_df.to_sql(
-                schema="fct", con=conn, name=table_name, if_exists=replace, index=False
+    with tqdm(total=len(df), unit="rows") as pbar:
+
+        def update_progress(n_rows: int) -> None:
+            pbar.update(n_rows)
+            pbar.set_postfix(rows_per_s=f"{pbar.n / (time.perf_counter() - start):.0f}")
+
+        # The first chunk creates (or replaces) the table, the rest are appended
+        first_chunk = next(chunks, df)
+        update_progress(
+            _insert_chunk(
+                first_chunk,
+                table_name=table_name,
+                engine=engine,
+                if_exists=if_exists,
+                max_attempts=max_attempts,
             )
-            pbar.update(rows_per_chunk)
+        )
+
+        insert_appended_chunk = partial(
+            _insert_chunk,
+            table_name=table_name,
+            engine=engine,
+            if_exists="append",
+            max_attempts=max_attempts,
+        )
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            for n_rows in executor.map(insert_appended_chunk, chunks):
+                update_progress(n_rows)
+
+    stats = SQLWriteStats(n_rows=len(df), seconds=time.perf_counter() - start)
+    log.info(
+        f"Wrote {stats.n_rows} rows to {table_name} in {stats.seconds:.1f}s ({stats.rows_per_second:.0f} rows/s)"
+    )
+    return stats
 
 
 def write_df_to_sql(
@@ -49,8 +124,12 @@ def write_df_to_sql(
     server: Optional[str] = "BI-DPA-PROD",
     database: Optional[str] = "USR_PS_FORSK",
     if_exists: str = "fail",
-):
+    n_workers: int = 1,
+    max_attempts: int = 3,
+) -> SQLWriteStats:
     """Writes a pandas dataframe to the SQL server.
+
+    Rows are sent in batches using fast_executemany on the pooled engine, see psycop.common.global_utils.sql.engine.
     Args:
         df (pd.DataFrame): dataframe to write
         table_name (str): name of table to write to
@@ -58,27 +137,24 @@ def write_df_to_sql(
         server (str, optional): The SQL server. Defaults to “BI-DPA_PROD”.
         database (str, optional): The SQL database. Defaults to “USR_PS_Forsk”.
         if_exists (str): What to do if the table already exists. Takes {'fail', 'replace', 'append'}. Defaults to “fail”.
-    """
+        n_workers (int): Number of chunks to upload concurrently. Defaults to 1.
+        max_attempts (int): Maximum number of attempts per chunk on transient database errors. Defaults to 3.
 
-    # Driver for Kubeflow is different from driver on Ovartaci
-    driver = "SQL Server"
-
-    params = urllib.parse.quote(
-        f"DRIVER={driver};SERVER={server};DATABASE={database};Trusted_Connection=yes;"
-    )
+    Returns:
+        SQLWriteStats: Number of rows written and throughput.
+    """
+    engine = get_engine(server=server or "BI-DPA-PROD", database=database or "USR_PS_FORSK")
 
-    engine = create_engine(f"mssql+pyodbc:///?odbc_connect={params}")
-    conn = engine.connect().execution_options(stream_results=True, fast_executemany=True)
     if if_exists == "replace":
         msg.warn(
             "'replace' only replaces rows, not the table. If you want to delete rows, drop the entire table first (sql_load(query='DROP TABLE [fct].[psycop_train_ids]'))."
         )
-    insert_with_progress(
+    return insert_with_progress(
         df=df,
         table_name=table_name,
         rows_per_chunk=rows_per_chunk,
-        conn=conn,  # type: ignore
+        engine=engine,
         if_exists=if_exists,
+        n_workers=n_workers,
+        max_attempts=max_attempts,
     )
-    conn.close()  # type: ignore
-    engine.dispose()  # type: ignore
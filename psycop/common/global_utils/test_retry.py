@@ -0,0 +1,36 @@
+import pytest
+
+from psycop.common.global_utils.retry import call_with_retries
+
+
+def test_call_with_retries():
+    attempts: list[int] = []
+
+    def flaky() -> str:
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("Transient")
+        return "done"
+
+    assert call_with_retries(flaky, max_attempts=3, backoff_seconds=0) == "done"
+    assert len(attempts) == 3
+
+
+def test_call_with_retries_reraises_after_max_attempts():
+    def failing() -> None:
+        raise ConnectionError("Down")
+
+    with pytest.raises(ConnectionError):
+        call_with_retries(failing, max_attempts=2, backoff_seconds=0)
+
+
+def test_call_with_retries_does_not_retry_other_exceptions():
+    attempts: list[int] = []
+
+    def failing() -> None:
+        attempts.append(1)
+        raise KeyError("Bug")
+
+    with pytest.raises(KeyError):
+        call_with_retries(failing, backoff_seconds=0, retry_on=(ConnectionError,))
+    assert len(attempts) == 1
@@ -112,7 +112,8 @@ class DataLoader:
         self, split_name: str, dataset_dir: Path, nrows: Optional[int] = None
     ) -> pd.DataFrame:
         """Load dataset from directory. Finds any file with the matching file
-        suffix with the split name in its filename.
+        suffix with the split name in its filename, or the split's partition
+        (split=<split_name>/) if the directory is a Hive-partitioned dataset.
 
         Args:
             split_name (str): Name of split, allowed are ["train", "test", "val"]
@@ -129,7 +130,12 @@ class DataLoader:
         if self.file_suffix not in ("csv", "parquet"):
             raise ValueError(f"File suffix {self.file_suffix} not supported.")
 
-        path = list(dataset_dir.glob(f"*{split_name}*.{self.file_suffix}"))[0]  # noqa
+        partition_dir = dataset_dir / f"split={split_name}"
+        if partition_dir.is_dir() and self.file_suffix == "parquet":
+            # Hive-partitioned dataset, only the split's partition is read
+            path = partition_dir
+        else:
+            path = list(dataset_dir.glob(f"*{split_name}*.{self.file_suffix}"))[0]  # noqa
 
         if "parquet" in self.file_suffix:
             if nrows:
@@ -1,5 +1,9 @@
+import contextlib
 import copy
+import logging
 import re
+import sqlite3
+import tempfile
 import traceback
 from collections.abc import Sequence
 from pathlib import Path
@@ -9,6 +13,9 @@ import joblib
 import optuna
 from confection import Config
 from optuna import Study, Trial
+from optuna.pruners import BasePruner
+from optuna.storages import RDBStorage, RetryFailedTrialCallback
+from optuna.trial import TrialState
 
 from psycop.common.model_training_v2.config.baseline_registry import BaselineRegistry
 from psycop.common.model_training_v2.config.baseline_schema import BaselineSchema
@@ -19,10 +26,19 @@ from psycop.common.model_training_v2.hyperparameter_suggester.hyperparameter_sug
 from psycop.common.model_training_v2.hyperparameter_suggester.suggesters.base_suggester import (
     Suggester,
 )
+from psycop.common.model_training_v2.trainer.preprocessing.preprocessing_cache import (
+    PreprocessingCache,
+)
 from psycop.common.model_training_v2.trainer.task.base_metric import CalculatedMetric
 
 from ..config.populate_registry import populate_baseline_registry
 
+log = logging.getLogger(__name__)
+
+SQLITE_LOCK_TIMEOUT_SECONDS = 60
+HEARTBEAT_INTERVAL_SECONDS = 60
+HEARTBEAT_GRACE_PERIOD_SECONDS = 180
+
 
 class OptunaHyperParameterOptimization:
     @staticmethod
@@ -72,11 +88,35 @@ class OptunaHyperParameterOptimization:
                     )
         return cfg_copy
 
+    @staticmethod
+    def _create_storage(study_name: str, storage_url: str | None) -> RDBStorage:
+        """Storage which tolerates concurrent workers, and marks trials of crashed workers as failed and retries them.
+
+        By default, the study is stored in ./<study_name>.db. SQLite is put in write-ahead-log mode and waits for
+        locks instead of failing, so workers on the same machine can share it. For many workers, pass the URL of a
+        database server, e.g. PostgreSQL.
+        """
+        storage_url = storage_url or f"sqlite:///./{study_name}.db"
+        engine_kwargs = None
+        if storage_url.startswith("sqlite:///"):
+            with contextlib.closing(sqlite3.connect(storage_url.removeprefix("sqlite:///"))) as con:
+                con.execute("PRAGMA journal_mode=WAL")
+            engine_kwargs = {"connect_args": {"timeout": SQLITE_LOCK_TIMEOUT_SECONDS}}
+
+        return RDBStorage(
+            url=storage_url,
+            engine_kwargs=engine_kwargs,
+            heartbeat_interval=HEARTBEAT_INTERVAL_SECONDS,
+            grace_period=HEARTBEAT_GRACE_PERIOD_SECONDS,
+            failed_trial_callback=RetryFailedTrialCallback(max_retry=1),
+        )
+
     @staticmethod
     def _optuna_objective(
         trial: Trial,
         cfg_with_resolved_suggesters: dict[str, Any],
         custom_populate_registry_fn: None | Callable[[], None],
+        preprocessing_cache_dir: Path | None = None,
     ) -> float:
         concrete_config = suggest_hyperparams_from_cfg(
             base_cfg=cfg_with_resolved_suggesters, trial=trial
@@ -87,13 +127,27 @@ class OptunaHyperParameterOptimization:
             custom_populate_registry_fn()
 
         concrete_config_schema = BaselineSchema(**BaselineRegistry.resolve(concrete_config))
+        if preprocessing_cache_dir is not None:
+            PreprocessingCache(preprocessing_cache_dir).wrap_trainer(
+                concrete_config_schema.trainer, trainer_cfg=concrete_config["trainer"]
+            )
+            concrete_config_schema.trainer.set_logger(concrete_config_schema.logger)
         concrete_config_schema.logger.log_config(Config(concrete_config))
         concrete_config_schema.logger.log_metric(
             CalculatedMetric(name="trial_number", value=trial.number)
         )
 
+        def report_intermediate_value(metric: CalculatedMetric, step: int) -> None:
+            trial.report(metric.value, step=step)
+            if trial.should_prune():
+                raise optuna.TrialPruned(f"Pruned at step {step} with {metric.name}={metric.value}")
+
+        concrete_config_schema.trainer.set_intermediate_value_callback(report_intermediate_value)
+
         try:
             run_result = concrete_config_schema.trainer.train()
+        except optuna.TrialPruned:
+            raise
         except Exception as e:
             if "Input X contains NaN" in str(e):
                 raise optuna.TrialPruned from e
@@ -109,12 +163,18 @@ class OptunaHyperParameterOptimization:
         catch: tuple[type[Exception]],
         cfg_with_resolved_suggesters: dict[str, Any],
         custom_populate_registry_fn: None | Callable[[], None],
+        preprocessing_cache_dir: Path | None = None,
+        storage_url: str | None = None,
+        pruner: BasePruner | None = None,
     ) -> Study:
         study = optuna.create_study(
             direction=direction,
             load_if_exists=True,
             study_name=study_name,
-            storage=f"sqlite:///./{study_name}.db",
+            storage=OptunaHyperParameterOptimization._create_storage(
+                study_name=study_name, storage_url=storage_url
+            ),
+            pruner=pruner,
         )
 
         study.optimize(
@@ -122,12 +182,37 @@ class OptunaHyperParameterOptimization:
                 trial=trial,
                 cfg_with_resolved_suggesters=cfg_with_resolved_suggesters,
                 custom_populate_registry_fn=custom_populate_registry_fn,
+                preprocessing_cache_dir=preprocessing_cache_dir,
             ),
             n_trials=n_trials,
             catch=catch,
         )
         return study
 
+    @staticmethod
+    def _n_finished_trials(study: Study) -> int:
+        """Trials which have finished and will not be retried, as optuna counts them towards n_trials."""
+        trials = study.get_trials(deepcopy=False)
+        retried_trial_numbers = {
+            RetryFailedTrialCallback.retried_trial_number(trial) for trial in trials
+        }
+        return sum(
+            trial.state in (TrialState.COMPLETE, TrialState.PRUNED)
+            or (trial.state == TrialState.FAIL and trial.number not in retried_trial_numbers)
+            for trial in trials
+        )
+
+    @staticmethod
+    def _trials_per_worker(n_trials: int, n_jobs: int) -> list[int]:
+        """Split n_trials over at most n_jobs workers, without dropping the remainder.
+
+        Negative n_jobs count back from the number of CPUs, as in joblib.
+        """
+        if n_jobs < 0:
+            n_jobs = max(joblib.cpu_count() + 1 + n_jobs, 1)
+        n_workers = min(n_jobs, n_trials)
+        return [n_trials // n_workers + (i < n_trials % n_workers) for i in range(n_workers)]
+
     @staticmethod
     def from_cfg(
         cfg: Config,
@@ -137,7 +222,46 @@ class OptunaHyperParameterOptimization:
         direction: Literal["maximize", "minimize"],
         catch: tuple[type[Exception]],
         custom_populate_registry_fn: None | Callable[[], None],
+        cache_preprocessing: bool = True,
+        preprocessing_cache_dir: Path | None = None,
+        storage_url: str | None = None,
+        pruner: BasePruner | None = None,
     ) -> Sequence[Study]:
+        """Run the study until it has n_trials finished trials, in n_jobs worker processes.
+
+        Finished trials of an existing study with the same name count towards n_trials, so an interrupted search is
+        resumed by running it again. Trials of crashed workers are marked as failed and retried.
+
+        Trainers report intermediate values, e.g. the mean out-of-fold metric after each fold, to pruner. By default,
+        trials whose intermediate values are worse than the median of earlier trials are pruned, after 5 trials and
+        from the second fold.
+
+        If cache_preprocessing is set, the preprocessed data is cached, so trials which only change the estimator reuse
+        it. By default, the cache is in a temporary directory which is removed when this call returns. A
+        preprocessing_cache_dir persists between calls, but its entries are keyed by config only, so clear it after
+        changing preprocessing code or the data behind SQL-backed steps.
+        """
+        if cache_preprocessing and preprocessing_cache_dir is None:
+            with tempfile.TemporaryDirectory(
+                prefix=f"{study_name}_preprocessing_cache_"
+            ) as cache_dir:
+                return OptunaHyperParameterOptimization.from_cfg(
+                    cfg=cfg,
+                    n_trials=n_trials,
+                    n_jobs=n_jobs,
+                    study_name=study_name,
+                    direction=direction,
+                    catch=catch,
+                    custom_populate_registry_fn=custom_populate_registry_fn,
+                    cache_preprocessing=cache_preprocessing,
+                    preprocessing_cache_dir=Path(cache_dir),
+                    storage_url=storage_url,
+                    pruner=pruner,
+                )
+
+        if pruner is None:
+            pruner = optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=1)
+
         cfg_with_resolved_suggesters = (
             OptunaHyperParameterOptimization()._resolve_only_registries_matching_regex(
                 cfg=cfg, regex_string="^@.*suggesters$"
@@ -148,23 +272,39 @@ class OptunaHyperParameterOptimization:
         )
 
         # instantiate the study in case it does not already exist
-        study_ = optuna.create_study(  # noqa
+        study = optuna.create_study(
             direction=direction,
             load_if_exists=True,
             study_name=study_name,
-            storage=f"sqlite:///./{study_name}.db",
+            storage=OptunaHyperParameterOptimization._create_storage(
+                study_name=study_name, storage_url=storage_url
+            ),
+            pruner=pruner,
         )
+        n_finished_trials = OptunaHyperParameterOptimization._n_finished_trials(study)
+        n_remaining_trials = n_trials - n_finished_trials
+        if n_remaining_trials <= 0:
+            return [study]
+        if n_finished_trials:
+            log.info(
+                f"Resuming study {study_name} with {n_finished_trials} finished trials, running {n_remaining_trials} more"
+            )
 
-        studies = joblib.Parallel(n_jobs)(
+        studies = joblib.Parallel(n_jobs, backend="loky")(
             joblib.delayed(OptunaHyperParameterOptimization._optimize_study)(
                 direction=direction,
-                n_trials=n_trials // n_jobs,
+                n_trials=worker_n_trials,
                 study_name=study_name,
                 catch=catch,
                 cfg_with_resolved_suggesters=cfg_with_resolved_suggesters,
                 custom_populate_registry_fn=custom_populate_registry_fn,
+                preprocessing_cache_dir=preprocessing_cache_dir if cache_preprocessing else None,
+                storage_url=storage_url,
+                pruner=pruner,
+            )
+            for worker_n_trials in OptunaHyperParameterOptimization._trials_per_worker(
+                n_trials=n_remaining_trials, n_jobs=n_jobs
             )
-            for _ in range(n_jobs)
         )
 
         return studies  # type: ignore
@@ -178,6 +318,10 @@ class OptunaHyperParameterOptimization:
         direction: Literal["maximize", "minimize"],
         catch: tuple[type[Exception]],
         custom_populate_registry_fn: None | Callable[[], None] = None,
+        cache_preprocessing: bool = True,
+        preprocessing_cache_dir: Path | None = None,
+        storage_url: str | None = None,
+        pruner: BasePruner | None = None,
     ) -> Sequence[Study]:
         cfg = Config().from_disk(cfg_file)
         studies = OptunaHyperParameterOptimization.from_cfg(
@@ -188,5 +332,9 @@ class OptunaHyperParameterOptimization:
             catch=catch,
             cfg=cfg,
             custom_populate_registry_fn=custom_populate_registry_fn,
+            cache_preprocessing=cache_preprocessing,
+            preprocessing_cache_dir=preprocessing_cache_dir,
+            storage_url=storage_url,
+            pruner=pruner,
         )
         return studies
@@ -1,5 +1,7 @@
+import tempfile
 import uuid
 from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
 from typing import Any
 
@@ -85,14 +87,47 @@ def test_resolve_only_suggesters():
     assert isinstance(resolved_suggesters["age_filter"], dict)
 
 
-def test_hyperparameter_optimization_from_file():
+def test_hyperparameter_optimization_from_file(tmp_path: Path):
     populate_baseline_registry()
+    study_name = str(uuid.uuid4())
     study = OptunaHyperParameterOptimization().from_file(
         (Path(__file__).parent / "test_optuna_hyperparameter_search.cfg"),
         n_trials=2,
         n_jobs=1,
         direction="maximize",
-        study_name=str(uuid.uuid4()),
+        study_name=study_name,
         catch=(Exception,),
+        storage_url=f"sqlite:///{tmp_path / f'{study_name}.db'}",
     )
     assert len(study[0].trials) == 2
+    # The default preprocessing cache only lives for the duration of the search
+    assert not list(Path(tempfile.gettempdir()).glob(f"{study_name}_preprocessing_cache_*"))
+
+
+@pytest.mark.parametrize(
+    ("n_trials", "n_jobs", "expected"), [(5, 2, [3, 2]), (4, 2, [2, 2]), (1, 4, [1])]
+)
+def test_trials_per_worker_keeps_remainder(n_trials: int, n_jobs: int, expected: list[int]):
+    assert (
+        OptunaHyperParameterOptimization._trials_per_worker(n_trials=n_trials, n_jobs=n_jobs)  # pyright: ignore[reportPrivateUsage]
+        == expected
+    )
+
+
+def test_hyperparameter_optimization_resumes_existing_study(tmp_path: Path):
+    populate_baseline_registry()
+    search = partial(
+        OptunaHyperParameterOptimization().from_file,
+        Path(__file__).parent / "test_optuna_hyperparameter_search.cfg",
+        n_jobs=1,
+        direction="maximize",
+        study_name="resumed_study",
+        catch=(Exception,),
+        preprocessing_cache_dir=tmp_path / "preprocessing_cache",
+        storage_url=f"sqlite:///{tmp_path / 'resumed_study.db'}",
+    )
+
+    search(n_trials=2)
+    studies = search(n_trials=3)
+
+    assert len(studies[0].trials) == 3
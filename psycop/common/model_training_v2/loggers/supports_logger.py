@@ -24,3 +24,10 @@ class SupportsLoggerMixin:
             attr = getattr(self, attr_name)
             if isinstance(attr, SupportsLoggerMixin):
                 attr.set_logger(self.logger)
+
+    def __getstate__(self) -> dict[str, object]:
+        """Loggers can hold open runs and file handles, so copies and pickles, e.g. for worker processes, do not get one."""
+        state = self.__dict__.copy()
+        if "_logger" in state:
+            state["_logger"] = None
+        return state
@@ -1,5 +1,6 @@
 from pathlib import Path
 
+import pytest
 from sklearn.pipeline import Pipeline
 
 from psycop.common.model_training_v2.config.baseline_pipeline import (
@@ -8,8 +9,10 @@ from psycop.common.model_training_v2.config.baseline_pipeline import (
 from psycop.common.model_training_v2.config.baseline_schema import BaselineSchema
 from psycop.common.model_training_v2.config.config_utils import load_baseline_config
 from psycop.common.model_training_v2.loggers.terminal_logger import TerminalLogger
+from psycop.common.model_training_v2.trainer.base_trainer import TrainingResult
 from psycop.common.model_training_v2.trainer.cross_validator_trainer import CrossValidatorTrainer
 from psycop.common.model_training_v2.trainer.data.test_dataloaders import MinimalTestData
+from psycop.common.model_training_v2.trainer.fold_executor import FoldBackend
 from psycop.common.model_training_v2.trainer.preprocessing.pipeline import (
     BaselinePreprocessingPipeline,
 )
@@ -92,6 +95,36 @@ def test_v2_crossval_model_pipeline(tmp_path: Path):
     assert len(list(tmp_path.glob("*.pkl"))) == 1  # Check that pipeline is being logged
 
 
+@pytest.mark.parametrize("fold_backend", ["threading", "loky"])
+def test_v2_crossval_parallel_folds_match_sequential(fold_backend: FoldBackend):
+    def train(fold_backend: FoldBackend) -> TrainingResult:
+        trainer = CrossValidatorTrainer(
+            uuid_col_name="pred_time_uuid",
+            training_data=MinimalTestData(n=20),
+            outcome_col_name="outcome",
+            preprocessing_pipeline=BaselinePreprocessingPipeline(
+                AgeFilter(min_age=0, max_age=99, age_col_name="pred_age")
+            ),
+            task=BinaryClassificationTask(
+                task_pipe=BinaryClassificationPipeline(
+                    sklearn_pipe=Pipeline([logistic_regression_step()])
+                )
+            ),
+            metric=BinaryAUROC(),
+            n_splits=2,
+            fold_backend=fold_backend,
+            n_fold_jobs=2,
+        )
+        trainer.set_logger(TerminalLogger())
+        return trainer.train()
+
+    parallel = train(fold_backend)
+    sequential = train("sequential")
+
+    assert parallel.metric == sequential.metric
+    assert parallel.df.equals(sequential.df)
+
+
 def test_v2_calibrated_crossval_model_pipeline(tmp_path: Path):
     schema = BaselineSchema(
         logger=MultiLogger(TerminalLogger(), DiskLogger(tmp_path.__str__())),
@@ -138,3 +171,28 @@ def test_v2_additional_metrics_pipeline(tmp_path: Path):
     )
 
     assert train_baseline_model_from_schema(schema) == 1.0
+
+
+def test_v2_crossval_reports_intermediate_values_after_each_fold():
+    trainer = CrossValidatorTrainer(
+        uuid_col_name="pred_time_uuid",
+        training_data=MinimalTestData(n=20),
+        outcome_col_name="outcome",
+        preprocessing_pipeline=BaselinePreprocessingPipeline(
+            AgeFilter(min_age=0, max_age=99, age_col_name="pred_age")
+        ),
+        task=BinaryClassificationTask(
+            task_pipe=BinaryClassificationPipeline(
+                sklearn_pipe=Pipeline([logistic_regression_step()])
+            )
+        ),
+        metric=BinaryAUROC(),
+        n_splits=2,
+    )
+    trainer.set_logger(TerminalLogger())
+    steps: list[int] = []
+    trainer.set_intermediate_value_callback(lambda _, step: steps.append(step))
+
+    trainer.train()
+
+    assert steps == [0, 1]
@@ -2,6 +2,7 @@
 import pickle
 import tempfile
 from abc import ABC, abstractmethod
+from collections.abc import Callable
 from dataclasses import dataclass
 from pathlib import Path
 
@@ -35,3 +36,17 @@ class BaselineTrainer(ABC, SupportsLoggerMixin):
 
     def _log_main_metric(self, main_metric: CalculatedMetric) -> None:
         self.logger.log_metric(main_metric)
+
+    def set_intermediate_value_callback(
+        self, callback: Callable[[CalculatedMetric, int], None] | None
+    ) -> None:
+        """Set a callback which receives intermediate values of the main metric, e.g. after each fold.
+
+        The callback can raise to stop training, e.g. optuna.TrialPruned.
+        """
+        self._intermediate_value_callback = callback
+
+    def _report_intermediate_value(self, metric: CalculatedMetric, step: int) -> None:
+        callback = getattr(self, "_intermediate_value_callback", None)
+        if callback is not None:
+            callback(metric, step)
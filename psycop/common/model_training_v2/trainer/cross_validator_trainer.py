@@ -1,6 +1,7 @@
 from dataclasses import dataclass
 from typing import Any
 
+import numpy as np
 import pandas as pd
 import polars as pl
 from numpy import ndarray
@@ -10,17 +11,23 @@ from psycop.common.global_utils.cache import shared_cache
 from psycop.common.model_training_v2.config.baseline_registry import BaselineRegistry
 from psycop.common.model_training_v2.trainer.base_dataloader import BaselineDataLoader
 from psycop.common.model_training_v2.trainer.base_trainer import BaselineTrainer, TrainingResult
+from psycop.common.model_training_v2.trainer.feature_matrix import FeatureMatrix
+from psycop.common.model_training_v2.trainer.fold_executor import (
+    FoldBackend,
+    FoldResult,
+    train_folds,
+)
 from psycop.common.model_training_v2.trainer.preprocessing.pipeline import PreprocessingPipeline
-from psycop.common.model_training_v2.trainer.task.base_metric import BaselineMetric
+from psycop.common.model_training_v2.trainer.task.base_metric import (
+    BaselineMetric,
+    CalculatedMetric,
+)
 from psycop.common.model_training_v2.trainer.task.base_task import BaselineTask
 
 
 @shared_cache().cache()
 def cached_folds(
-    n_splits: int,
-    X: pd.DataFrame,
-    y: pd.DataFrame,
-    groups: pd.Series,  # type: ignore
+    n_splits: int, X: ndarray[Any, Any], y: ndarray[Any, Any], groups: ndarray[Any, Any]
 ) -> list[tuple[ndarray[Any, Any], ndarray[Any, Any]]]:
     return list(StratifiedGroupKFold(n_splits=n_splits).split(X=X, y=y, groups=groups))
 
@@ -37,71 +44,91 @@ class CrossValidatorTrainer(BaselineTrainer):
     additional_metrics: BaselineMetric | None = None
     n_splits: int = 5
     group_col_name: str = "dw_ek_borger"
+    fold_backend: FoldBackend = "sequential"
+    """The joblib backend to train the folds with. "loky" trains them in separate processes."""
+    n_fold_jobs: int = -1
+    """The number of folds to train at the same time. -1 uses all CPUs."""
 
     def train(self) -> TrainingResult:
-        training_data_preprocessed = self.preprocessing_pipeline.apply(
+        training_data_preprocessed = self.preprocessing_pipeline.apply_polars(
             data=self.training_data.load()
         )
-
-        X = training_data_preprocessed.drop([self.outcome_col_name, self.uuid_col_name], axis=1)
-
-        y = pd.DataFrame(
-            training_data_preprocessed[self.outcome_col_name], columns=[self.outcome_col_name]
+        non_predictor_columns = {self.outcome_col_name, self.uuid_col_name, self.group_col_name}
+        X = FeatureMatrix.from_frame(
+            training_data_preprocessed,
+            columns=[
+                col
+                for col in training_data_preprocessed.columns
+                if col not in non_predictor_columns
+            ],
         )
-        self.logger.info(f"\tOutcome: {list(y.columns)}")
-
-        folds = cached_folds(
-            n_splits=self.n_splits, X=X, y=y, groups=training_data_preprocessed[self.group_col_name]
+        y = training_data_preprocessed[self.outcome_col_name].to_numpy(writable=True)
+        self.logger.info(f"\tOutcome: {[self.outcome_col_name]}")
+
+        groups = training_data_preprocessed[self.group_col_name].to_numpy()
+        folds = cached_folds(n_splits=self.n_splits, X=X.values, y=y, groups=groups)
+
+        fold_results = train_folds(
+            folds=folds,
+            task=self.task,
+            metric=self.metric,
+            X=X,
+            y=y,
+            outcome_col_name=self.outcome_col_name,
+            backend=self.fold_backend,
+            n_jobs=self.n_fold_jobs,
+            groups=groups,
         )
 
-        for i, (train_idxs, val_idxs) in enumerate(folds):
-            X_train, y_train = (X.loc[train_idxs], y.loc[train_idxs])
-
-            X_train = X_train.drop(columns=self.group_col_name)
-            self.task.train(X_train, y_train, y_col_name=self.outcome_col_name)
-
-            y_hat_prob = self.task.predict_proba(X_train)
-
-            within_fold_metric = self.metric.calculate(
-                y=y_train[self.outcome_col_name],
-                y_hat_prob=y_hat_prob,
-                name_prefix=f"within_fold_{i}",
-            )
-            self.logger.log_metric(within_fold_metric)
-
-            oof_y_hat_prob = self.task.predict_proba(
-                X.loc[val_idxs].drop(columns=self.group_col_name)
+        oof_y_hat_prob = np.full(len(X), np.nan)
+        trained_folds: list[FoldResult] = []
+        for fold_result, (_, val_idxs) in zip(fold_results, folds):
+            self.logger.log_metric(fold_result.within_fold_metric)
+            self.logger.log_metric(fold_result.oof_metric)
+            oof_y_hat_prob[val_idxs] = fold_result.oof_y_hat_prob
+            trained_folds.append(fold_result)
+
+            # Estimators with early stopping record their best iteration, which can be reused when refitting
+            best_iteration = getattr(
+                fold_result.task.task_pipe.sklearn_pipe[-1], "best_iteration_", None
             )
-
-            oof_metric = self.metric.calculate(
-                y=y.loc[val_idxs][self.outcome_col_name],
-                y_hat_prob=oof_y_hat_prob,
-                name_prefix=f"out_of_fold_{i}",
+            if best_iteration is not None:
+                self.logger.log_metric(
+                    CalculatedMetric(
+                        name=f"best_iteration_fold_{len(trained_folds) - 1}", value=best_iteration
+                    )
+                )
+
+            self._report_intermediate_value(
+                CalculatedMetric(
+                    name="mean_out_of_fold",
+                    value=float(np.mean([fold.oof_metric.value for fold in trained_folds])),
+                ),
+                step=len(trained_folds) - 1,
             )
-            self.logger.log_metric(oof_metric)
 
-            training_data_preprocessed.loc[val_idxs, "oof_y_hat_prob"] = oof_y_hat_prob.to_list()  # type: ignore
+        # As when training the folds one after another, the task is the one trained on the last fold
+        self.task = trained_folds[-1].task
+        self.task.set_logger(self.logger)
 
+        y_series = pd.Series(y, name=self.outcome_col_name)
+        oof_y_hat_prob_series = pd.Series(oof_y_hat_prob, name="y_hat_prob")
         main_metric = self.metric.calculate(
-            y=training_data_preprocessed[self.outcome_col_name],
-            y_hat_prob=training_data_preprocessed["oof_y_hat_prob"],
-            name_prefix="all_oof",
+            y=y_series, y_hat_prob=oof_y_hat_prob_series, name_prefix="all_oof"
         )
         self._log_main_metric(main_metric)
         self._log_sklearn_pipe()
 
         if self.additional_metrics:
             additional_metric = self.additional_metrics.calculate(
-                y=training_data_preprocessed[self.outcome_col_name],
-                y_hat_prob=training_data_preprocessed["oof_y_hat_prob"],
-                name_prefix="all_oof",
+                y=y_series, y_hat_prob=oof_y_hat_prob_series, name_prefix="all_oof"
             )
             self.logger.log_metric(additional_metric)
 
         eval_df = pl.DataFrame(
             {
-                "y": training_data_preprocessed[self.outcome_col_name],
-                "y_hat_prob": training_data_preprocessed["oof_y_hat_prob"],
+                "y": y,
+                "y_hat_prob": oof_y_hat_prob,
                 "pred_time_uuid": training_data_preprocessed[self.uuid_col_name],
             }
         )
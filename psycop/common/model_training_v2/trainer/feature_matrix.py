@@ -0,0 +1,43 @@
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import polars as pl
+
+
+@dataclass(frozen=True)
+class FeatureMatrix:
+    """The predictors as a single C-contiguous float32 array, with the column names kept alongside.
+
+    Rows are taken with index arrays, which copies only the selected rows once. Frames for the task wrap the array
+    without copying it.
+    """
+
+    values: np.ndarray[Any, np.dtype[np.float32]]
+    columns: list[str]
+    column_index: dict[str, int] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        if self.values.ndim != 2 or self.values.shape[1] != len(self.columns):
+            raise ValueError(
+                f"values has shape {self.values.shape}, which does not match {len(self.columns)} columns"
+            )
+        object.__setattr__(self, "column_index", {col: i for i, col in enumerate(self.columns)})
+
+    @classmethod
+    def from_frame(
+        cls: type["FeatureMatrix"], df: pl.DataFrame, columns: Sequence[str]
+    ) -> "FeatureMatrix":
+        """Cast columns to float32 in polars, so the only NumPy copy is already float32. Nulls become NaN."""
+        values = df.select(pl.col(columns).cast(pl.Float32)).to_numpy(order="c")
+        return cls(values=np.ascontiguousarray(values, dtype=np.float32), columns=list(columns))
+
+    def __len__(self) -> int:
+        return self.values.shape[0]
+
+    def to_pandas(self, rows: np.ndarray[Any, Any] | None = None) -> pd.DataFrame:
+        """A frame of all rows, or of the rows at the given positions, which wraps the array without copying it."""
+        values = self.values if rows is None else self.values.take(rows, axis=0)
+        return pd.DataFrame(values, columns=self.columns, copy=False)
@@ -0,0 +1,123 @@
+"""Train cross-validation folds in parallel.
+
+The features are passed to the workers as a FeatureMatrix. With the loky backend, joblib memory-maps arrays larger
+than max_nbytes instead of pickling them, so each worker process reads the same copy of the data. Each fold trains its
+own copy of the task, and the results are returned in fold order, so the output does not depend on the backend.
+"""
+
+import copy
+from collections.abc import Iterator
+from dataclasses import dataclass
+from typing import Any, Literal
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+from psycop.common.model_training_v2.trainer.feature_matrix import FeatureMatrix
+from psycop.common.model_training_v2.trainer.task.base_metric import (
+    BaselineMetric,
+    CalculatedMetric,
+)
+from psycop.common.model_training_v2.trainer.task.base_task import BaselineTask
+
+FoldBackend = Literal["sequential", "threading", "loky"]
+
+
+@dataclass(frozen=True)
+class FoldResult:
+    task: BaselineTask
+    """The task trained on the fold's training data. Loggers are not sent to workers, so it has no logger."""
+    within_fold_metric: CalculatedMetric
+    oof_metric: CalculatedMetric
+    oof_y_hat_prob: np.ndarray[Any, Any]
+
+
+def train_fold(
+    fold: int,
+    task: BaselineTask,
+    metric: BaselineMetric,
+    X: FeatureMatrix,
+    y: np.ndarray[Any, Any],
+    outcome_col_name: str,
+    train_idxs: np.ndarray[Any, Any],
+    val_idxs: np.ndarray[Any, Any],
+    groups: np.ndarray[Any, Any] | None = None,
+) -> FoldResult:
+    task = copy.deepcopy(task)
+
+    X_train = X.to_pandas(rows=train_idxs)
+    y_train = pd.DataFrame({outcome_col_name: y[train_idxs]})
+    task.train(
+        X_train,
+        y_train,
+        y_col_name=outcome_col_name,
+        groups=groups[train_idxs] if groups is not None else None,
+    )
+
+    within_fold_metric = metric.calculate(
+        y=y_train[outcome_col_name],
+        y_hat_prob=task.predict_proba(X_train),
+        name_prefix=f"within_fold_{fold}",
+    )
+    del X_train
+
+    oof_y_hat_prob = task.predict_proba(X.to_pandas(rows=val_idxs))
+    oof_metric = metric.calculate(
+        y=pd.Series(y[val_idxs], name=outcome_col_name),
+        y_hat_prob=oof_y_hat_prob,
+        name_prefix=f"out_of_fold_{fold}",
+    )
+
+    return FoldResult(
+        task=task,
+        within_fold_metric=within_fold_metric,
+        oof_metric=oof_metric,
+        oof_y_hat_prob=oof_y_hat_prob.to_numpy(),
+    )
+
+
+def train_folds(
+    folds: list[tuple[np.ndarray[Any, Any], np.ndarray[Any, Any]]],
+    task: BaselineTask,
+    metric: BaselineMetric,
+    X: FeatureMatrix,
+    y: np.ndarray[Any, Any],
+    outcome_col_name: str,
+    backend: FoldBackend = "sequential",
+    n_jobs: int = -1,
+    max_nbytes: str | int | None = "1M",
+    groups: np.ndarray[Any, Any] | None = None,
+) -> Iterator[FoldResult]:
+    """Train task on each fold, and yield the results in fold order as they finish.
+
+    Folds which have not started when the iterator is closed, e.g. because the trial was pruned, are not trained.
+
+    Args:
+        folds: (train_idxs, val_idxs) positions for each fold.
+        task: The task to train. Each fold trains a copy, so task itself is not trained.
+        metric: Calculated within and out of each fold.
+        X: The features.
+        y: The outcome.
+        outcome_col_name: The name of the outcome, passed to the task.
+        backend: The joblib backend to train the folds with.
+        n_jobs: The number of folds to train at the same time. -1 uses all CPUs.
+        max_nbytes: Arrays larger than this are memory-mapped for the loky backend. None disables memory-mapping.
+        groups: The group of each row, passed to the task with the fold's training rows.
+    """
+    return Parallel(
+        n_jobs=n_jobs, backend=backend, return_as="generator", max_nbytes=max_nbytes, mmap_mode="r"
+    )(
+        delayed(train_fold)(
+            fold=i,
+            task=task,
+            metric=metric,
+            X=X,
+            y=y,
+            outcome_col_name=outcome_col_name,
+            train_idxs=train_idxs,
+            val_idxs=val_idxs,
+            groups=groups,
+        )
+        for i, (train_idxs, val_idxs) in enumerate(folds)
+    )  # type: ignore
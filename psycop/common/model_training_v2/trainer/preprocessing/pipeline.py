@@ -17,6 +17,10 @@ class PreprocessingPipeline(ABC, SupportsLoggerMixin):
     @abstractmethod
     def apply(self, data: pl.LazyFrame) -> pd.DataFrame: ...
 
+    def apply_polars(self, data: pl.LazyFrame) -> pl.DataFrame:
+        """Like apply, but returns a polars frame. Override to avoid converting to pandas and back."""
+        return pl.from_pandas(self.apply(data))
+
 
 @BaselineRegistry.preprocessing.register("baseline_preprocessing_pipeline")
 class BaselinePreprocessingPipeline(PreprocessingPipeline):
@@ -28,7 +32,7 @@ class BaselinePreprocessingPipeline(PreprocessingPipeline):
     Columns: {pretty.pretty_repr(sorted(data.columns), max_width=100)}
     n_cols: {len(data.columns)}"""
 
-    def apply(self, data: pl.LazyFrame) -> pd.DataFrame:
+    def apply_polars(self, data: pl.LazyFrame) -> pl.DataFrame:
         self.logger.info(
             f"Column stats before preprocessing: {self._get_column_stats_string(data)}"
         )
@@ -38,7 +42,10 @@ class BaselinePreprocessingPipeline(PreprocessingPipeline):
 
         self.logger.info(f"Column stats after preprocessing: {self._get_column_stats_string(data)}")
 
-        preprocessed_data = data.collect().to_pandas()
+        preprocessed_data = data.collect()
         self.logger.info(f"Number of rows after preprocessing: {len(preprocessed_data)}")
 
         return preprocessed_data
+
+    def apply(self, data: pl.LazyFrame) -> pd.DataFrame:
+        return self.apply_polars(data).to_pandas()
@@ -0,0 +1,135 @@
+"""Cache preprocessed data on disk, so trials which only change the estimator skip preprocessing.
+
+Entries are keyed by the resolved config of the data loader and of the preprocessing pipeline, plus the size and
+modification time of any files the data loader config refers to. They are stored as Arrow IPC files, which are
+memory-mapped when read, and written atomically, so worker processes can share a cache directory.
+
+The data loader's key follows the lazy frame it returns to the preprocessing pipeline, so a pipeline which is applied
+to several data loaders, like in SplitTrainer, gets a separate entry for each of them.
+"""
+
+import hashlib
+import json
+import os
+import uuid
+import weakref
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+import polars as pl
+
+from ..base_dataloader import BaselineDataLoader
+from ..base_trainer import BaselineTrainer
+from .pipeline import PreprocessingPipeline
+from .step import PresplitStep
+
+CACHE_VERSION = 1
+
+
+def _file_stats(cfg: Any) -> list[tuple[str, int, int]]:
+    """Size and modification time of all existing files referred to in cfg, so rewritten files change the key."""
+    if isinstance(cfg, dict):
+        return [stat for value in cfg.values() for stat in _file_stats(value)]
+    if isinstance(cfg, (list, tuple)):
+        return [stat for value in cfg for stat in _file_stats(value)]
+    if isinstance(cfg, (str, Path)) and Path(cfg).is_file():
+        stat = Path(cfg).stat()
+        return [(str(cfg), stat.st_size, stat.st_mtime_ns)]
+    return []
+
+
+def _hash_cfg(cfg: Any) -> str:
+    return hashlib.sha256(json.dumps(cfg, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class CachedDataLoader(BaselineDataLoader):
+    def __init__(self, data_loader: BaselineDataLoader, key: str, cache: "PreprocessingCache"):
+        self.data_loader = data_loader
+        self.key = key
+        self.cache = cache
+
+    def load(self) -> pl.LazyFrame:
+        data = self.data_loader.load()
+        self.cache.register_data(data, key=self.key)
+        return data
+
+
+class CachedPreprocessingPipeline(PreprocessingPipeline):
+    def __init__(self, pipeline: PreprocessingPipeline, key: str, cache: "PreprocessingCache"):
+        self.pipeline = pipeline
+        self.key = key
+        self.cache = cache
+
+    @property
+    def steps(self) -> Sequence[PresplitStep]:  # type: ignore
+        return self.pipeline.steps
+
+    def apply_polars(self, data: pl.LazyFrame) -> pl.DataFrame:
+        data_key = self.cache.data_key(data)
+        if data_key is None:
+            return self.pipeline.apply_polars(data)
+
+        path = self.cache.path(data_key=data_key, pipeline_key=self.key)
+        if path.exists():
+            self.logger.info(f"Using cached preprocessed data from {path}")
+            return pl.read_ipc(path, memory_map=True)
+
+        preprocessed_data = self.pipeline.apply_polars(data)
+        self.cache.write(preprocessed_data, path=path)
+        return preprocessed_data
+
+    def apply(self, data: pl.LazyFrame) -> pd.DataFrame:
+        return self.apply_polars(data).to_pandas()
+
+
+class PreprocessingCache:
+    """Content-addressed cache of preprocessed data in cache_dir.
+
+    Example:
+        >>> schema = BaselineSchema(**BaselineRegistry.resolve(cfg))
+        >>> PreprocessingCache(cache_dir).wrap_trainer(schema.trainer, trainer_cfg=cfg["trainer"])
+        >>> schema.trainer.set_logger(schema.logger)
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = cache_dir
+        self._data_keys: dict[int, str] = {}
+
+    def register_data(self, data: pl.LazyFrame, key: str) -> None:
+        """Remember which data loader data came from, for as long as data exists."""
+        self._data_keys[id(data)] = key
+        weakref.finalize(data, self._data_keys.pop, id(data), None)
+
+    def data_key(self, data: pl.LazyFrame) -> str | None:
+        return self._data_keys.get(id(data))
+
+    def path(self, data_key: str, pipeline_key: str) -> Path:
+        return self.cache_dir / f"{_hash_cfg([CACHE_VERSION, data_key, pipeline_key])}.arrow"
+
+    def write(self, df: pl.DataFrame, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}-{uuid.uuid4().hex[:8]}.tmp")
+        df.write_ipc(tmp_path)
+        tmp_path.replace(path)
+
+    def wrap_trainer(self, trainer: BaselineTrainer, trainer_cfg: dict[str, Any]) -> None:
+        """Replace the data loaders and preprocessing pipelines of trainer with cached versions, keyed by their config."""
+        for attr_name, attr in list(vars(trainer).items()):
+            attr_cfg = trainer_cfg.get(attr_name)
+            if attr_cfg is None:
+                continue
+            if isinstance(attr, BaselineDataLoader):
+                key = _hash_cfg([attr_cfg, _file_stats(attr_cfg)])
+                setattr(trainer, attr_name, CachedDataLoader(attr, key=key, cache=self))
+            elif isinstance(attr, PreprocessingPipeline):
+                setattr(
+                    trainer,
+                    attr_name,
+                    CachedPreprocessingPipeline(attr, key=_hash_cfg(attr_cfg), cache=self),
+                )
+
+    def clear(self) -> None:
+        for path in self.cache_dir.glob("*.arrow"):
+            path.unlink()
@@ -0,0 +1,91 @@
+from pathlib import Path
+from typing import Any
+
+import polars as pl
+from confection import Config
+
+from psycop.common.model_training_v2.config.baseline_registry import BaselineRegistry
+from psycop.common.model_training_v2.config.baseline_schema import BaselineSchema
+from psycop.common.model_training_v2.config.populate_registry import populate_baseline_registry
+from psycop.common.model_training_v2.trainer.base_trainer import TrainingResult
+from psycop.common.model_training_v2.trainer.preprocessing.preprocessing_cache import (
+    PreprocessingCache,
+)
+from psycop.common.model_training_v2.trainer.preprocessing.step import PresplitStep
+
+
+class CountingStep(PresplitStep):
+    n_applied = 0
+
+    def apply(self, input_df: pl.LazyFrame) -> pl.LazyFrame:
+        CountingStep.n_applied += 1
+        return input_df
+
+
+def _train(cfg: dict[str, Any], cache_dir: Path) -> TrainingResult:
+    schema = BaselineSchema(**BaselineRegistry.resolve(Config(cfg)))
+    schema.trainer.preprocessing_pipeline.steps.append(CountingStep())  # type: ignore
+    PreprocessingCache(cache_dir).wrap_trainer(schema.trainer, trainer_cfg=cfg["trainer"])
+    schema.trainer.set_logger(schema.logger)
+    return schema.trainer.train()
+
+
+def _cfg(n_rows: int, c: float) -> dict[str, Any]:
+    return {
+        "logger": {"@loggers": "terminal_logger"},
+        "trainer": {
+            "@trainers": "crossval_trainer",
+            "uuid_col_name": "pred_time_uuid",
+            "outcome_col_name": "outcome",
+            "n_splits": 2,
+            "metric": {"@metrics": "binary_auroc"},
+            "training_data": {"@data": "minimal_test_data", "n": n_rows},
+            "preprocessing_pipeline": {
+                "@preprocessing": "baseline_preprocessing_pipeline",
+                "*": {
+                    "age_filter": {
+                        "@preprocessing": "age_filter",
+                        "min_age": 0,
+                        "max_age": 99,
+                        "age_col_name": "pred_age",
+                    }
+                },
+            },
+            "task": {
+                "@tasks": "binary_classification",
+                "task_pipe": {
+                    "@task_pipelines": "binary_classification_pipeline",
+                    "sklearn_pipe": {
+                        "@task_pipelines": "pipe_constructor",
+                        "*": {
+                            "logistic_regression": {
+                                "@estimator_steps": "logistic_regression",
+                                "C": c,
+                            }
+                        },
+                    },
+                },
+            },
+        },
+    }
+
+
+def test_preprocessing_cache_is_reused_when_only_the_estimator_changes(tmp_path: Path):
+    populate_baseline_registry()
+    CountingStep.n_applied = 0
+
+    uncached = _train(_cfg(n_rows=20, c=1.0), cache_dir=tmp_path)
+    assert CountingStep.n_applied == 1
+    assert len(list(tmp_path.glob("*.arrow"))) == 1
+
+    cached = _train(_cfg(n_rows=20, c=1.0), cache_dir=tmp_path)
+    assert CountingStep.n_applied == 1
+    assert cached.df.equals(uncached.df)
+
+    _train(_cfg(n_rows=20, c=0.5), cache_dir=tmp_path)
+    assert CountingStep.n_applied == 1
+
+    # Changing the data loader config is a new entry
+    _train(_cfg(n_rows=30, c=1.0), cache_dir=tmp_path)
+    assert CountingStep.n_applied == 2
+    assert len(list(tmp_path.glob("*.arrow"))) == 2
@@ -7,6 +7,7 @@ import polars as pl
 from psycop.common.model_training_v2.config.baseline_registry import BaselineRegistry
 from psycop.common.model_training_v2.trainer.base_dataloader import BaselineDataLoader
 from psycop.common.model_training_v2.trainer.base_trainer import BaselineTrainer, TrainingResult
+from psycop.common.model_training_v2.trainer.feature_matrix import FeatureMatrix
 from psycop.common.model_training_v2.trainer.preprocessing.pipeline import PreprocessingPipeline
 from psycop.common.model_training_v2.trainer.task.base_metric import BaselineMetric
 from psycop.common.model_training_v2.trainer.task.base_task import BaselineTask
@@ -35,41 +36,51 @@ class SplitTrainerSeparatePreprocessing(BaselineTrainer):
     def non_predictor_columns(self) -> Sequence[str]:
         return [self.uuid_col_name, self.group_col_name, *self.outcome_columns]
 
+    def _predictors(self, df: pl.DataFrame) -> FeatureMatrix:
+        return FeatureMatrix.from_frame(
+            df, columns=[col for col in df.columns if col not in self.non_predictor_columns]
+        )
+
+    @staticmethod
+    def _outcome(df: pl.DataFrame, outcome_col_name: str) -> pd.Series:  # type: ignore
+        return pd.Series(df[outcome_col_name].to_numpy(writable=True), name=outcome_col_name)
+
     def train(self) -> TrainingResult:
-        training_data_preprocessed = self.training_preprocessing_pipeline.apply(
+        training_data_preprocessed = self.training_preprocessing_pipeline.apply_polars(
             data=self.training_data.load()
         )
-        validation_data_preprocessed = self.validation_preprocessing_pipeline.apply(
+        validation_data_preprocessed = self.validation_preprocessing_pipeline.apply_polars(
             data=self.validation_data.load()
         )
 
-        x = training_data_preprocessed.drop(self.non_predictor_columns, axis=1)
+        x = self._predictors(training_data_preprocessed)
         self.logger.info(f"The model sees these predictors:\n\t{x.columns}")
 
-        training_y = training_data_preprocessed[self.training_outcome_col_name]
+        training_y = self._outcome(training_data_preprocessed, self.training_outcome_col_name)
         self.logger.info(f"\tOutcome: {self.training_outcome_col_name}")
 
-        self.task.train(x=x, y=pd.DataFrame(training_y), y_col_name=self.training_outcome_col_name)
+        self.task.train(
+            x=x.to_pandas(), y=pd.DataFrame(training_y), y_col_name=self.training_outcome_col_name
+        )
+        del x
 
         y_hat_prob = self.task.predict_proba(
-            x=validation_data_preprocessed.drop(self.non_predictor_columns, axis=1)
-        )
-        main_metric = self.metric.calculate(
-            y=validation_data_preprocessed[self.validation_outcome_col_name], y_hat_prob=y_hat_prob
+            x=self._predictors(validation_data_preprocessed).to_pandas()
         )
+        validation_y = self._outcome(validation_data_preprocessed, self.validation_outcome_col_name)
+        main_metric = self.metric.calculate(y=validation_y, y_hat_prob=y_hat_prob)
         self._log_main_metric(main_metric)
         self._log_sklearn_pipe()
 
         if self.additional_metrics:
             additional_metric = self.additional_metrics.calculate(
-                y=validation_data_preprocessed[self.validation_outcome_col_name],
-                y_hat_prob=y_hat_prob,
+                y=validation_y, y_hat_prob=y_hat_prob
             )
             self.logger.log_metric(additional_metric)
 
         eval_df = pl.DataFrame(
             {
-                "y": validation_data_preprocessed[self.validation_outcome_col_name],
+                "y": validation_y,
                 "y_hat_prob": y_hat_prob,
                 "pred_time_uuid": validation_data_preprocessed[self.uuid_col_name],
             }
@@ -1,11 +1,12 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
 from ...loggers.supports_logger import SupportsLoggerMixin
 
 if TYPE_CHECKING:
+    import numpy as np
     import pandas as pd
 
     from .base_pipeline import BasePipeline
@@ -15,8 +16,14 @@ class BaselineTask(ABC, SupportsLoggerMixin):
     task_pipe: BasePipeline
 
     @abstractmethod
-    def train(self, x: pd.DataFrame, y: pd.DataFrame, y_col_name: str) -> None:
-        """Train the model"""
+    def train(
+        self,
+        x: pd.DataFrame,
+        y: pd.DataFrame,
+        y_col_name: str,
+        groups: np.ndarray[Any, Any] | None = None,
+    ) -> None:
+        """Train the model. groups, e.g. patient ids, let the model split its training data by group."""
         ...
 
     @abstractmethod
@@ -1,5 +1,8 @@
+import inspect
 from dataclasses import dataclass
+from typing import Any
 
+import numpy as np
 import pandas as pd
 from sklearn.pipeline import Pipeline
 
@@ -14,8 +17,15 @@ from ..base_pipeline import BasePipeline
 class BinaryClassificationPipeline(BasePipeline):
     sklearn_pipe: Pipeline
 
-    def fit(self, x: pd.DataFrame, y: pd.Series) -> None:  # type: ignore
-        self.sklearn_pipe.fit(X=x, y=y)
+    def fit(  # type: ignore
+        self, x: pd.DataFrame, y: pd.Series, groups: np.ndarray[Any, Any] | None = None
+    ) -> None:
+        """Fit the pipeline. groups are passed to the final estimator if its fit accepts them, and ignored otherwise."""
+        fit_params = {}
+        estimator_name, estimator = self.sklearn_pipe.steps[-1]
+        if groups is not None and "groups" in inspect.signature(estimator.fit).parameters:
+            fit_params[f"{estimator_name}__groups"] = groups
+        self.sklearn_pipe.fit(X=x, y=y, **fit_params)
 
     def predict_proba(self, x: pd.DataFrame) -> PredProbaSeries:
         """Returns the predicted probabilities of the `1`
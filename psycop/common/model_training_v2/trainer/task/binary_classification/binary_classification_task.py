@@ -1,5 +1,7 @@
 from dataclasses import dataclass
+from typing import Any
 
+import numpy as np
 import pandas as pd
 import polars as pl
 
@@ -26,11 +28,17 @@ def polarsframe_to_series(polarsframe: PolarsFrame) -> pl.Series:
 class BinaryClassificationTask(BaselineTask):
     task_pipe: BinaryClassificationPipeline
 
-    def train(self, x: pd.DataFrame, y: pd.DataFrame, y_col_name: str) -> None:
+    def train(
+        self,
+        x: pd.DataFrame,
+        y: pd.DataFrame,
+        y_col_name: str,
+        groups: np.ndarray[Any, Any] | None = None,
+    ) -> None:
         assert len(y.columns) == 1
         y_series = y[y_col_name]
 
-        self.task_pipe.fit(x=x, y=y_series)
+        self.task_pipe.fit(x=x, y=y_series, groups=groups)
 
     def predict_proba(self, x: pd.DataFrame) -> PredProbaSeries:
         return self.task_pipe.predict_proba(x)
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+from sklearn.pipeline import Pipeline
+
+from ..binary_classification.binary_classification_pipeline import BinaryClassificationPipeline
+from .xgboost import EarlyStoppingXGBClassifier, xgboost_classifier_step
+
+
+def test_xgboost_early_stopping_refits_with_best_iteration():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(400, 3)), columns=["pred_a", "pred_b", "pred_c"])
+    y = (X["pred_a"] + rng.normal(scale=0.5, size=400) > 0).astype(int)
+
+    pipe = Pipeline([xgboost_classifier_step(n_estimators=500, early_stopping_rounds=5, nthread=1)])
+    pipe.fit(X, y)
+
+    classifier = pipe.named_steps["classifier"]
+    assert isinstance(classifier, EarlyStoppingXGBClassifier)
+    assert classifier.best_iteration_ < 499
+    assert classifier.estimator_.n_estimators == classifier.best_iteration_ + 1
+    assert pipe.predict_proba(X).shape == (400, 2)
+    assert len(classifier.feature_importances_) == 3
+    assert classifier.n_features_in_ == 3
+    assert list(classifier.feature_names_in_) == ["pred_a", "pred_b", "pred_c"]
+
+
+def test_xgboost_early_stopping_splits_validation_data_by_group():
+    X = pd.DataFrame({"pred_a": range(100)})
+    y = pd.Series([0, 1] * 50)
+    groups = np.repeat(np.arange(20), 5)
+
+    classifier = EarlyStoppingXGBClassifier(estimator=xgboost_classifier_step()[1])
+    X_train, X_val, _, _ = classifier._validation_split(X, y, groups=groups)  # type: ignore
+
+    assert not set(groups[X_train.index]) & set(groups[X_val.index])
+    assert len(X_val) == 10
+
+
+def test_xgboost_early_stopping_with_a_single_positive_row():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(50, 2)), columns=["pred_a", "pred_b"])
+    y = pd.Series([1] + [0] * 49)
+
+    pipeline = BinaryClassificationPipeline(
+        Pipeline([xgboost_classifier_step(n_estimators=10, early_stopping_rounds=2, nthread=1)])
+    )
+    pipeline.fit(X, y, groups=np.arange(50))
+
+    assert pipeline.predict_proba(X).shape == (50,)
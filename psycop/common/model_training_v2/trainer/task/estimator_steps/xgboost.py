@@ -2,6 +2,9 @@ from typing import Any, Literal
 
 import numpy as np
 import optuna
+from sklearn.base import BaseEstimator, ClassifierMixin, clone
+from sklearn.model_selection import GroupShuffleSplit, train_test_split
+from sklearn.utils import _safe_indexing
 from xgboost import XGBClassifier
 
 from psycop.common.model_training_v2.config.baseline_registry import BaselineRegistry
@@ -16,6 +19,84 @@ from ....hyperparameter_suggester.suggesters.suggester_spaces import (
 )
 
 
+class EarlyStoppingXGBClassifier(ClassifierMixin, BaseEstimator):
+    """Fits estimator with early stopping on a validation split of the training data.
+
+    If groups are passed to fit, e.g. patient ids, the validation split is made by group, so no group is in both the
+    training and the validation split. Otherwise the split is by row, stratified by y if each class has at least two
+    rows. estimator.n_estimators is the maximum number of boosting rounds. The best iteration on the validation split is
+    recorded in best_iteration_. If refit is set, a copy of estimator is then refitted on all the training data with
+    the best number of boosting rounds, so no data is held out from the final model.
+    """
+
+    def __init__(
+        self,
+        estimator: XGBClassifier,
+        early_stopping_rounds: int = 50,
+        validation_fraction: float = 0.1,
+        refit: bool = True,
+        random_state: int = 0,
+    ):
+        self.estimator = estimator
+        self.early_stopping_rounds = early_stopping_rounds
+        self.validation_fraction = validation_fraction
+        self.refit = refit
+        self.random_state = random_state
+
+    def _validation_split(self, X: Any, y: Any, groups: Any | None) -> tuple[Any, Any, Any, Any]:
+        if groups is not None:
+            train_idxs, val_idxs = next(
+                GroupShuffleSplit(
+                    n_splits=1, test_size=self.validation_fraction, random_state=self.random_state
+                ).split(X, y, groups=groups)
+            )
+            return (
+                _safe_indexing(X, train_idxs),
+                _safe_indexing(X, val_idxs),
+                _safe_indexing(y, train_idxs),
+                _safe_indexing(y, val_idxs),
+            )
+
+        _, class_counts = np.unique(y, return_counts=True)
+        return train_test_split(
+            X,
+            y,
+            test_size=self.validation_fraction,
+            stratify=y if class_counts.min() >= 2 else None,
+            random_state=self.random_state,
+        )
+
+    def fit(self, X: Any, y: Any, groups: Any | None = None) -> "EarlyStoppingXGBClassifier":
+        X_train, X_val, y_train, y_val = self._validation_split(X, y, groups=groups)
+        estimator = clone(self.estimator).set_params(
+            early_stopping_rounds=self.early_stopping_rounds
+        )
+        estimator.fit(X_train, y_train, eval_set=[(X_val, y_val)], verbose=False)
+        self.best_iteration_: int = estimator.best_iteration
+
+        if self.refit:
+            estimator = clone(self.estimator).set_params(n_estimators=self.best_iteration_ + 1)
+            estimator.fit(X, y)
+
+        self.estimator_: XGBClassifier = estimator
+        self.classes_ = estimator.classes_
+        # Evaluation code reads the feature names from the classifier step
+        self.n_features_in_: int = estimator.n_features_in_
+        if hasattr(estimator, "feature_names_in_"):
+            self.feature_names_in_: np.ndarray[Any, Any] = estimator.feature_names_in_
+        return self
+
+    def predict(self, X: Any) -> np.ndarray[Any, Any]:
+        return self.estimator_.predict(X)
+
+    def predict_proba(self, X: Any) -> np.ndarray[Any, Any]:
+        return self.estimator_.predict_proba(X)
+
+    @property
+    def feature_importances_(self) -> np.ndarray[Any, Any]:
+        return self.estimator_.feature_importances_
+
+
 @BaselineRegistry.estimator_steps.register("xgboost")
 def xgboost_classifier_step(
     alpha: float = 0,
@@ -23,25 +104,44 @@ def xgboost_classifier_step(
     max_depth: int = 3,
     learning_rate: float = 0.3,
     gamma: float = 0,
-    tree_method: Literal["auto", "gpu_hist"] = "gpu_hist",
+    tree_method: Literal["auto", "hist", "gpu_hist"] = "hist",
     grow_policy: Literal["depthwise", "lossguide"] = "depthwise",
     n_estimators: int = 100,
+    nthread: int | None = None,
+    early_stopping_rounds: int | None = None,
+    validation_fraction: float = 0.1,
+    refit_with_best_iteration: bool = True,
 ) -> ModelStep:
     """Initialize XGBClassifier model with hparams specified as kwargs.
     The 'missing' hyperparameter specifies the value to be treated as missing and is set to np.nan by default.
+
+    nthread is the number of threads XGBoost uses, by default all CPUs. If early_stopping_rounds is set, n_estimators
+    is the maximum number of boosting rounds, and training stops when the validation_fraction held out from the
+    training data has not improved for early_stopping_rounds rounds. The cross-validation trainer passes its groups, so
+    the held-out data is split by patient. See EarlyStoppingXGBClassifier.
     """
+    estimator = XGBClassifier(
+        alpha=alpha,
+        gamma=gamma,
+        learning_rate=learning_rate,
+        max_depth=max_depth,
+        missing=np.nan,
+        n_estimators=n_estimators,
+        reg_lambda=reg_lambda,
+        tree_method=tree_method,
+        grow_policy=grow_policy,
+        n_jobs=nthread,
+    )
+    if early_stopping_rounds is None:
+        return ("classifier", estimator)
+
     return (
         "classifier",
-        XGBClassifier(
-            alpha=alpha,
-            gamma=gamma,
-            learning_rate=learning_rate,
-            max_depth=max_depth,
-            missing=np.nan,
-            n_estimators=n_estimators,
-            reg_lambda=reg_lambda,
-            tree_method=tree_method,
-            grow_policy=grow_policy,
+        EarlyStoppingXGBClassifier(
+            estimator=estimator,
+            early_stopping_rounds=early_stopping_rounds,
+            validation_fraction=validation_fraction,
+            refit=refit_with_best_iteration,
         ),
     )
 
@@ -56,6 +156,8 @@ class XGBoostSuggester(Suggester):
         max_depth: IntegerspaceT = (3, 8, True),
         learning_rate: FloatSpaceT = (1e-8, 1, True),
         gamma: FloatSpaceT = (1e-8, 0.001, True),
+        early_stopping_rounds: int | None = None,
+        nthread: int | None = None,
     ):
         # A little annoying, can be auto-generated using introspection of the annotations/types. E.g. added to the `Suggester` class. But this is fine for now.
         self.n_estimators = IntegerSpace.from_list_or_mapping(n_estimators)
@@ -64,6 +166,8 @@ class XGBoostSuggester(Suggester):
         self.max_depth = IntegerSpace.from_list_or_mapping(max_depth)
         self.learning_rate = FloatSpace.from_list_or_mapping(learning_rate)
         self.gamma = FloatSpace.from_list_or_mapping(gamma)
+        self.early_stopping_rounds = early_stopping_rounds
+        self.nthread = nthread
 
     def suggest_hyperparameters(self, trial: optuna.Trial) -> dict[str, Any]:
         # The same goes forthis, can be auto-generated.
@@ -75,4 +179,6 @@ class XGBoostSuggester(Suggester):
             "max_depth": self.max_depth.suggest(trial, name="max_depth"),
             "learning_rate": self.learning_rate.suggest(trial, name="learning_rate"),
             "gamma": self.gamma.suggest(trial, name="gamma"),
+            "early_stopping_rounds": self.early_stopping_rounds,
+            "nthread": self.nthread,
         }
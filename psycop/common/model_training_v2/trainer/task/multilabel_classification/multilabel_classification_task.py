@@ -1,5 +1,7 @@
 from collections.abc import Sequence
+from typing import Any
 
+import numpy as np
 import pandas as pd
 
 from psycop.common.model_training_v2.trainer.task.base_task import BaselineTask
@@ -22,6 +24,12 @@ class MultilabelClassificationTask(BaselineTask):
         self.metrics = main_metric
         self.supplementary_metrics = supplementary_metrics
 
-    def train(self, x: pd.DataFrame, y: pd.DataFrame, y_col_name: str): ...
+    def train(
+        self,
+        x: pd.DataFrame,
+        y: pd.DataFrame,
+        y_col_name: str,
+        groups: np.ndarray[Any, Any] | None = None,
+    ): ...
 
     def predict_proba(self, x: pd.DataFrame) -> pd.Series[float]: ...
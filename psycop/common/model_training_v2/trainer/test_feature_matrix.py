@@ -0,0 +1,25 @@
+import numpy as np
+import polars as pl
+import pytest
+
+from psycop.common.model_training_v2.trainer.feature_matrix import FeatureMatrix
+
+
+def test_feature_matrix_from_frame():
+    df = pl.DataFrame({"uuid": ["a", "b", "c"], "pred_1": [1, 2, None], "pred_2": [0.5, 1.5, 2.5]})
+
+    matrix = FeatureMatrix.from_frame(df, columns=["pred_1", "pred_2"])
+
+    assert matrix.values.dtype == np.float32
+    assert matrix.values.flags.c_contiguous
+    assert matrix.column_index == {"pred_1": 0, "pred_2": 1}
+    assert np.isnan(matrix.values[2, 0])
+
+    # Frames of all rows wrap the array, frames of some rows copy only those rows
+    assert np.shares_memory(matrix.to_pandas().to_numpy(), matrix.values)
+    assert matrix.to_pandas(rows=np.array([2, 0]))["pred_2"].to_list() == [2.5, 0.5]
+
+
+def test_feature_matrix_checks_columns():
+    with pytest.raises(ValueError, match="does not match"):
+        FeatureMatrix(values=np.zeros((2, 3), dtype=np.float32), columns=["a", "b"])
@@ -6,6 +6,15 @@ from .cohort_definition import PredictionTimeFilter, filter_prediction_times
 from .test_utils.str_to_df import str_to_pl_df
 
 
+class RemoveYear(PredictionTimeFilter):
+    def __init__(self, min_timestamp: dt):
+        self.year_timestamp = min_timestamp
+
+    def apply(self, df: pl.LazyFrame) -> pl.LazyFrame:
+        """Remove all prediction times within the year of the timestamp"""
+        return df.filter(pl.col("timestamp").dt.year() != self.year_timestamp.year)
+
+
 def test_filter_prediction_times():
     prediction_times = str_to_pl_df(
         """
@@ -16,14 +25,6 @@ def test_filter_prediction_times():
         """
     ).lazy()
 
-    class RemoveYear(PredictionTimeFilter):
-        def __init__(self, min_timestamp: dt):
-            self.year_timestamp = min_timestamp
-
-        def apply(self, df: pl.LazyFrame) -> pl.LazyFrame:
-            """Remove all prediction times within the year of the timestamp"""
-            return df.filter(pl.col("timestamp").dt.year() != self.year_timestamp.year)
-
     filtered = filter_prediction_times(
         prediction_times=prediction_times,
         get_counts=False,
@@ -35,3 +36,30 @@ def test_filter_prediction_times():
     )
 
     assert len(filtered.prediction_times.frame) == 1
+
+
+def test_filter_prediction_times_with_counts():
+    prediction_times = str_to_pl_df(
+        """
+        dw_ek_borger,  timestamp,
+        1,          2020-01-01,
+        2,          2019-01-01, # Filtered because of timestamp in filter 1
+        1,          2018-01-01, # Filtered because of timestamp in filter 2
+        """
+    ).lazy()
+
+    filtered = filter_prediction_times(
+        prediction_times=prediction_times,
+        get_counts=True,
+        filtering_steps=[
+            RemoveYear(dt.strptime("2019", "%Y")),
+            RemoveYear(dt.strptime("2018", "%Y")),
+        ],
+        entity_id_col_name="dw_ek_borger",
+    )
+
+    assert len(filtered.prediction_times.frame) == 1
+    assert [
+        (s.n_prediction_times_before, s.n_prediction_times_after, s.n_ids_before, s.n_ids_after)
+        for s in filtered.filter_steps
+    ] == [(3, 2, 2, 1), (2, 1, 1, 1)]
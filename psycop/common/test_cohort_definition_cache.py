@@ -0,0 +1,143 @@
+from pathlib import Path
+
+import polars as pl
+import pytest
+
+from .cohort_definition import (
+    CohortDefiner,
+    FilteredPredictionTimeBundle,
+    OutcomeTimestampFrame,
+    PredictionTimeFrame,
+    StepDelta,
+)
+from .cohort_definition_cache import CohortDefinerCache, cache_cohort_definer
+from .test_utils.str_to_df import str_to_pl_df
+
+
+class CountingCohortDefiner(CohortDefiner):
+    n_calls = 0
+
+    @staticmethod
+    def get_filtered_prediction_times_bundle() -> FilteredPredictionTimeBundle:
+        CountingCohortDefiner.n_calls += 1
+        return FilteredPredictionTimeBundle(
+            prediction_times=PredictionTimeFrame(
+                frame=str_to_pl_df(
+                    """dw_ek_borger,timestamp
+                    1,2020-01-01
+                    2,2021-01-01"""
+                )
+            ),
+            filter_steps=[
+                StepDelta(
+                    step_name="Filter",
+                    n_prediction_times_before=3,
+                    n_prediction_times_after=2,
+                    n_ids_before=2,
+                    n_ids_after=2,
+                    step_index=0,
+                )
+            ],
+        )
+
+    @staticmethod
+    def get_outcome_timestamps() -> OutcomeTimestampFrame:
+        CountingCohortDefiner.n_calls += 1
+        return OutcomeTimestampFrame(
+            frame=str_to_pl_df(
+                """dw_ek_borger,timestamp
+                1,2020-06-01"""
+            )
+        )
+
+
+def test_cached_cohort_definer(tmp_path: Path):
+    CountingCohortDefiner.n_calls = 0
+    fingerprint = {"value": "v1"}
+    cache = CohortDefinerCache(
+        cache_dir=tmp_path, source_data_fingerprint=lambda: fingerprint["value"]
+    )
+    cached_definer = cache_cohort_definer(CountingCohortDefiner, cache=cache)
+
+    computed = cached_definer.get_filtered_prediction_times_bundle()
+    loaded = cached_definer.get_filtered_prediction_times_bundle()
+    assert CountingCohortDefiner.n_calls == 1
+    assert loaded.prediction_times.frame.equals(computed.prediction_times.frame)
+    assert loaded.filter_steps == computed.filter_steps
+
+    cached_definer.get_outcome_timestamps()
+    outcomes = cached_definer.get_outcome_timestamps()
+    assert CountingCohortDefiner.n_calls == 2
+    assert outcomes.frame.get_column("dw_ek_borger").to_list() == [1]
+
+    # A new source data fingerprint is a miss
+    fingerprint["value"] = "v2"
+    cached_definer.get_filtered_prediction_times_bundle()
+    assert CountingCohortDefiner.n_calls == 3
+
+    assert cache.invalidate(CountingCohortDefiner) == 2
+    cached_definer.get_filtered_prediction_times_bundle()
+    assert CountingCohortDefiner.n_calls == 4
+    assert isinstance(outcomes.frame, pl.DataFrame)
+
+
+MIN_N_IDS = 2
+
+
+class ConstantCohortDefiner(CountingCohortDefiner):
+    @staticmethod
+    def get_filtered_prediction_times_bundle() -> FilteredPredictionTimeBundle:
+        bundle = CountingCohortDefiner.get_filtered_prediction_times_bundle()
+        assert bundle.filter_steps[0].n_ids_after >= MIN_N_IDS
+        return bundle
+
+
+def test_cache_key_follows_referenced_code_and_constants(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    cache = CohortDefinerCache(cache_dir=tmp_path)
+    key = cache.key(ConstantCohortDefiner)
+    assert key is not None
+    assert cache.key(ConstantCohortDefiner, version=2) != key
+
+    # Changing a constant a referenced definer uses is a miss
+    monkeypatch.setattr(f"{__name__}.MIN_N_IDS", 1)
+    assert cache.key(ConstantCohortDefiner) != key
+
+
+def test_definers_without_source_are_not_cached(tmp_path: Path):
+    CountingCohortDefiner.n_calls = 0
+    definer = type(
+        "NotebookCohortDefiner",
+        (CohortDefiner,),
+        {
+            "get_filtered_prediction_times_bundle": staticmethod(
+                CountingCohortDefiner.get_filtered_prediction_times_bundle
+            ),
+            "get_outcome_timestamps": staticmethod(CountingCohortDefiner.get_outcome_timestamps),
+            "__module__": "__main__",
+        },
+    )
+    cached_definer = cache_cohort_definer(definer, cache=CohortDefinerCache(cache_dir=tmp_path))
+
+    cached_definer.get_filtered_prediction_times_bundle()
+    cached_definer.get_filtered_prediction_times_bundle()
+    assert CountingCohortDefiner.n_calls == 2
+    assert not tmp_path.exists() or not any(tmp_path.iterdir())
+
+
+def test_invalidate_only_removes_definers_from_the_same_module(tmp_path: Path):
+    cache = CohortDefinerCache(cache_dir=tmp_path)
+    other_module_definer = type(
+        "CountingCohortDefiner",
+        (CountingCohortDefiner,),
+        {"__module__": "psycop.projects.other.cohort_definer"},
+    )
+    # Same qualname, different module
+    (tmp_path / f"{other_module_definer.__module__}.CountingCohortDefiner-0").mkdir()
+
+    cache_cohort_definer(CountingCohortDefiner, cache=cache).get_outcome_timestamps()
+
+    assert cache.invalidate(CountingCohortDefiner) == 1
+    assert len(list(tmp_path.iterdir())) == 1
+    assert not list(tmp_path.rglob("*.tmp"))
@@ -0,0 +1,15 @@
+from pathlib import Path
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+
+
+def sqlite_stand_in_engine(db_dir: Path) -> Engine:
+    """SQLite engine which stands in for the SQL server in tests. Tables written with schema="fct" can be queried as [fct].[table], like views on the server."""
+    engine = create_engine(f"sqlite:///{db_dir / 'main.db'}")
+
+    @event.listens_for(engine, "connect")
+    def attach_fct_schema(dbapi_connection, connection_record):  # type: ignore # noqa: ANN001, ARG001
+        dbapi_connection.execute(f"ATTACH DATABASE '{db_dir / 'fct.db'}' AS fct")
+
+    return engine
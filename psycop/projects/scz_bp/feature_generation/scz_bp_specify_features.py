@@ -9,6 +9,7 @@ import polars as pl
 from timeseriesflattener import OutcomeSpec, PredictorSpec, StaticFrame, StaticSpec, ValueFrame
 from timeseriesflattener.aggregators import HasValuesAggregator, MaxAggregator
 
+from psycop.common.feature_generation.loaders.loader_registry import LoaderRegistry
 from psycop.common.feature_generation.loaders.raw.load_visits import (
     get_time_of_first_visit_to_psychiatry,
 )
@@ -145,15 +146,19 @@ class SczBpFeatureSpecifier:
         if max_layer not in SczBpFeatureLayers:
             raise ValueError(f"Layer {max_layer} not supported.")
 
-        feature_specs: list[Sequence[ValueSpecification]] = [
-            self._get_metadata_specs(),
-            self._get_outcome_specs(),
-        ]
-
-        for layer in range(1, max_layer + 1):
-            feature_specs.append(
-                SczBpFeatureLayers[layer]().get_features(lookbehind_days=lookbehind_days)
-            )
+        # The metadata specs and layer 2 both load physical visits to psychiatry with the same arguments, which
+        # are loaded once and shared. The registry's report logs how much loading was avoided.
+        with LoaderRegistry() as loader_registry:
+            feature_specs: list[Sequence[ValueSpecification]] = [
+                self._get_metadata_specs(),
+                self._get_outcome_specs(),
+            ]
+
+            for layer in range(1, max_layer + 1):
+                feature_specs.append(
+                    SczBpFeatureLayers[layer]().get_features(lookbehind_days=lookbehind_days)
+                )
+        loader_registry.log_report()
 
         # Flatten the Sequence of lists
         features = [feature for sublist in feature_specs for feature in sublist]
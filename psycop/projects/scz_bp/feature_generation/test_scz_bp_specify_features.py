@@ -0,0 +1,33 @@
+import pandas as pd
+import polars as pl
+import pytest
+
+from psycop.common.feature_generation.loaders.loader_registry import LoaderRegistry
+from psycop.common.feature_generation.loaders.raw import load_visits
+from psycop.projects.scz_bp.feature_generation.feature_layers.scz_bp_layer_2 import SczBpLayer2
+
+
+def test_metadata_and_layer_2_share_visits_to_psychiatry(monkeypatch: pytest.MonkeyPatch):
+    physical_visits_calls: list[dict[str, object]] = []
+
+    def physical_visits(**kwargs: object) -> pd.DataFrame:
+        physical_visits_calls.append(kwargs)
+        return pd.DataFrame(
+            {
+                "dw_ek_borger": [1, 1, 2],
+                "timestamp": pd.to_datetime(["2020-01-01", "2021-01-01", "2020-06-01"]),
+                "value": [1.0, 1.0, 1.0],
+            }
+        )
+
+    monkeypatch.setattr(load_visits, "physical_visits", physical_visits)
+
+    with LoaderRegistry() as registry:
+        load_visits.get_time_of_first_visit_to_psychiatry()
+        SczBpLayer2().get_features(lookbehind_days=[365])
+
+    # Four unique loader calls in layer 2, one of which the metadata specs already made
+    assert len(physical_visits_calls) == 4
+    shared = registry.report().filter(pl.col("avoided_loads") > 0)
+    assert shared["avoided_loads"].to_list() == [1]
+    assert shared["loader_name"].item().endswith("physical_visits_to_psychiatry")